@@ -2,19 +2,262 @@ import random
 import sqlite3
 import os
 import logging
-from typing import List, Dict, Union
+import threading
+import atexit
+import json
+import time
+import uuid
+import functools
+import queue
+from contextlib import contextmanager
+from collections import Counter, OrderedDict, deque
+from typing import List, Dict, NamedTuple, Tuple, Union
+
+try:
+    from . import war_game_metrics
+except ImportError:
+    # Run from the source directory, where war_game is a top-level module
+    import war_game_metrics
 
-# Configure the logging
-logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger()
 
-logs = []
+BUSY_TIMEOUT_MS = 5000
+# The most idle connections a DatabaseManager keeps open; connections opened beyond it are closed after use
+POOL_SIZE = 8
+SCHEMA_VERSION = 1
+UPSERT_WINS = ('INSERT INTO PlayerWins (Name, Wins) VALUES (?, ?) '
+               'ON CONFLICT(Name) DO UPDATE SET Wins = Wins + excluded.Wins;')
+UPSERT_STATS = ('INSERT INTO PlayerStats (Name, Games, Wins, Rounds, Wars, LongestWar) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(Name) DO UPDATE SET Games = Games + excluded.Games, Wins = Wins + excluded.Wins, '
+                'Rounds = Rounds + excluded.Rounds, Wars = Wars + excluded.Wars, '
+                'LongestWar = MAX(LongestWar, excluded.LongestWar);')
+UPSERT_HEAD_TO_HEAD = ('INSERT INTO HeadToHead (Name, Opponent, Games, Wins) VALUES (?, ?, ?, ?) '
+                       'ON CONFLICT(Name, Opponent) DO UPDATE SET Games = Games + excluded.Games, '
+                       'Wins = Wins + excluded.Wins;')
+
+# Game events are recorded as small tuples and only rendered as text when somebody reads the logs.
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+
+EVENT_START_HAND = 0        # (EVENT_START_HAND, name, cards)
+EVENT_ROUND = 1             # (EVENT_ROUND, round_number)
+EVENT_PLAY = 2              # (EVENT_PLAY, name, rank, cards_left)
+EVENT_WAR = 3               # (EVENT_WAR,)
+EVENT_WAR_CONTINUED = 4     # (EVENT_WAR_CONTINUED,)
+EVENT_WON_CARDS = 5         # (EVENT_WON_CARDS, name, cards_won)
+EVENT_DECK_EMPTY = 6        # (EVENT_DECK_EMPTY,)
+EVENT_FINAL_HAND = 7        # (EVENT_FINAL_HAND, name, cards)
+EVENT_WINNER = 8            # (EVENT_WINNER, name, wins, total_wins)
+EVENT_CYCLE = 9             # (EVENT_CYCLE,)
+EVENT_ROUND_LIMIT = 10      # (EVENT_ROUND_LIMIT, round_number)
+EVENT_ELIMINATED = 11       # (EVENT_ELIMINATED, name)
+
+MIN_PLAYERS = 2
+MAX_PLAYERS = 8
+
+# Games are checked for repeated hand states once they have lasted this many rounds. war_game_fast uses the same
+# value and the same cycle detection, so both engines stop together.
+CYCLE_CHECK_AFTER = 1000
+
+
+def render_event(event) -> List[str]:
+    """
+    Render a game event as log lines.
+
+    :param event: A tuple recorded by a Game.
+    :return: A list of log lines.
+    """
+    kind = event[0]
+    if kind == EVENT_PLAY:
+        name, rank, cards_left = event[1:]
+        return [name + " has " + str(cards_left + 1) + " cards",
+                name + " played " + str(rank) + ". Total cards left = " + str(cards_left) + "\n"]
+    if kind == EVENT_WON_CARDS:
+        return [f"{event[1]} won {event[2]} cards.\n"]
+    if kind == EVENT_ROUND:
+        return [f"\nRound {event[1]} -"]
+    if kind == EVENT_WAR:
+        return ['\nWar!\n']
+    if kind == EVENT_WAR_CONTINUED:
+        return ['\nWar continued!\n']
+    if kind == EVENT_START_HAND:
+        return [f"{event[1]} has {event[2]} cards."]
+    if kind == EVENT_DECK_EMPTY:
+        return ["\nA player's deck is empty"]
+    if kind == EVENT_FINAL_HAND:
+        return [f"{event[1]} has {event[2]}"]
+    if kind == EVENT_ELIMINATED:
+        return [f"\n{event[1]} is out of cards and out of the game."]
+    if kind == EVENT_CYCLE:
+        return ["\nThe hands are repeating, so the game would never end."]
+    if kind == EVENT_ROUND_LIMIT:
+        return [f"\nThe game was stopped after {event[1]} rounds."]
+    if kind == EVENT_WINNER:
+        name, wins, total_wins = event[1:]
+        return ["\n" + f"Winner: {name}", f"Wins: {wins}",
+                "\n" + f'\nGame Over!\n{name} won the game with {total_wins} total wins']
+    raise ValueError(f"Unknown game event: {event!r}")
+
+
+class NullRecorder:
+    """
+    Recorder that discards every game event. Games use it when nobody is going to read their logs.
+    """
+
+    def record(self, *event) -> None:
+        pass
+
+
+class EventRecorder:
+    """
+    Recorder that keeps the events of one game as tuples and renders them as text on demand.
+    """
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, *event) -> None:
+        self.events.append(event)
+
+    def __iter__(self):
+        return self.lines()
+
+    def lines(self):
+        """
+        Render the recorded events.
+
+        :return: A generator of log lines.
+        """
+        for event in self.events:
+            yield from render_event(event)
+
+
+class GameResult(NamedTuple):
+    """
+    The compact record of a finished game, from which the players' statistics are updated.
+    """
+    players: Tuple[str, ...]
+    winner: str
+    rounds: int
+    wars: int
+    # The most face-down, face-up turns played in a single war
+    longest_war: int
+    seed: object = None
+    # Seconds spent playing the rounds
+    duration: float = 0.0
+    # Unix time at which the game finished; the time it is recorded when None
+    finished_at: float = None
+
+
+class RoundResult(NamedTuple):
+    """
+    The compact record of one round, as yielded by Game.iter_rounds.
+    """
+    round: int
+    # The name of the player who took the cards, or None when nobody won the war
+    winner: Union[str, None]
+    # The cards on the table, including those of any war
+    cards: int
+    war: bool
+    # The number of cards each player holds after the round, in playing order
+    hands: Tuple[int, ...]
+
+
+def aggregate_results(results) -> tuple:
+    """
+    Add up game results into the changes they make to the scores and statistics.
+
+    :param results: GameResult objects.
+    :return: A tuple containing a Counter of wins per player, a dictionary of [games, wins, rounds, wars, longest war]
+             per player and a dictionary of [games, wins] per (player, opponent) pair
+    """
+    wins = Counter()
+    stats = {}
+    head_to_head = {}
+    for result in results:
+        wins[result.winner] += 1
+        for name in result.players:
+            won = name == result.winner
+            entry = stats.get(name)
+            if entry is None:
+                entry = stats[name] = [0, 0, 0, 0, 0]
+            entry[0] += 1
+            entry[1] += won
+            entry[2] += result.rounds
+            entry[3] += result.wars
+            entry[4] = max(entry[4], result.longest_war)
+            for opponent in result.players:
+                if opponent != name:
+                    pair = head_to_head.get((name, opponent))
+                    if pair is None:
+                        pair = head_to_head[(name, opponent)] = [0, 0]
+                    pair[0] += 1
+                    pair[1] += won
+    return wins, stats, head_to_head
+
+
+def format_player_stats(entry, head_to_head) -> Dict:
+    """
+    Turn a player's raw statistics into the dictionary returned by get_player_stats.
+
+    :param entry: The player's [games, wins, rounds, wars, longest war].
+    :param head_to_head: A dictionary of [games, wins] per opponent.
+    :return: Dictionary containing the player's games, wins, losses, win rate, average rounds per game, wars, longest
+             war and record against every opponent
+    """
+    games, wins, rounds, wars, longest_war = entry
+    return {"games": games, "wins": wins, "losses": games - wins,
+            "win_rate": round(wins / games, 4) if games else 0.0,
+            "average_rounds": round(rounds / games, 1) if games else 0.0, "wars": wars, "longest_war": longest_war,
+            "head_to_head": [{"opponent": opponent, "games": pair[0], "wins": pair[1]}
+                             for opponent, pair in sorted(head_to_head.items())]}
+
+
+def timed_query(method):
+    """
+    Decorate a DatabaseManager method to record how long every call takes, labelled with the method's name.
+
+    :param method: The method to time.
+    :return: The timed method
+    """
+    observe = war_game_metrics.DB_QUERY_SECONDS.observe
+    name = method.__name__
+
+    @functools.wraps(method)
+    def timed(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            observe(time.perf_counter() - start, name)
+    return timed
+
+
+def configure_logging() -> None:
+    """
+    Print the game's log messages. Called by the services when they start, not when the module is imported.
+    """
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+
+# The database paths whose directory and schema this process has checked
+_checked_paths = set()
+_checked_paths_lock = threading.Lock()
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "data/player_wins.db"):
+    def __init__(self, db_path: str = "data/player_wins.db", pool_size: int = POOL_SIZE):
         self.db_path = os.path.abspath(db_path)
-        self.ensure_directory_exists()
-        self.create_db()
+        # Open connections shared by every thread, so that a server starting a thread per request does not connect
+        # per request. The most recently returned connection is handed out first.
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        # Incremented by every write made through this object, so caches of the scores know when they are stale.
+        self.version = 0
+        # The directory and schema checks run once per database per process, however many managers are created.
+        with _checked_paths_lock:
+            if self.db_path not in _checked_paths:
+                self.ensure_directory_exists()
+                self.create_db()
+                _checked_paths.add(self.db_path)
 
     def ensure_directory_exists(self):
         """
@@ -25,16 +268,102 @@ class DatabaseManager:
             os.makedirs(directory)
         logger.info("Directory checks done!")
 
+    def open_connection(self) -> sqlite3.Connection:
+        """
+        Open a new connection to the database.
+
+        The database runs in WAL mode so that readers are never blocked by a writer, and with synchronous=NORMAL so
+        that a commit does not wait for an fsync. sqlite3 keeps the compiled form of recently used statements on the
+        connection, so the queries below are prepared once per pooled connection.
+
+        :return: An open sqlite3 connection, which may be used from any thread but only by one at a time.
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool for the with block, which runs as one transaction: it is committed when the
+        block ends and rolled back if the block raises. A new connection is opened when the pool is empty, so nested
+        blocks never wait for each other.
+
+        :return: A context manager giving an open sqlite3 connection.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self.open_connection()
+        try:
+            with conn:
+                yield conn
+        finally:
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self) -> None:
+        """
+        Close the idle connections in the pool. Connections borrowed later are opened again.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
     def create_db(self):
         """
-        Create the database table if it does not exist.
+        Create the database table if it does not exist and migrate it to the current schema.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('CREATE TABLE IF NOT EXISTS PlayerWins (Name text, Wins int);')
-            conn.commit()
-            logger.info("Database and table checks done!")
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS PlayerWins (Name text PRIMARY KEY, Wins int NOT NULL DEFAULT 0);')
+            self.migrate(conn)
+            # Covers the leaderboard queries, which read players in order of wins.
+            conn.execute('CREATE INDEX IF NOT EXISTS PlayerWins_Wins ON PlayerWins (Wins DESC, Name);')
+            # Statistics of the games recorded with record_games, updated in the same transaction as the wins
+            conn.execute('CREATE TABLE IF NOT EXISTS PlayerStats (Name text PRIMARY KEY, Games int NOT NULL DEFAULT 0, '
+                         'Wins int NOT NULL DEFAULT 0, Rounds int NOT NULL DEFAULT 0, Wars int NOT NULL DEFAULT 0, '
+                         'LongestWar int NOT NULL DEFAULT 0);')
+            conn.execute('CREATE TABLE IF NOT EXISTS HeadToHead (Name text, Opponent text, Games int NOT NULL DEFAULT 0, '
+                         'Wins int NOT NULL DEFAULT 0, PRIMARY KEY (Name, Opponent)) WITHOUT ROWID;')
+            # Every recorded game, appended and never changed, even when the scores are reset. The index covers the
+            # rounds and wars queries over a time range, and GamePlayers, keyed by player and time, covers the
+            # per-player queries without touching GameHistory.
+            conn.execute('CREATE TABLE IF NOT EXISTS GameHistory (Id integer PRIMARY KEY, FinishedAt real NOT NULL, '
+                         'Seed, Players text NOT NULL, Winner text NOT NULL, Rounds int NOT NULL, Wars int NOT NULL, '
+                         'DurationMs real NOT NULL);')
+            conn.execute('CREATE INDEX IF NOT EXISTS GameHistory_FinishedAt ON GameHistory (FinishedAt, Rounds, Wars);')
+            conn.execute('CREATE TABLE IF NOT EXISTS GamePlayers (Name text, FinishedAt real, GameId integer, '
+                         'Won int NOT NULL, PRIMARY KEY (Name, FinishedAt, GameId)) WITHOUT ROWID;')
+        logger.info("Database and table checks done!")
+
+    def migrate(self, conn: sqlite3.Connection) -> None:
+        """
+        Upgrade a database created by an older version of the game.
+
+        The original PlayerWins table has no key on Name, so it is rebuilt with Name as its primary key and any
+        duplicate rows for a player are merged into one.
 
+        :param conn: An open connection to the database.
+        """
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version == 0:
+            conn.execute('BEGIN IMMEDIATE')
+            columns = conn.execute('PRAGMA table_info(PlayerWins)').fetchall()
+            if not any(column[1] == 'Name' and column[5] for column in columns):
+                conn.execute('CREATE TABLE PlayerWins_new (Name text PRIMARY KEY, Wins int NOT NULL DEFAULT 0);')
+                conn.execute('INSERT INTO PlayerWins_new SELECT Name, SUM(Wins) FROM PlayerWins GROUP BY Name;')
+                conn.execute('DROP TABLE PlayerWins;')
+                conn.execute('ALTER TABLE PlayerWins_new RENAME TO PlayerWins;')
+                logger.info("PlayerWins table migrated.")
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    @timed_query
     def get_player_score(self, player_name: str) -> Union[tuple, None]:
         """
         Get the player's score from the database.
@@ -42,80 +371,656 @@ class DatabaseManager:
         :param player_name: The name of the player.
         :return: A tuple containing the player's name and score or None if not found.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('SELECT * FROM PlayerWins WHERE Name = ?', (player_name,))
-            data = c.fetchone()
-        return data
+        with self.connection() as conn:
+            return conn.execute('SELECT * FROM PlayerWins WHERE Name = ?', (player_name,)).fetchone()
 
+    @timed_query
     def update_score(self, winner_name: str) -> None:
         """
         Update the score for the given winner.
 
         :param winner_name: The name of the winner.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('SELECT * FROM PlayerWins WHERE Name = ?', (winner_name,))
-            data = c.fetchone()
-            if data:
-                c.execute('UPDATE PlayerWins SET Wins = Wins + 1 WHERE Name = ?', (winner_name,))
-            else:
-                c.execute('INSERT INTO PlayerWins VALUES (?,?)', (winner_name, 1))
-            conn.commit()
-            logger.info("Database updated.")
+        with self.connection() as conn:
+            conn.execute(UPSERT_WINS, (winner_name, 1))
+        self.version += 1
+        logger.info("Database updated.")
+
+    @timed_query
+    def bulk_update_scores(self, wins: Dict[str, int]) -> None:
+        """
+        Add many players' wins to the database in a single transaction.
+
+        :param wins: A mapping of player names to the number of wins to add, such as a collections.Counter.
+        """
+        with self.connection() as conn:
+            conn.executemany(UPSERT_WINS, wins.items())
+        self.version += 1
+        logger.info("Database updated.")
+
+    def record_game(self, result: GameResult) -> None:
+        """
+        Add the win and the statistics of a finished game to the database in one transaction.
+
+        :param result: The GameResult of the game.
+        """
+        self.record_games([result])
+
+    @timed_query
+    def record_games(self, results: List[GameResult], extra_wins: Dict[str, int] = None) -> None:
+        """
+        Add the wins and the statistics of finished games to the database, and the games to the game history, in one
+        transaction.
+
+        :param results: The GameResult of every game.
+        :param extra_wins: Wins to add on top of those of the games, such as a ScoreBuffer's buffered wins.
+        """
+        wins, stats, head_to_head = aggregate_results(results)
+        if extra_wins:
+            wins.update(extra_wins)
+        now = time.time()
+        with self.connection() as conn:
+            conn.executemany(UPSERT_WINS, wins.items())
+            conn.executemany(UPSERT_STATS, [(name,) + tuple(entry) for name, entry in stats.items()])
+            conn.executemany(UPSERT_HEAD_TO_HEAD, [pair + tuple(entry) for pair, entry in head_to_head.items()])
+            players = []
+            for result in results:
+                finished_at = result.finished_at if result.finished_at is not None else now
+                # Id is the rowid, so SQLite assigns it and no other connection can take the same one
+                game_id = conn.execute('INSERT INTO GameHistory VALUES (NULL, ?, ?, ?, ?, ?, ?, ?);',
+                                       (finished_at, result.seed, json.dumps(result.players), result.winner,
+                                        result.rounds, result.wars, result.duration * 1000)).lastrowid
+                players.extend((name, finished_at, game_id, name == result.winner) for name in result.players)
+            conn.executemany('INSERT OR IGNORE INTO GamePlayers VALUES (?, ?, ?, ?);', players)
+        self.version += 1
+        logger.info("Database updated.")
+
+    def read_player_stats(self, player_name: str) -> Union[tuple, None]:
+        """
+        Read a player's raw statistics.
+
+        :param player_name: The name of the player.
+        :return: A tuple containing the player's [games, wins, rounds, wars, longest war] and a dictionary of
+                 [games, wins] per opponent, or None if no game of the player was recorded.
+        """
+        with self.connection() as conn:
+            row = conn.execute('SELECT Games, Wins, Rounds, Wars, LongestWar FROM PlayerStats WHERE Name = ?',
+                               (player_name,)).fetchone()
+            if row is None:
+                return None
+            head_to_head = {opponent: [games, wins] for opponent, games, wins in
+                            conn.execute('SELECT Opponent, Games, Wins FROM HeadToHead WHERE Name = ?',
+                                         (player_name,))}
+        return list(row), head_to_head
+
+    @timed_query
+    def get_player_stats(self, player_name: str) -> Union[Dict, None]:
+        """
+        Get a player's statistics over every game recorded with record_games.
 
+        :param player_name: The name of the player.
+        :return: Dictionary of statistics as returned by format_player_stats, or None if no game of the player was
+                 recorded.
+        """
+        data = self.read_player_stats(player_name)
+        return format_player_stats(*data) if data is not None else None
+
+    @timed_query
     def get_all_scores(self) -> List[Dict[str, Union[str, int]]]:
         """
         Get all player scores from the database.
 
         :return: A list of dictionaries containing player names and their scores.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('SELECT * FROM PlayerWins')
-            data = c.fetchall()
-
+        with self.connection() as conn:
+            data = conn.execute('SELECT * FROM PlayerWins').fetchall()
         players = [{'name': row[0], 'wins': row[1]} for row in data]
         return players
 
+    @timed_query
     def reset_all_scores(self) -> List[Dict[str, Union[str, int]]]:
         """
-        Reset all scores in the database and return the reset scores.
+        Reset all scores and statistics in the database and return the reset scores.
 
         :return: A list of dictionaries containing player names and their reset scores.
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute('SELECT * FROM PlayerWins')
-            data = c.fetchall()
+        with self.connection() as conn:
+            data = conn.execute('SELECT * FROM PlayerWins').fetchall()
             players_check = [{'name': row[0], 'wins': row[1]} for row in data]
-            c.execute('DELETE FROM PlayerWins;')
-            conn.commit()
+            conn.execute('DELETE FROM PlayerWins;')
+            conn.execute('DELETE FROM PlayerStats;')
+            conn.execute('DELETE FROM HeadToHead;')
+        self.version += 1
         return players_check
 
+    @timed_query
+    def get_top_scores(self, limit: int, offset: int = 0) -> List[Dict[str, Union[str, int]]]:
+        """
+        Get one page of the leaderboard, best players first.
+
+        Players with the same number of wins share a rank and are listed by name.
+
+        :param limit: The maximum number of players to return.
+        :param offset: The number of players to skip.
+        :return: A list of dictionaries containing player names, their scores and their ranks.
+        """
+        players = []
+        with self.connection() as conn:
+            data = conn.execute('SELECT Name, Wins FROM PlayerWins ORDER BY Wins DESC, Name LIMIT ? OFFSET ?',
+                                (limit, offset)).fetchall()
+            for name, wins in data:
+                if players and players[-1]['wins'] == wins:
+                    rank = players[-1]['rank']
+                else:
+                    rank = conn.execute('SELECT COUNT(*) FROM PlayerWins WHERE Wins > ?', (wins,)).fetchone()[0] + 1
+                players.append({'name': name, 'wins': wins, 'rank': rank})
+        return players
+
+    @timed_query
+    def get_player_rank(self, player_name: str) -> Union[tuple, None]:
+        """
+        Get the player's rank on the leaderboard.
+
+        :param player_name: The name of the player.
+        :return: A tuple containing the player's rank and score or None if not found.
+        """
+        data = self.get_player_score(player_name)
+        if data is None:
+            return None
+        with self.connection() as conn:
+            better = conn.execute('SELECT COUNT(*) FROM PlayerWins WHERE Wins > ?', (data[1],)).fetchone()[0]
+        return better + 1, data[1]
+
+def merge_scores(players: List[Dict[str, Union[str, int]]], wins: Dict[str, int]) -> List[Dict[str, Union[str, int]]]:
+    """
+    Add wins to a list of player scores.
+
+    :param players: A list of dictionaries containing player names and their scores, as returned by get_all_scores.
+    :param wins: A mapping of player names to the number of wins to add.
+    :return: The players list, updated in place, followed by the players that were not in it.
+    """
+    wins = dict(wins)
+    for player in players:
+        player['wins'] += wins.pop(player['name'], 0)
+    players.extend({'name': name, 'wins': count} for name, count in wins.items())
+    return players
+
+
+class ScoreBuffer:
+    def __init__(self, db_manager: DatabaseManager, flush_interval: float = 1.0, max_pending: int = 1000):
+        """
+        Initialize a ScoreBuffer object.
+
+        A ScoreBuffer sits in front of a DatabaseManager and offers the same score methods. Wins are added up in memory
+        and written in one transaction when max_pending wins are waiting, every flush_interval seconds and when the
+        process exits. Reads merge the buffered wins with the database, so they never see stale scores.
+
+        :param db_manager: The DatabaseManager the wins are written to.
+        :param flush_interval: Seconds between background flushes, or None to only flush on size and on close.
+        :param max_pending: The number of buffered wins that triggers a flush.
+        """
+        self.db_manager = db_manager
+        self.max_pending = max_pending
+        self.version = 0
+        self.pending = Counter()
+        self.pending_count = 0
+        # Wins taken out of pending by a flush that has not been committed yet.
+        self.in_flight = Counter()
+        # The GameResults of the buffered wins that came from record_game, and of those in flight
+        self.pending_results = []
+        self.in_flight_results = []
+        self._lock = threading.Lock()
+        # Held while wins move from in_flight to the database, so that reads never count them twice or not at all.
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, args=(flush_interval,), daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_periodically(self, flush_interval: float) -> None:
+        while not self._closed.wait(flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing buffered scores failed.")
+
+    def update_score(self, winner_name: str) -> None:
+        """
+        Buffer one win for the given winner.
+
+        :param winner_name: The name of the winner.
+        """
+        self.bulk_update_scores({winner_name: 1})
+
+    def bulk_update_scores(self, wins: Dict[str, int]) -> None:
+        """
+        Buffer many players' wins.
+
+        :param wins: A mapping of player names to the number of wins to add, such as a collections.Counter.
+        """
+        with self._lock:
+            self.pending.update(wins)
+            self.pending_count += sum(wins.values())
+            self.version += 1
+            full = self.pending_count >= self.max_pending
+        if full:
+            self.flush()
+
+    def record_game(self, result: GameResult) -> None:
+        """
+        Buffer the win and the statistics of a finished game.
+
+        :param result: The GameResult of the game.
+        """
+        self.record_games([result])
+
+    def record_games(self, results: List[GameResult]) -> None:
+        """
+        Buffer the wins and the statistics of finished games.
+
+        :param results: The GameResult of every game.
+        """
+        with self._lock:
+            self.pending.update(result.winner for result in results)
+            self.pending_count += len(results)
+            self.pending_results.extend(results)
+            self.version += 1
+            full = self.pending_count >= self.max_pending
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write every buffered win and game result to the database in one transaction.
+
+        When the database is locked or busy the batch stays buffered for the next flush. When any other error stops
+        the transaction, the games are written one at a time instead, and those that cannot be written are logged and
+        dropped so that they do not block the rest.
+        """
+        with self._write_lock:
+            with self._lock:
+                batch, self.pending, self.pending_count = self.pending, Counter(), 0
+                results, self.pending_results = self.pending_results, []
+                self.in_flight, self.in_flight_results = batch, results
+            if not batch:
+                return
+            try:
+                self._write(batch, results)
+            except sqlite3.OperationalError:
+                # The database is locked or busy, so the batch goes back into the buffer for the next flush
+                self._restore(batch, results)
+                raise
+            except Exception:
+                # Some result can never be written, and retrying the batch would fail on every flush
+                logger.exception("Writing buffered scores failed, writing the games one at a time.")
+                self._write_separately(batch, results)
+            finally:
+                with self._lock:
+                    self.in_flight, self.in_flight_results = Counter(), []
+
+    def _write(self, batch: Counter, results: List[GameResult]) -> None:
+        if results:
+            # The wins of the results are counted by record_games, so only the rest are passed on
+            self.db_manager.record_games(results, batch - Counter(result.winner for result in results))
+        else:
+            self.db_manager.bulk_update_scores(batch)
+
+    def _write_separately(self, batch: Counter, results: List[GameResult]) -> None:
+        extra_wins = batch - Counter(result.winner for result in results)
+        for index, result in enumerate(results):
+            try:
+                self.db_manager.record_game(result)
+            except sqlite3.OperationalError:
+                rest = results[index:]
+                self._restore(extra_wins + Counter(result.winner for result in rest), rest)
+                raise
+            except Exception:
+                logger.exception(f"Dropped the result of a game that cannot be recorded: {result}")
+        if extra_wins:
+            try:
+                self.db_manager.bulk_update_scores(extra_wins)
+            except sqlite3.OperationalError:
+                self._restore(extra_wins, [])
+                raise
+
+    def _restore(self, batch: Counter, results: List[GameResult]) -> None:
+        with self._lock:
+            self.pending.update(batch)
+            self.pending_count += sum(batch.values())
+            self.pending_results[:0] = results
+
+    def close(self) -> None:
+        """
+        Stop the background flushes and write every buffered win to the database.
+        """
+        self._closed.set()
+        self.flush()
+
+    def _buffered(self) -> Counter:
+        with self._lock:
+            return self.pending + self.in_flight
+
+    def get_player_score(self, player_name: str) -> Union[tuple, None]:
+        """
+        Get the player's score, including buffered wins.
+
+        :param player_name: The name of the player.
+        :return: A tuple containing the player's name and score or None if not found.
+        """
+        with self._write_lock:
+            data = self.db_manager.get_player_score(player_name)
+            buffered = self._buffered()[player_name]
+        if not buffered:
+            return data
+        return player_name, (data[1] if data else 0) + buffered
+
+    def get_all_scores(self) -> List[Dict[str, Union[str, int]]]:
+        """
+        Get all player scores, including buffered wins.
+
+        :return: A list of dictionaries containing player names and their scores.
+        """
+        with self._write_lock:
+            players = self.db_manager.get_all_scores()
+            buffered = self._buffered()
+        return merge_scores(players, buffered)
+
+    def reset_all_scores(self) -> List[Dict[str, Union[str, int]]]:
+        """
+        Reset all scores, including buffered wins, and return the reset scores.
+
+        :return: A list of dictionaries containing player names and their reset scores.
+        """
+        with self._write_lock:
+            with self._lock:
+                buffered, self.pending, self.pending_count = self.pending, Counter(), 0
+                self.pending_results = []
+                self.version += 1
+            players = self.db_manager.reset_all_scores()
+        return merge_scores(players, buffered)
+
+    def get_player_stats(self, player_name: str) -> Union[Dict, None]:
+        """
+        Get a player's statistics, including buffered game results.
+
+        :param player_name: The name of the player.
+        :return: Dictionary of statistics as returned by format_player_stats, or None if no game of the player was
+                 recorded.
+        """
+        with self._write_lock:
+            data = self.db_manager.read_player_stats(player_name)
+            with self._lock:
+                results = [result for result in self.in_flight_results + self.pending_results
+                           if player_name in result.players]
+        if not results:
+            return format_player_stats(*data) if data is not None else None
+        entry, head_to_head = data if data is not None else ([0, 0, 0, 0, 0], {})
+        _, stats, pairs = aggregate_results(results)
+        buffered = stats[player_name]
+        entry = [total + added for total, added in zip(entry[:4], buffered[:4])] + [max(entry[4], buffered[4])]
+        for (name, opponent), pair in pairs.items():
+            if name == player_name:
+                total = head_to_head.setdefault(opponent, [0, 0])
+                total[0] += pair[0]
+                total[1] += pair[1]
+        return format_player_stats(entry, head_to_head)
+
+    def get_top_scores(self, limit: int, offset: int = 0) -> List[Dict[str, Union[str, int]]]:
+        """
+        Write the buffered wins and get one page of the leaderboard, best players first.
+
+        :param limit: The maximum number of players to return.
+        :param offset: The number of players to skip.
+        :return: A list of dictionaries containing player names, their scores and their ranks.
+        """
+        self.flush()
+        return self.db_manager.get_top_scores(limit, offset)
+
+    def get_player_rank(self, player_name: str) -> Union[tuple, None]:
+        """
+        Write the buffered wins and get the player's rank on the leaderboard.
+
+        :param player_name: The name of the player.
+        :return: A tuple containing the player's rank and score or None if not found.
+        """
+        self.flush()
+        return self.db_manager.get_player_rank(player_name)
+
+
+class Leaderboard:
+    def __init__(self, db_manager, max_entries: int = 256, ttl: float = 1.0):
+        """
+        Initialize a Leaderboard object.
+
+        A Leaderboard caches score queries in memory. The cache is dropped whenever the version of the DatabaseManager
+        or ScoreBuffer changes, which happens on every score update made through it, and every ttl seconds so that
+        updates made by other processes sharing the database are seen too.
+
+        :param db_manager: The DatabaseManager or ScoreBuffer to read the scores from.
+        :param max_entries: The maximum number of cached queries.
+        :param ttl: The longest a query is served from the cache, in seconds.
+        """
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache = {}
+        self.cache_version = None
+        self.cache_expires = 0.0
+        self._lock = threading.Lock()
+
+    def _cached(self, key, query):
+        version = self.db_manager.version
+        now = time.monotonic()
+        with self._lock:
+            if self.cache_version != version or now >= self.cache_expires:
+                self.cache = {}
+                self.cache_version = version
+                self.cache_expires = now + self.ttl
+            elif key in self.cache:
+                return self.cache[key]
+            cache = self.cache
+        result = query()
+        with self._lock:
+            # A cache dropped while the query ran may already be older than the result
+            if self.cache is cache:
+                if len(self.cache) >= self.max_entries:
+                    self.cache.pop(next(iter(self.cache)))
+                self.cache[key] = result
+        return result
+
+    def get_scores(self, limit: int = None, offset: int = 0) -> List[Dict[str, Union[str, int]]]:
+        """
+        Get the players' scores.
+
+        :param limit: The maximum number of players to return, best players first, or None for every player in the
+                      order they were added.
+        :param offset: The number of players to skip when limit is given.
+        :return: A list of dictionaries containing player names and their scores, and their ranks when limit is given.
+        """
+        if limit is None:
+            return self._cached(('all',), self.db_manager.get_all_scores)
+        return self._cached(('top', limit, offset), lambda: self.db_manager.get_top_scores(limit, offset))
+
+    def get_player_rank(self, player_name: str) -> Union[tuple, None]:
+        """
+        Get the player's rank on the leaderboard.
+
+        :param player_name: The name of the player.
+        :return: A tuple containing the player's rank and score or None if not found.
+        """
+        return self._cached(('rank', player_name), lambda: self.db_manager.get_player_rank(player_name))
+
+
+class GameLogStore:
+    def __init__(self, db_manager: DatabaseManager, max_entries: int = 1024, max_stored: int = 100000):
+        """
+        Initialize a GameLogStore object.
+
+        A GameLogStore keeps the GameReplay records of the most recently played games in memory, keyed by game ID.
+        When there are more than max_entries of them, the least recently used one is moved to the GameLogs table of
+        the database, which keeps the records of at most max_stored games. A record is a few dozen bytes; the logs
+        are rendered from it on demand.
+
+        :param db_manager: The DatabaseManager whose database the spilled records are written to.
+        :param max_entries: The maximum number of game records kept in memory.
+        :param max_stored: The maximum number of game records kept in the database.
+        """
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.max_stored = max_stored
+        self.entries = OrderedDict()
+        self.latest_id = None
+        self._lock = threading.Lock()
+        with self.db_manager.connection() as conn:
+            columns = [column[1] for column in conn.execute('PRAGMA table_info(GameLogs)').fetchall()]
+            if columns and 'Deal' not in columns:
+                # Logs stored as compressed event lists by earlier versions cannot be replayed
+                conn.execute('DROP TABLE GameLogs;')
+            conn.execute('CREATE TABLE IF NOT EXISTS GameLogs (Id integer PRIMARY KEY, GameId text UNIQUE NOT NULL, '
+                         'Players text NOT NULL, Deal blob NOT NULL, TotalWins int NOT NULL, Seed);')
+
+    def add(self, replay: 'GameReplay') -> str:
+        """
+        Store the record of a finished game.
+
+        :param replay: The GameReplay of the game.
+        :return: The ID of the game
+        """
+        game_id = uuid.uuid4().hex
+        with self._lock:
+            self.entries[game_id] = replay
+            self.latest_id = game_id
+            if len(self.entries) > self.max_entries:
+                self._spill(*self.entries.popitem(last=False))
+        return game_id
+
+    def _spill(self, game_id: str, replay: 'GameReplay') -> None:
+        with self.db_manager.connection() as conn:
+            cursor = conn.execute('INSERT INTO GameLogs (GameId, Players, Deal, TotalWins, Seed) VALUES (?, ?, ?, ?, ?);',
+                                  (game_id, json.dumps(replay.player_names), replay.deal, replay.total_wins,
+                                   replay.seed))
+            conn.execute('DELETE FROM GameLogs WHERE Id <= ?;', (cursor.lastrowid - self.max_stored,))
+
+    def get(self, game_id: str = None) -> Union['GameReplay', None]:
+        """
+        Get the record of a game.
+
+        :param game_id: The ID of the game, or None for the most recent game.
+        :return: The game's GameReplay, which renders its log when iterated, or None if it is not stored.
+        """
+        with self._lock:
+            if game_id is None:
+                game_id = self.latest_id
+            if game_id in self.entries:
+                self.entries.move_to_end(game_id)
+                return self.entries[game_id]
+        query = 'SELECT Players, Deal, TotalWins, Seed FROM GameLogs '
+        with self.db_manager.connection() as conn:
+            if game_id is None:
+                row = conn.execute(query + 'ORDER BY Id DESC LIMIT 1;').fetchone()
+            else:
+                row = conn.execute(query + 'WHERE GameId = ?;', (game_id,)).fetchone()
+        if row is None:
+            return None
+        return GameReplay(json.loads(row[0]), row[1], row[2], row[3])
+
+
 class Card:
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
+    """
+    A playing card. There is exactly one Card object for each of the 52 cards: Card(rank, suit) returns the shared,
+    immutable instance, so decks and hands hold references instead of allocating cards for every game.
+    """
+    __slots__ = ('rank', 'suit', 'code')
+
+    def __new__(cls, rank, suit):
+        card = _interned_cards.get((rank, suit))
+        if card is None:
+            card = super().__new__(cls)
+            object.__setattr__(card, 'rank', rank)
+            object.__setattr__(card, 'suit', suit)
+            # The packed form of the card, as stored in a game's deal
+            object.__setattr__(card, 'code', SUITS.index(suit) << 4 | rank)
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cards are shared between games and cannot be changed")
+
+    def __reduce__(self):
+        return Card, (self.rank, self.suit)
 
     def __str__(self):
         return f'{self.rank} of {self.suit}'
 
 
+_interned_cards = {}
+# The 52 cards in the order of a new, unshuffled deck; a card's index is its position here
+CARDS = tuple(Card(rank, suit) for suit in SUITS for rank in range(2, 15))
+_interned_cards.update(((card.rank, card.suit), card) for card in CARDS)
+CARDS_BY_CODE = {card.code: card for card in CARDS}
+
+
+def highest_cards(players, cards) -> list:
+    """
+    Find the players who played the highest card, in one pass over the cards.
+
+    :param players: The players who played, in playing order.
+    :param cards: The card played by each player.
+    :return: The players tied for the highest rank, in playing order
+    """
+    best_rank = 0
+    leaders = []
+    for player, card in zip(players, cards):
+        rank = card.rank
+        if rank > best_rank:
+            best_rank = rank
+            leaders = [player]
+        elif rank == best_rank:
+            leaders.append(player)
+    return leaders
+
+
+def pack_cards(cards) -> bytes:
+    """
+    Pack cards one byte per card, with the suit index in the high nibble and the rank in the low nibble.
+
+    :param cards: A list of card objects.
+    :return: The packed cards in the same order
+    """
+    return bytes(card.code for card in cards)
+
+
 class Deck:
-    def __init__(self):
-        self.cards = []
-        for suit in ['Hearts', 'Diamonds', 'Clubs', 'Spades']:
-            for rank in range(2, 15):
-                self.cards.append(Card(rank, suit))
-        self.shuffle()
+    def __init__(self, rng=None, deal: bytes = None):
+        """
+        Initialize a Deck object.
+
+        :param rng: The random.Random used to shuffle the deck, or None for the global random module.
+        :param deal: Packed cards, as returned by pack, to put in the deck in that order instead of shuffling.
+        """
+        # The random module itself is never stored, which keeps the deck and its Game picklable
+        self.rng = rng
+        if deal is not None:
+            self.cards = [CARDS_BY_CODE[code] for code in deal]
+        else:
+            # A shuffled copy of the shared card tuple; no cards are created
+            self.cards = list(CARDS)
+            self.shuffle()
 
     def shuffle(self):
         """
         Shuffle the cards in the deck.
         """
-        random.shuffle(self.cards)
+        (self.rng or random).shuffle(self.cards)
+
+    def pack(self) -> bytes:
+        """
+        Pack the cards in the deck.
+
+        :return: The packed cards in deck order
+        """
+        return pack_cards(self.cards)
 
     def deal(self):
         """
@@ -138,9 +1043,6 @@ class Player:
 
         :return: A list containing the card played and the player's name
         """
-        log_entry = self.name + " has " + str(len(self.hand)) + " cards"
-        logger.info(log_entry)
-        logs.append(log_entry)
         card = self.hand.pop()
 
         return [card, self.name]
@@ -155,126 +1057,331 @@ class Player:
 
 
 class Game:
-    def __init__(self, players):
+    def __init__(self, players, recorder=None, db_manager=None, seed=None, rng=None, deal=None, max_rounds=None):
         """
         Initialize a Game object.
 
-        :param players: List of Player objects participating in the game.
+        :param players: List of MIN_PLAYERS to MAX_PLAYERS Player objects participating in the game.
+        :param recorder: Recorder for the game events, such as an EventRecorder. Events are discarded when it is None.
+        :param db_manager: DatabaseManager to record the result in. A new one is created when the result is recorded
+                           if it is None.
+        :param seed: Seed for the game's own random.Random. The deck is shuffled with the global random module when
+                     neither seed nor rng is given.
+        :param rng: The random.Random used to shuffle the deck.
+        :param deal: The packed deck of an earlier game, from its deal attribute, to replay that game.
+        :param max_rounds: The number of rounds after which the game is stopped, or None to play until it ends.
         """
+        if not MIN_PLAYERS <= len(players) <= MAX_PLAYERS:
+            raise ValueError(f"A game needs {MIN_PLAYERS} to {MAX_PLAYERS} players, got {len(players)}")
         self.players = players
-        logs = []
-        self.deck = Deck()
-        log_entry = f"Deck size: {len(self.deck.cards)}"
-        logger.info(log_entry)
-        logs.append(log_entry)
+        # The players who still have cards, in playing order
+        self.active = list(players)
+        self.recorder = recorder if recorder is not None else NullRecorder()
+        if rng is None and seed is not None:
+            rng = random.Random(seed)
+        self.seed = seed
+        self.deck = Deck(rng, deal)
+        # The shuffled deck, 52 bytes, which is all it takes to replay the game
+        self.deal = self.deck.pack()
         self.deal_cards()
-        self.db_manager = DatabaseManager()
+        self.db_manager = db_manager
+        self.max_rounds = max_rounds
+        self.rounds = 0
+        self.wars = 0
+        self.longest_war = 0
+        self.winner = None
+        # Seconds spent in play_rounds, and the Unix time at which it ended
+        self.duration = 0.0
+        self.finished_at = None
+        # The number of cards played in the last round, wars included
+        self.cards_on_table = 0
+        # The hand state that must_stop compares with, and the rounds until it is moved forward
+        self.saved_state = None
+        self.state_interval = self.state_steps = 1
 
 
     def deal_cards(self):
         """
-        Deal cards to each player.
+        Deal the whole deck to the players, one card at a time in turn. With more than two players some players may
+        get one card more than others.
         """
-        for _ in range(26):
-            for player in self.players:
-                card = self.deck.deal()
-                player.hand.append(card)
+        players = self.players
+        for index in range(len(self.deck.cards)):
+            card = self.deck.deal()
+            players[index % len(players)].hand.append(card)
 
-    def players_play_card(self):
+    def players_play_card(self, players=None):
         """
         Get the cards played by the players.
 
+        :param players: The players who play a card, or None for every player still in the game.
         :return: A list of cards played by the players
         """
+        record = self.recorder.record
         cards_played = []
-        for player in self.players:
-            play_card_result = player.play_card()
-            card_play = play_card_result[0]
+        for player in self.active if players is None else players:
+            card_play = player.play_card()[0]
             cards_played.append(card_play)
-            log_entry = str(play_card_result[1]) + " played " + str(card_play.rank) + ". Total cards left = " + str(
-                len(player.hand))
-            logger.info(log_entry)
-            logs.append(log_entry + "\n")
+            record(EVENT_PLAY, player.name, card_play.rank, len(player.hand))
         return cards_played
 
+    def eliminate(self, player):
+        """
+        Take a player who has run out of cards out of the game.
+
+        :param player: The player object to remove from the rotation.
+        """
+        self.active.remove(player)
+        if len(self.active) > 1:
+            self.recorder.record(EVENT_ELIMINATED, player.name)
+
     def play_round(self):
         """
         Play a round of the game and update the players' hands.
 
-        :return: The player object who won the round
+        :return: The player object who won the round, or None if nobody won the war
         """
-        cards_played = self.players_play_card()
-        ranks_played = [card.rank for card in cards_played]
+        players = list(self.active)
+        cards_played = self.players_play_card(players)
+        leaders = highest_cards(players, cards_played)
 
-        if len(set(ranks_played)) == 1:
-            winner = self.resolve_war(cards_played, ranks_played)
+        if len(leaders) > 1:
+            winner = self.resolve_war(cards_played, leaders)
         else:
-            winner = self.players[ranks_played.index(max(ranks_played))]
+            winner = leaders[0]
             winner.add_cards(cards_played)
-            log_entry = f"{winner.name} won {len(cards_played)} cards.\n"
-            logger.info(log_entry)
-            logs.append(log_entry)
+            self.recorder.record(EVENT_WON_CARDS, winner.name, len(cards_played))
+        # resolve_war adds the cards of the war to cards_played
+        self.cards_on_table = len(cards_played)
 
+        if len(self.active) > 1:
+            for player in [player for player in self.active if not player.hand]:
+                self.eliminate(player)
         return winner
 
-    def resolve_war(self, cards_played, ranks_played):
-        logger.info('War!')
-        logs.append('\nWar!\n')
-        while len(set(ranks_played)) == 1:
-            cards_played.extend(self.players_play_card())
-            new_cards = self.players_play_card()
-            cards_played.extend(new_cards)
-            ranks_played = [card.rank for card in new_cards]
-            if len(set(ranks_played)) != 1:
-                logger.info('War continued!')
-                logs.append('\nWar continued!\n')
-
-        winner = self.players[ranks_played.index(max(ranks_played))]
+    def resolve_war(self, cards_played, leaders):
+        """
+        Play a war between the players tied for the highest card.
+
+        Each player at war plays one card face down and one face up, and the war goes on between the players tied
+        for the highest face-up card. A player who runs out of cards during the war is out of the game. When fewer
+        than two players are left in the game, it ends at once; when every player at war runs out, the game goes on.
+        Either way the cards on the table are out of play.
+
+        :param cards_played: The cards played in the round so far. The winner of the war takes them all.
+        :param leaders: The players tied for the highest card.
+        :return: The player object who won the war, or None if nobody did
+        """
+        record = self.recorder.record
+        record(EVENT_WAR)
+        self.wars += 1
+        war_length = 0
+        while len(leaders) > 1:
+            war_length += 1
+            if war_length > self.longest_war:
+                self.longest_war = war_length
+            # One card face down, then one face up
+            for _ in range(2):
+                at_war = []
+                new_cards = []
+                for player in leaders:
+                    if not player.hand:
+                        self.eliminate(player)
+                        if len(self.active) < 2:
+                            record(EVENT_DECK_EMPTY)
+                            return None
+                        continue
+                    at_war.append(player)
+                    new_cards.extend(self.players_play_card([player]))
+                leaders = at_war
+                cards_played.extend(new_cards)
+            if not leaders:
+                return None
+            if len(leaders) > 1:
+                leaders = highest_cards(leaders, new_cards)
+                if len(leaders) == 1:
+                    record(EVENT_WAR_CONTINUED)
+
+        winner = leaders[0]
         winner.add_cards(cards_played)
-        log_entry = f"{winner.name} won {len(cards_played)} cards.\n"
-        logger.info(log_entry)
-        logs.append(log_entry)
+        record(EVENT_WON_CARDS, winner.name, len(cards_played))
         return winner
 
-    def play_game(self):
+    def play_rounds(self):
         """
-        Play the game and update the players' scores.
+        Play rounds until the game is over, without touching the database.
+
+        Players who run out of cards are out of the game, which goes on until one player is left. Deterministic War
+        can cycle forever, so after CYCLE_CHECK_AFTER rounds the hands are packed into a state key before every
+        round. The game is stopped when a state repeats or after max_rounds rounds. The player holding the most
+        cards wins, with ties going to the player who comes first.
 
-        :return: A tuple containing the winner's name, the number of wins, and a list of logs.
+        :return: The player object who won the game
         """
+        deque(self.iter_rounds(results=False), maxlen=0)
+        return self.winner
 
-        logs.append(f"{self.players[0].name} has {len(self.players[0].hand)} cards.")
-        logs.append(f"{self.players[1].name} has {len(self.players[1].hand)} cards.")
-        logger.info(logs[-2])
-        logger.info(logs[-1])
+    def iter_rounds(self, results=True):
+        """
+        Play the game one round at a time, without touching the database.
+
+        Each round is only played when the caller asks for it, so a game can be streamed while it is played. The
+        winner attribute is set once the generator is exhausted, and the time the caller spends between rounds is not
+        counted in the duration attribute. play_rounds runs this generator to the end.
+
+        :param results: Whether a RoundResult is yielded for every round. When it is False the whole game is played on
+                        the first request for a round, and nothing is yielded.
+        :return: A generator of the RoundResult of every round
+        """
+        record = self.recorder.record
+        players = self.players
+        for player in players:
+            record(EVENT_START_HAND, player.name, len(player.hand))
 
         round_count = 0
+        start = time.perf_counter()
 
-        try:
-            while all(player.hand for player in self.players):
-                round_count += 1
-                print(f'\nRound {round_count} -')
-                logs.append(f"\nRound {round_count} -")
-                self.play_round()
-        except IndexError:
-            print("A player's deck is empty")
-            logs.append("\nA player's deck is empty")
+        while len(self.active) > 1:
+            if (round_count == self.max_rounds or round_count >= CYCLE_CHECK_AFTER) and self.must_stop(round_count):
+                break
+            round_count += 1
+            record(EVENT_ROUND, round_count)
+            wars = self.wars
+            winner = self.play_round()
+            if results:
+                self.rounds = round_count
+                self.duration += time.perf_counter() - start
+                yield RoundResult(round_count, winner.name if winner is not None else None, self.cards_on_table,
+                                  self.wars != wars, tuple([len(player.hand) for player in players]))
+                start = time.perf_counter()
+        self.duration += time.perf_counter() - start
+        self.finish(round_count)
+
+    def must_stop(self, round_count):
+        """
+        Check whether the game is stopped before its next round, because of max_rounds or a repeated hand state.
+
+        The hand state is compared with a saved state, which is moved forward after 1, 2, 4, 8... checks (Brent's
+        cycle detection), so a cycle of any length is found while only one state is kept.
+
+        :param round_count: The number of rounds played so far.
+        :return: True if the game is stopped
+        """
+        record = self.recorder.record
+        if round_count == self.max_rounds:
+            record(EVENT_ROUND_LIMIT, round_count)
+            return True
+        if round_count >= CYCLE_CHECK_AFTER:
+            state = b'\xff'.join(pack_cards(player.hand) for player in self.players)
+            if state == self.saved_state:
+                record(EVENT_CYCLE)
+                return True
+            if self.state_steps == self.state_interval:
+                self.saved_state, self.state_interval, self.state_steps = state, self.state_interval * 2, 0
+            self.state_steps += 1
+        return False
+
+    def finish(self, round_count):
+        """
+        End the game and pick its winner.
 
+        :param round_count: The number of rounds played.
+        :return: The player object who won the game
+        """
+        self.rounds = round_count
+        self.finished_at = time.time()
+        record = self.recorder.record
         for player in self.players:
-            logs.append(f"{player.name} has {len(player.hand)}")
+            record(EVENT_FINAL_HAND, player.name, len(player.hand))
 
         winner = max(self.players, key=lambda player: len(player.hand))
         winner.wins += 1
-        log_winner = f"Winner: {winner.name}"
-        log_wins = f"Wins: {winner.wins}"
-        logger.info(log_winner)
-        logger.info(log_wins)
-        logs.append("\n" + log_winner)
-        logs.append(log_wins)
-        self.db_manager.update_score(winner.name)
+        self.winner = winner
+        return winner
+
+    def result(self) -> GameResult:
+        """
+        Get the compact record of the finished game.
+
+        :return: The GameResult of the game
+        """
+        return GameResult(tuple(player.name for player in self.players), self.winner.name, self.rounds, self.wars,
+                          self.longest_war, self.seed, self.duration, self.finished_at)
+
+    def record_result(self, winner):
+        """
+        Add the win to the winner's score in the database, and the game's result to the players' statistics.
+
+        :param winner: The player object who won the game.
+        :return: The winner's total number of wins
+        """
+        if self.db_manager is None:
+            self.db_manager = DatabaseManager()
+        self.winner = winner
+        self.db_manager.record_game(self.result())
         player_score = self.db_manager.get_player_score(winner.name)[1]
-        log_end = f'\nGame Over!\n{winner.name} won the game with {player_score} total wins'
-        print(log_end)
-        logs.append("\n" + log_end)
-        return winner.name, winner.wins, logs
+        self.recorder.record(EVENT_WINNER, winner.name, winner.wins, player_score)
+        logger.info(f"Game Over! {winner.name} won the game with {player_score} total wins")
+        return player_score
+
+    def play_game(self):
+        """
+        Play the game and update the players' scores.
+
+        :return: A tuple containing the winner's name, the number of wins and the game's recorder.
+        """
+        winner = self.play_rounds()
+        self.record_result(winner)
+        return winner.name, winner.wins, self.recorder
+
 
+class GameReplay:
+    def __init__(self, player_names: List[str], deal: bytes, total_wins: int, seed=None):
+        """
+        Initialize a GameReplay object.
+
+        A GameReplay is the compact record of a finished game: the players, the 52-byte shuffled deck and the winner's
+        total wins at the end of the game. The game's full log is regenerated on demand by playing the deal again.
+
+        :param player_names: The names of the players, in playing order.
+        :param deal: The packed deck the game was dealt from.
+        :param total_wins: The winner's total number of wins after the game.
+        :param seed: The seed the game was shuffled with, if it had one.
+        """
+        self.player_names = list(player_names)
+        self.deal = bytes(deal)
+        self.total_wins = total_wins
+        self.seed = seed
+
+    @classmethod
+    def from_game(cls, game: Game, total_wins: int) -> 'GameReplay':
+        """
+        Create the record of a finished game.
+
+        :param game: The finished Game.
+        :param total_wins: The winner's total number of wins, as returned by Game.record_result.
+        :return: A GameReplay object
+        """
+        return cls([player.name for player in game.players], game.deal, total_wins, game.seed)
+
+    def recorder(self) -> EventRecorder:
+        """
+        Replay the game.
+
+        :return: An EventRecorder holding the same events as the original game
+        """
+        game = Game([Player(name) for name in self.player_names], recorder=EventRecorder(), deal=self.deal)
+        winner = game.play_rounds()
+        game.recorder.record(EVENT_WINNER, winner.name, winner.wins, self.total_wins)
+        return game.recorder
+
+    def __iter__(self):
+        return self.lines()
+
+    def lines(self):
+        """
+        Render the log of the game by replaying it.
+
+        :return: A generator of log lines.
+        """
+        return self.recorder().lines()
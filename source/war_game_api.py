@@ -1,21 +1,234 @@
-from flask import Flask, request
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from flask import Flask, Response, g, request
 #from source.war_game import DatabaseManager, Game, Card, Deck, Player
 import war_game
+import war_game_client
+import war_game_jobs
+import war_game_metrics
 
 app = Flask(__name__)
 
-logs = []
-players = []
+# The events of recent games, keyed by game ID; they are rendered as text when the logs are requested.
+log_store = None
+# Only the most recent player names are kept
+MAX_RECENT_PLAYERS = 1000
+players = deque(maxlen=MAX_RECENT_PLAYERS)
+db_manager = None
+leaderboard = None
+db_manager_lock = threading.Lock()
+# The most recent tournaments, by ID; the oldest is forgotten when a new one would exceed MAX_TOURNAMENTS
+MAX_TOURNAMENTS = 100
+tournaments = OrderedDict()
+tournament_executor = None
+# Set WAR_GAME_PROFILE_RATE to a fraction such as 0.01 to profile that share of /api/start_game requests. The
+# cProfile output is written to WAR_GAME_PROFILE_DIR, reusing the same MAX_PROFILES file names over and over.
+profile_rate = float(os.environ.get('WAR_GAME_PROFILE_RATE') or 0)
+PROFILE_DIR = os.environ.get('WAR_GAME_PROFILE_DIR', 'data/profiles')
+MAX_PROFILES = 100
+# Separate from the global random module, which unseeded games are shuffled with
+profile_rng = random.Random()
+# Only one request is profiled at a time
+profile_lock = threading.Lock()
+profile_counter = itertools.count()
+# Plays the games submitted to /api/games; WAR_GAME_JOB_WORKERS sets the number of worker threads
+job_queue = None
+# The longest a request to GET /api/games may wait for its games to finish, in seconds
+MAX_JOB_WAIT = 30.0
+# The most players one page of /api/get_player_wins returns
+MAX_PAGE_SIZE = 1000
+# Seeds are stored in an SQLite integer column, which holds signed 64-bit values
+MIN_SEED = -2 ** 63
+MAX_SEED = 2 ** 63 - 1
+
+
+def get_db_manager():
+    """
+    Get the DatabaseManager shared by every request, creating it on first use.
+
+    Setting the WAR_GAME_FLUSH_INTERVAL environment variable puts a ScoreBuffer in front of it, which writes the
+    buffered wins every that many seconds.
+
+    :return: The shared DatabaseManager or ScoreBuffer
+    """
+    global db_manager
+    with db_manager_lock:
+        if db_manager is None:
+            manager = war_game.DatabaseManager()
+            flush_interval = os.environ.get('WAR_GAME_FLUSH_INTERVAL')
+            if flush_interval:
+                manager = war_game.ScoreBuffer(manager, flush_interval=float(flush_interval))
+            db_manager = manager
+    return db_manager
+
+
+def get_leaderboard():
+    """
+    Get the Leaderboard shared by every request, creating it on first use.
+
+    :return: The shared Leaderboard
+    """
+    global leaderboard
+    manager = get_db_manager()
+    with db_manager_lock:
+        if leaderboard is None or leaderboard.db_manager is not manager:
+            leaderboard = war_game.Leaderboard(manager)
+    return leaderboard
+
+
+def get_log_store():
+    """
+    Get the GameLogStore shared by every request, creating it on first use.
+
+    :return: The shared GameLogStore
+    """
+    global log_store
+    if log_store is None:
+        manager = get_db_manager()
+        with db_manager_lock:
+            if log_store is None:
+                # Game logs are written straight to the database, never through a ScoreBuffer
+                log_store = war_game.GameLogStore(getattr(manager, 'db_manager', manager))
+    return log_store
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def keep_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_time(error=None):
+    """
+    Add the time taken by the request to the latency histogram of its route. Teardown runs for every request, so a
+    request that raised is timed too, with a 500 status.
+
+    :param error: The exception the request raised, if any. Streamed responses are timed up to their first byte.
+    """
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = g.pop('response_status', 500) if error is None else 500
+        war_game_metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method, str(status))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint for Prometheus to scrape.
+
+    :return: The request, database and game metrics in the Prometheus text format
+    """
+    return Response(war_game_metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def profiled(endpoint, function, *args):
+    """
+    Call a function, and profile the call for a sampled share of calls when profiling is switched on.
+
+    :param endpoint: The name the profile file and the profile counter are labelled with.
+    :param function: The function to call.
+    :param args: The function's arguments.
+    :return: The function's return value
+    """
+    if profile_rate <= 0 or profile_rng.random() >= profile_rate or not profile_lock.acquire(blocking=False):
+        return function(*args)
+    try:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args)
+        finally:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f'{endpoint}-{next(profile_counter) % MAX_PROFILES}.prof'))
+            war_game_metrics.PROFILES_TAKEN.inc(endpoint)
+    finally:
+        profile_lock.release()
 
 @app.route('/api/start_game', methods=['POST'])
 def api_start_game():
     """
     API endpoint to start a new game.
 
-    :return: JSON response containing the winner's name and number of wins
+    :return: JSON response containing the winner's name, number of wins and the ID of the game
     """
     if request.method == 'POST':
-        return start_game(request.get_json(force=True))
+        try:
+            return profiled('start_game', start_game, request.get_json(force=True))
+        except (KeyError, ValueError) as error:
+            return {"error": str(error)}, 400
+
+@app.route('/api/games', methods=['POST'])
+def api_submit_games():
+    """
+    API endpoint to queue one game, or a batch of games given as a games list, without waiting for them to be played.
+
+    :return: JSON response containing the job ID of every game, in the order they were given
+    """
+    try:
+        return {"job_ids": submit_games(request.get_json(force=True))}, 202
+    except (KeyError, TypeError, ValueError) as error:
+        return {"error": str(error)}, 400
+    except war_game_jobs.QueueFullError as error:
+        return {"error": str(error)}, 503
+
+@app.route('/api/games', methods=['GET'])
+def api_get_games():
+    """
+    API endpoint to poll the games given by one or more job_id query parameters. With the wait query parameter the
+    request waits up to that many seconds for all of them to finish.
+
+    :return: JSON response containing the state of every game, and the result of those that have finished
+    """
+    wait = min(max(request.args.get('wait', default=0.0, type=float), 0.0), MAX_JOB_WAIT)
+    try:
+        return {"jobs": get_job_queue().get(request.args.getlist('job_id'), wait)}
+    except KeyError as error:
+        return {"error": f"Unknown job {error}"}, 404
+
+def get_job_queue():
+    """
+    Get the JobQueue shared by every request, creating it on first use.
+
+    :return: The shared JobQueue
+    """
+    global job_queue
+    with db_manager_lock:
+        if job_queue is None:
+            workers = int(os.environ.get('WAR_GAME_JOB_WORKERS') or war_game_jobs.DEFAULT_WORKERS)
+            job_queue = war_game_jobs.JobQueue(start_game, workers=workers)
+    return job_queue
+
+def submit_games(details):
+    """
+    Queue games to be played by the job queue's workers.
+
+    :param details: The details of one game, as taken by start_game, or a dictionary containing a games list of them
+    :return: The job IDs of the games
+    """
+    return get_job_queue().submit(games_from(details))
+
+def games_from(details):
+    """
+    Get the games of a request to queue games.
+
+    :param details: The details of one game, as taken by start_game, or a dictionary containing a games list of them
+    :return: The list of game details
+    :raises ValueError: If there are no games, or the players or the seed of a game are not valid.
+    """
+    games = details["games"] if "games" in details else [details]
+    if not games:
+        raise ValueError("No games were given")
+    for game in games:
+        player_names_from(game)
+        seed_from(game)
+    return games
 
 @app.route('/api/get_player_score', methods=['POST'])
 def api_get_player_score():
@@ -32,68 +245,321 @@ def get_player_wins():
     """
     API endpoint to get the win counts for all players.
 
+    The optional limit and offset query parameters return one page of the leaderboard, best players first.
+
     :return: JSON response containing a list of players and their respective win counts
     """
     if request.method == 'GET':
-        return get_wins()
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        try:
+            return get_wins(limit, offset)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+
+@app.route('/api/get_player_rank', methods=['POST'])
+def api_get_player_rank():
+    """
+    API endpoint to get a specific player's rank on the leaderboard.
+
+    :return: JSON response containing the player's name, rank and number of wins
+    """
+    if request.method == 'POST':
+        return get_player_rank(request.get_json(force=True))
 
 def start_game(user_details):
     """
     Start a new game with the given user details.
 
-    :param user_details: Dictionary containing player1 and player2 names
-    :return: Dictionary containing the winner's name and number of wins
+    :param user_details: Dictionary containing player1 and player2 names, or a players list of 2 to 8 names, and
+                         optionally a seed for the shuffle
+    :return: Dictionary containing the winner's name, number of wins and the ID of the game
+    """
+    # Events are not recorded while playing; the log is regenerated from the deal when it is requested.
+    game = new_game(user_details)
+    with war_game_metrics.GAMES_IN_FLIGHT.track(), war_game_metrics.GAME_SECONDS.time():
+        winner = game.play_rounds()
+    war_game_metrics.GAME_ROUNDS.observe(game.rounds)
+    war_game_metrics.GAME_WARS.observe(game.wars)
+    total_wins = game.record_result(winner)
+    game_id = get_log_store().add(war_game.GameReplay.from_game(game, total_wins))
+    return {"winner": winner.name, "wins": winner.wins, "game_id": game_id}
+
+@app.route('/api/stream_game', methods=['GET'])
+def api_stream_game():
+    """
+    API endpoint to play a new game and stream its rounds as Server-Sent Events while they are played.
+
+    The players are given by the player1 and player2 query parameters, or by repeated players parameters, and the
+    optional seed parameter fixes the shuffle. Every round is sent as a round event, and a result event with the
+    winner, the number of wins and the ID of the game follows the last one.
+
+    :return: A text/event-stream response, or a JSON error with a 400 status when the players are not valid
     """
-    player1_name = user_details["player1"]
-    player2_name = user_details["player2"]
+    details = {"players": request.args.getlist('players')} if 'players' in request.args else dict(request.args)
+    if 'seed' in request.args:
+        details["seed"] = request.args.get('seed', type=int)
+    try:
+        game = new_game(details)
+    except (KeyError, ValueError) as error:
+        return {"error": str(error)}, 400
+    events = (war_game_client.sse_event(name, data) for name, data in stream_game(game))
+    # Proxies must pass every event on at once rather than buffer the response
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache',
+                                                                   'X-Accel-Buffering': 'no'})
 
-    player1 = war_game.Player(player1_name)
-    player2 = war_game.Player(player2_name)
-    players.append(player1_name)
-    players.append(player2_name)
-    game = war_game.Game([player1, player2])
-    winner = game.play_game()
-    logs.append(winner[2])
-    return {"winner": winner[0], "wins": winner[1]}
+def new_game(user_details):
+    """
+    Create a new game with the given user details.
+
+    :param user_details: Dictionary containing player1 and player2 names, or a players list of 2 to 8 names, and
+                         optionally a seed for the shuffle
+    :return: The Game, dealt and ready to be played
+    """
+    player_names = player_names_from(user_details)
+    seed = seed_from(user_details)
+    game = war_game.Game([war_game.Player(name) for name in player_names], db_manager=get_db_manager(), seed=seed)
+    players.extend(player_names)
+    return game
+
+def stream_game(game):
+    """
+    Play a game one round at a time, then record its result.
+
+    Only the current round is held in memory; the log of the game is regenerated from the deal when it is
+    requested. A game whose stream is closed before its last round is not recorded.
+
+    :param game: The Game, as returned by new_game
+    :return: A generator of (event name, data) pairs: a round event for every round, then a result event
+    """
+    with war_game_metrics.GAMES_IN_FLIGHT.track():
+        for round_result in game.iter_rounds():
+            yield 'round', round_result._asdict()
+    yield 'result', finish_streamed_game(game)
 
-def get_wins():
+def finish_streamed_game(game):
+    """
+    Record a game played through iter_rounds and store its replay.
+
+    :param game: The Game, whose rounds have all been played
+    :return: Dictionary containing the winner's name, number of wins and total wins, the number of rounds and the ID
+             of the game
+    """
+    war_game_metrics.GAME_SECONDS.observe(game.duration)
+    war_game_metrics.GAME_ROUNDS.observe(game.rounds)
+    war_game_metrics.GAME_WARS.observe(game.wars)
+    total_wins = game.record_result(game.winner)
+    game_id = get_log_store().add(war_game.GameReplay.from_game(game, total_wins))
+    return {"winner": game.winner.name, "wins": game.winner.wins, "total_wins": total_wins, "rounds": game.rounds,
+            "game_id": game_id}
+
+def player_names_from(user_details):
+    """
+    Get the names of the players of a new game.
+
+    :param user_details: Dictionary containing player1 and player2 names, or a players list of names
+    :return: The list of player names
+    :raises ValueError: If players is not a list of strings, or there are fewer than MIN_PLAYERS or more than
+        MAX_PLAYERS names.
+    """
+    if "players" in user_details:
+        player_names = user_details["players"]
+        if not isinstance(player_names, list) or not all(isinstance(name, str) for name in player_names):
+            raise ValueError("players must be a list of names")
+    else:
+        player_names = [user_details["player1"], user_details["player2"]]
+    if not war_game.MIN_PLAYERS <= len(player_names) <= war_game.MAX_PLAYERS:
+        raise ValueError(f"A game needs {war_game.MIN_PLAYERS} to {war_game.MAX_PLAYERS} players, "
+                         f"got {len(player_names)}")
+    return player_names
+
+def seed_from(user_details):
+    """
+    Get the seed of a new game.
+
+    :param user_details: Dictionary containing an optional seed
+    :return: The seed, or None if none was given
+    :raises ValueError: If the seed is neither a string nor an integer that fits the database's 64-bit Seed column.
+    """
+    seed = user_details.get("seed")
+    if seed is None or isinstance(seed, str):
+        return seed
+    if not isinstance(seed, int) or isinstance(seed, bool) or not MIN_SEED <= seed <= MAX_SEED:
+        raise ValueError(f"seed must be a string or an integer from {MIN_SEED} to {MAX_SEED}")
+    return seed
+
+def get_wins(limit=None, offset=0):
     """
     Retrieve the win counts for all players.
 
+    :param limit: The maximum number of players to return, best players first, or None for every player. Pages are
+        at most MAX_PAGE_SIZE players long.
+    :param offset: The number of players to skip when limit is given
     :return: Dictionary containing a list of players and their respective win counts
+    :raises ValueError: If limit or offset is negative.
     """
-    db_manager = war_game.DatabaseManager()
-    db_manager.create_db()
-    players = db_manager.get_all_scores()
+    if limit is not None:
+        limit = page_limit(limit, offset)
+    players = get_leaderboard().get_scores(limit, offset)
     return {"player_wins": players}
 
+def page_limit(limit, offset):
+    """
+    Check the bounds of one page of the leaderboard.
+
+    :param limit: The requested number of players
+    :param offset: The number of players to skip
+    :return: The limit, capped at MAX_PAGE_SIZE
+    :raises ValueError: If limit or offset is negative.
+    """
+    # SQLite reads a negative LIMIT as no limit at all
+    if limit < 0 or offset < 0:
+        raise ValueError("limit and offset must not be negative")
+    return min(limit, MAX_PAGE_SIZE)
+
+def get_player_rank(player_name):
+    """
+    Retrieve the leaderboard rank of a specific player.
+
+    :param player_name: Dictionary containing the player's name
+    :return: Dictionary containing the player's name, rank and number of wins. The rank is None for unknown players.
+    """
+    name = player_name['player_name']
+    rank = get_leaderboard().get_player_rank(name)
+    if rank is None:
+        return {"name": name, "rank": None, "wins": 0}
+    return {"name": name, "rank": rank[0], "wins": rank[1]}
+
 def get_player_score(player_name):
     """
-    Retrieve the win count for a specific player.
+    Retrieve the win count and the statistics of a specific player.
 
     :param player_name: Dictionary containing the player's name
-    :return: Dictionary containing the player's name and number of wins
+    :return: Dictionary containing the player's name and number of wins, and the player's statistics, which are None
+             if the player has not played a game
     """
     name = player_name['player_name']
-    db_manager = war_game.DatabaseManager()
-    db_manager.create_db()
-    wins = db_manager.get_player_score(name)
+    manager = get_db_manager()
+    wins = manager.get_player_score(name)
     if wins is None:
         wins = (name, 0)
-    return {"wins": wins}
+    return {"wins": wins, "stats": manager.get_player_stats(name)}
+
+@app.route('/api/start_tournament', methods=['POST'])
+def api_start_tournament():
+    """
+    API endpoint to start a tournament, which is played in the background.
+
+    :return: JSON response containing the tournament's ID and progress
+    """
+    try:
+        return start_tournament(request.get_json(force=True))
+    except (KeyError, ValueError) as error:
+        return {"error": str(error)}, 400
+
+@app.route('/api/get_tournament', methods=['GET'])
+def api_get_tournament():
+    """
+    API endpoint to poll the progress of a tournament given by the tournament_id query parameter.
+
+    :return: JSON response containing the tournament's progress, and its standings once it has finished
+    """
+    status = get_tournament(request.args.get('tournament_id'))
+    if status is None:
+        return {"error": "Unknown tournament"}, 404
+    return status
+
+def get_tournament_executor():
+    """
+    Get the pool of worker processes shared by every tournament, creating it on first use.
+
+    :return: The shared ProcessPoolExecutor
+    """
+    global tournament_executor
+    with db_manager_lock:
+        if tournament_executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+            tournament_executor = ProcessPoolExecutor()
+    return tournament_executor
+
+def start_tournament(details, executor=None):
+    """
+    Start a tournament in the background.
+
+    :param details: Dictionary containing the players list, and optionally the format (single_elimination or
+                    round_robin) and a seed
+    :param executor: The executor to play the matches on, or None for the shared pool of worker processes
+    :return: Dictionary containing the tournament's ID and progress
+    """
+    import war_game_tournament
+
+    tournament = war_game_tournament.Tournament(details["players"],
+                                                details.get("format", war_game_tournament.SINGLE_ELIMINATION),
+                                                seed=seed_from(details), db_manager=get_db_manager(),
+                                                executor=executor or get_tournament_executor())
+    with db_manager_lock:
+        tournaments[tournament.id] = tournament
+        while len(tournaments) > MAX_TOURNAMENTS:
+            tournaments.popitem(last=False)
+    players.extend(tournament.player_names)
+    return tournament.start().status()
+
+def get_tournament(tournament_id):
+    """
+    Retrieve the progress of a tournament.
+
+    :param tournament_id: The ID returned when the tournament was started
+    :return: Dictionary containing the tournament's progress, or None if the tournament is unknown
+    """
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return None
+    return tournament.status()
 
 @app.route('/api/get_logs', methods=['GET'])
 def api_get_logs():
     """
-    API endpoint to get the logs.
+    API endpoint to get the logs of a game.
+
+    The optional game_id query parameter selects the game; the most recent game is used without it. Requests with
+    format=ndjson in the query string or application/x-ndjson in the Accept header get the log lines streamed one
+    JSON string per line as they are rendered. A 404 status is returned when a requested game or, for a stream, any
+    game is not stored.
 
     :return: JSON response containing logs if available, otherwise a message indicating no logs are available
     """
-    if logs:
-        return {"logs": logs[0]}
+    game_id = request.args.get('game_id')
+    stream = request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', '')
+    replay = get_log_store().get(game_id)
+    if replay is None:
+        return {"logs": "No logs available"}, 404 if stream or game_id is not None else 200
+    if stream:
+        return Response(ndjson_lines(replay), mimetype='application/x-ndjson')
+    return {"logs": list(replay)}
+
+def get_logs(game_id=None):
+    """
+    Retrieve the logs of a game.
+
+    :param game_id: The ID of the game, or None for the most recent game
+    :return: Dictionary containing logs if available, otherwise a message indicating no logs are available
+    """
+    replay = get_log_store().get(game_id)
+    if replay is not None:
+        return {"logs": list(replay)}
     else:
         return {"logs": "No logs available"}
 
+def ndjson_lines(replay):
+    """
+    Render the logs of one game as newline-delimited JSON.
+
+    :param replay: The GameReplay or EventRecorder of the game
+    :return: A generator of JSON-encoded log lines, each ending with a newline
+    """
+    for line in replay.lines():
+        yield json.dumps(line) + "\n"
+
 @app.route('/api/reset_all_scores', methods=['GET'])
 def api_reset_all_scores():
     """
@@ -101,11 +567,12 @@ def api_reset_all_scores():
 
     :return: JSON response containing the reset status
     """
-    db_manager = war_game.DatabaseManager()
-    db_manager.create_db()
-    response = db_manager.reset_all_scores()
+    response = get_db_manager().reset_all_scores()
     app.logger.info(response)
     return {"response": response}
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8080, debug=True)
\ No newline at end of file
+    war_game.configure_logging()
+    # Open the database and check its schema now rather than in the first request
+    get_log_store()
+    app.run(host="0.0.0.0", port=8080, debug=os.environ.get('WAR_GAME_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import json
+import itertools
+import operator
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import war_game
+import war_game_api
+import war_game_client
+import war_game_jobs
+import war_game_metrics
+
+DB_READER_THREADS = 4
+# Log lines sent per body message when streaming NDJSON
+STREAM_CHUNK_LINES = 256
+# Rounds sent per body message when streaming a game, so the first ones reach the browser at once
+STREAM_CHUNK_ROUNDS = 16
+# Query parameters that may be repeated; every other parameter takes its last value
+LIST_PARAMS = ('job_id', 'players')
+NDJSON = b'application/x-ndjson'
+EVENT_STREAM = b'text/event-stream'
+
+
+class RequestError(Exception):
+    """
+    Raised by a route when the request is not valid. It is answered with a 400 status; any other exception is a
+    server error.
+    """
+
+
+def validated(function, *args):
+    """
+    Check part of a request.
+
+    :param function: The function that reads or checks the request, raising KeyError, TypeError or ValueError when
+        it is not valid.
+    :return: The value returned by function
+    :raises RequestError: If function raised one of those errors.
+    """
+    try:
+        return function(*args)
+    except (KeyError, TypeError, ValueError) as error:
+        raise RequestError(str(error)) from error
+
+
+def play_match(player_names, seed=None):
+    """
+    Play one game without touching the database or recording its events. Runs in a worker process.
+
+    :param player_names: The names of the players.
+    :param seed: Seed for the shuffle, or None for the worker's global random state.
+    :return: The GameResult of the game and its packed deal, which are all that is sent back from the worker
+    """
+    game = war_game.Game([war_game.Player(name) for name in player_names], seed=seed)
+    game.play_rounds()
+    return game.result(), game.deal
+
+
+def record_match(result, deal):
+    """
+    Record a game played by play_match and store its replay. Runs on the database writer thread.
+
+    :param result: The GameResult of the game.
+    :param deal: The packed deal of the game.
+    :return: The winner's total number of wins and the ID of the game
+    """
+    manager = war_game_api.get_db_manager()
+    manager.record_game(result)
+    total_wins = manager.get_player_score(result.winner)[1]
+    replay = war_game.GameReplay(result.players, deal, total_wins, result.seed)
+    return total_wins, war_game_api.get_log_store().add(replay)
+
+
+class WarGameApp:
+    def __init__(self, workers: int = None, processes: bool = True):
+        """
+        Initialize a WarGameApp object.
+
+        WarGameApp is an ASGI application serving the same endpoints as war_game_api. Games are played in a pool of
+        workers, score writes go to a single dedicated database thread and score reads to a separate pool of
+        reader threads, so the event loop never blocks and a slow write never holds up a read.
+
+        :param workers: The number of game workers. Defaults to the number of CPUs.
+        :param processes: Whether the game workers are processes. Threads are used when it is False.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.game_executor = None
+        self.db_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self.db_readers = ThreadPoolExecutor(max_workers=DB_READER_THREADS, thread_name_prefix='db-reader')
+        self.routes = {
+            ('POST', '/api/start_game'): self.start_game,
+            ('POST', '/api/get_player_score'): self.get_player_score,
+            ('POST', '/api/get_player_rank'): self.get_player_rank,
+            ('GET', '/api/get_player_wins'): self.get_player_wins,
+            ('GET', '/api/get_logs'): self.get_logs,
+            ('GET', '/api/reset_all_scores'): self.reset_all_scores,
+            ('POST', '/api/start_tournament'): self.start_tournament,
+            ('GET', '/api/get_tournament'): self.get_tournament,
+            ('POST', '/api/games'): self.submit_games,
+            ('GET', '/api/games'): self.get_games,
+            ('GET', '/api/stream_game'): self.stream_game,
+            ('GET', '/metrics'): self.metrics,
+        }
+
+    def start(self) -> None:
+        """
+        Start the game workers.
+        """
+        if self.game_executor is None:
+            executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self.game_executor = executor_class(max_workers=self.workers)
+
+    def shutdown(self) -> None:
+        """
+        Stop the workers and write any buffered scores.
+        """
+        if self.game_executor is not None:
+            self.game_executor.shutdown()
+            self.game_executor = None
+        self.db_writer.submit(self._close_db).result()
+        self.db_writer.shutdown()
+        self.db_readers.shutdown()
+
+    @staticmethod
+    def _close_db():
+        if isinstance(war_game_api.db_manager, war_game.ScoreBuffer):
+            war_game_api.db_manager.close()
+
+    async def _run(self, executor, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        start = time.perf_counter()
+        route = self.routes.get((scope['method'], scope['path']))
+        if route is None:
+            known_path = any(path == scope['path'] for _, path in self.routes)
+            status = 405 if known_path else 404
+            await self._send_json(send, status, {"error": "Not found"})
+        else:
+            status = await self._handle(route, scope, receive, send)
+        # Streamed responses are timed to their last byte
+        endpoint = scope['path'] if route is not None else 'unmatched'
+        war_game_metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, scope['method'], str(status))
+
+    async def _handle(self, route, scope, receive, send):
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        query = {key: values if key in LIST_PARAMS else values[-1]
+                 for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        if NDJSON in dict(scope.get('headers', [])).get(b'accept', b''):
+            query['format'] = 'ndjson'
+
+        content_type = NDJSON
+        try:
+            data = validated(json.loads, body) if body else {}
+            if not isinstance(data, dict):
+                raise RequestError("The request body must be a JSON object")
+            response = await route(data, query)
+            status, payload = response[:2]
+            if len(response) > 2:
+                content_type = response[2]
+        except RequestError as error:
+            status, payload = 400, {"error": str(error)}
+        except Exception:
+            war_game.logger.exception("%s %s failed", scope['method'], scope['path'])
+            status, payload = 500, {"error": "Internal server error"}
+        if isinstance(payload, dict):
+            await self._send_json(send, status, payload)
+        else:
+            await self._send_stream(send, status, payload, content_type)
+        return status
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self._run(None, self.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _send_json(send, status, payload):
+        body = json.dumps(payload).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    @staticmethod
+    async def _send_stream(send, status, chunks, content_type=NDJSON):
+        """
+        Send a response body piece by piece.
+
+        :param chunks: An iterator of strings, or an async iterator of them.
+        """
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', content_type), (b'cache-control', b'no-cache')]})
+        if hasattr(chunks, '__aiter__'):
+            async for chunk in chunks:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        else:
+            while True:
+                chunk = ''.join(itertools.islice(chunks, STREAM_CHUNK_LINES))
+                if not chunk:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def start_game(self, data, query):
+        self.start()
+        # Checked before any name is kept
+        player_names = validated(war_game_api.player_names_from, data)
+        seed = validated(war_game_api.seed_from, data)
+        war_game_api.players.extend(player_names)
+        result, deal = await self._run(self.game_executor, play_match, player_names, seed)
+        total_wins, game_id = await self._run(self.db_writer, record_match, result, deal)
+        # One game is one win for its winner
+        return 200, {"winner": result.winner, "wins": 1, "game_id": game_id}
+
+    async def get_player_score(self, data, query):
+        validated(operator.itemgetter('player_name'), data)
+        return 200, await self._run(self.db_readers, war_game_api.get_player_score, data)
+
+    async def get_player_rank(self, data, query):
+        validated(operator.itemgetter('player_name'), data)
+        return 200, await self._run(self.db_readers, war_game_api.get_player_rank, data)
+
+    async def get_player_wins(self, data, query):
+        limit = validated(int, query['limit']) if 'limit' in query else None
+        offset = validated(int, query.get('offset', 0))
+        if limit is not None:
+            limit = validated(war_game_api.page_limit, limit, offset)
+        return 200, await self._run(self.db_readers, war_game_api.get_wins, limit, offset)
+
+    async def get_logs(self, data, query):
+        game_id = query.get('game_id')
+        stream = query.get('format') == 'ndjson'
+        replay = await self._run(self.db_readers, war_game_api.get_log_store().get, game_id)
+        if replay is None:
+            return 404 if stream or game_id is not None else 200, {"logs": "No logs available"}
+        # Replaying the game is CPU work, so it is kept off the event loop
+        recorder = await self._run(None, replay.recorder)
+        if stream:
+            return 200, war_game_api.ndjson_lines(recorder)
+        return 200, {"logs": list(recorder)}
+
+    async def start_tournament(self, data, query):
+        self.start()
+        try:
+            return 200, await self._run(None, war_game_api.start_tournament, data, self.game_executor)
+        except (KeyError, ValueError) as error:
+            # The players, format and seed are checked before the tournament starts
+            raise RequestError(str(error)) from error
+
+    async def get_tournament(self, data, query):
+        status = war_game_api.get_tournament(query.get('tournament_id'))
+        if status is None:
+            return 404, {"error": "Unknown tournament"}
+        return 200, status
+
+    async def submit_games(self, data, query):
+        games = validated(war_game_api.games_from, data)
+        try:
+            return 202, {"job_ids": await self._run(None, war_game_api.get_job_queue().submit, games)}
+        except war_game_jobs.QueueFullError as error:
+            return 503, {"error": str(error)}
+
+    async def get_games(self, data, query):
+        wait = min(max(validated(float, query.get('wait', 0)), 0.0), war_game_api.MAX_JOB_WAIT)
+        job_queue = war_game_api.get_job_queue()
+        try:
+            # Long polls wait in the default thread pool, never on the event loop
+            return 200, {"jobs": await self._run(None, job_queue.get, query.get('job_id', []), wait)}
+        except KeyError as error:
+            return 404, {"error": f"Unknown job {error}"}
+
+    async def stream_game(self, data, query):
+        details = {"players": query['players']} if 'players' in query else dict(query)
+        if 'seed' in query:
+            details["seed"] = validated(int, query['seed'])
+        player_names = validated(war_game_api.player_names_from, details)
+        seed = validated(war_game_api.seed_from, details)
+        game = war_game.Game([war_game.Player(name) for name in player_names], db_manager=war_game_api.get_db_manager(),
+                             seed=seed)
+        war_game_api.players.extend(player.name for player in game.players)
+        return 200, self._game_events(game), EVENT_STREAM
+
+    async def _game_events(self, game):
+        rounds = game.iter_rounds()
+
+        def next_rounds():
+            return ''.join(war_game_client.sse_event('round', round_result._asdict())
+                           for round_result in itertools.islice(rounds, STREAM_CHUNK_ROUNDS))
+
+        with war_game_metrics.GAMES_IN_FLIGHT.track():
+            while True:
+                # The rounds are played in the default thread pool, a few at a time
+                chunk = await self._run(None, next_rounds)
+                if not chunk:
+                    break
+                yield chunk
+        result = await self._run(self.db_writer, war_game_api.finish_streamed_game, game)
+        yield war_game_client.sse_event('result', result)
+
+    async def metrics(self, data, query):
+        return 200, iter([war_game_metrics.REGISTRY.render()]), b'text/plain; version=0.0.4; charset=utf-8'
+
+    async def reset_all_scores(self, data, query):
+        response = await self._run(self.db_writer, lambda: war_game_api.get_db_manager().reset_all_scores())
+        return 200, {"response": response}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the War game API with an asyncio (ASGI) server.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help="number of game worker processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    war_game.configure_logging()
+    uvicorn.run(WarGameApp(workers=args.workers), host=args.host, port=args.port, lifespan='on')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+from typing import Tuple
+
+import numpy as np
+
+from war_game_fast import CANONICAL_DECK, CYCLE_CHECK_AFTER, RANK_MASK, play_hands
+
+DECK_SIZE = len(CANONICAL_DECK)
+# Once this few games are left, they are finished one at a time by war_game_fast.play_hands.
+HANDOFF_GAMES = 32
+
+
+def shuffled_decks(n_games: int, seed=None) -> np.ndarray:
+    """
+    Shuffle many packed decks at once.
+
+    :param n_games: The number of decks to shuffle.
+    :param seed: Seed for numpy's random generator.
+    :return: An (n_games, 52) uint8 array, one shuffled deck per row.
+    """
+    rng = np.random.default_rng(seed)
+    decks = np.tile(np.frombuffer(CANONICAL_DECK, dtype=np.uint8), (n_games, 1))
+    return rng.permuted(decks, axis=1)
+
+
+def simulate_decks(decks: np.ndarray, max_rounds: int = 10000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Play one two-player game of War per deck, advancing every unfinished game together.
+
+    Each step flips one card per player in every live game, so a round without a war takes one step and every
+    war adds one step for the face-down cards and one for the face-up cards. The rules are the ones in
+    war_game_fast.play_hands. Games reaching CYCLE_CHECK_AFTER rounds, which are mostly cycling ones that would
+    otherwise keep the whole batch going, and the last HANDOFF_GAMES games are finished by play_hands itself, so
+    every result matches war_game_fast.play_deal. A game still running after max_rounds rounds is stopped and won by
+    the player holding the most cards.
+
+    :param decks: An (n_games, 52) array of packed decks, as returned by shuffled_decks.
+    :param max_rounds: The number of rounds after which a game is stopped.
+    :return: A tuple of three arrays: the index of each game's winner, the number of rounds played and the number of
+             wars.
+    """
+    n_games = len(decks)
+    winners = np.zeros(n_games, dtype=np.int8)
+    rounds = np.zeros(n_games, dtype=np.int32)
+    wars = np.zeros(n_games, dtype=np.int32)
+
+    # Hands are stacks whose top is at index length - 1, dealt from the end of the deck like deal_hands does.
+    # Each game owns one row of 104 slots: the first player's hand in the first 52 and the second player's after.
+    # The hands and pots are never compacted; the stack tops are kept as offsets into the flattened hands.
+    hands = np.zeros((n_games, 2 * DECK_SIZE), dtype=np.uint8)
+    hands[:, :DECK_SIZE // 2] = decks[:, ::-1][:, 0::2]
+    hands[:, DECK_SIZE:DECK_SIZE + DECK_SIZE // 2] = decks[:, ::-1][:, 1::2]
+    flat = hands.reshape(-1)
+    pots = np.zeros((n_games, DECK_SIZE), dtype=np.uint8)
+    slots = np.arange(DECK_SIZE)
+
+    # Per-game state of the games still being played, compacted as games finish.
+    game_ids = np.arange(n_games)
+    tops1 = game_ids * 2 * DECK_SIZE + DECK_SIZE // 2
+    tops2 = tops1 + DECK_SIZE
+    pot_lengths = np.zeros(n_games, dtype=np.intp)
+    face_down = np.zeros(n_games, dtype=bool)
+    live_rounds = np.zeros(n_games, dtype=np.int32)
+    live_wars = np.zeros(n_games, dtype=np.int32)
+
+    while True:
+        bottoms = game_ids * 2 * DECK_SIZE
+        lengths1 = tops1 - bottoms
+        lengths2 = tops2 - bottoms - DECK_SIZE
+        finished = (lengths1 == 0) | (lengths2 == 0)
+        over = finished | ((pot_lengths == 0) & (live_rounds >= max_rounds))
+        # The games that ran out of cards or rounds here; the handed off ones below get their winner from play_hands
+        ended = over
+        handoff = ~over & (pot_lengths == 0)
+        if len(game_ids) > HANDOFF_GAMES:
+            handoff &= live_rounds >= CYCLE_CHECK_AFTER
+        if handoff.any():
+            for index in np.nonzero(handoff)[0]:
+                bottom = bottoms[index]
+                rest = [bytearray(flat[bottom:tops1[index]].tobytes()),
+                        bytearray(flat[bottom + DECK_SIZE:tops2[index]].tobytes())]
+                winner, live_rounds[index], extra_wars = play_hands(rest, max_rounds, int(live_rounds[index]))
+                winners[game_ids[index]] = winner
+                live_wars[index] += extra_wars
+            over = over | handoff
+        if over.any():
+            winners[game_ids[ended]] = np.where(lengths1[ended] >= lengths2[ended], 0, 1)
+            rounds[game_ids[over]] = live_rounds[over]
+            wars[game_ids[over]] = live_wars[over]
+            live = ~over
+            game_ids, tops1, tops2 = game_ids[live], tops1[live], tops2[live]
+            pot_lengths, face_down = pot_lengths[live], face_down[live]
+            live_rounds, live_wars = live_rounds[live], live_wars[live]
+            if not len(game_ids):
+                break
+
+        tops1 -= 1
+        tops2 -= 1
+        card1 = flat[tops1]
+        card2 = flat[tops2]
+        rank1 = card1 & RANK_MASK
+        rank2 = card2 & RANK_MASK
+        new_round = pot_lengths == 0
+        first_won = rank1 > rank2
+        tie = (rank1 == rank2) & ~face_down
+        live_rounds += new_round
+        live_wars += tie & new_round
+
+        # Most rounds have no war, so the two cards just played go straight onto the winner's hand and never
+        # touch the pot.
+        plain = new_round & ~tie
+        played = np.nonzero(plain)[0]
+        targets = np.where(first_won[played], tops1[played], tops2[played])
+        flat[targets] = card1[played]
+        flat[targets + 1] = card2[played]
+        tops1 += (plain & first_won) * 2
+        tops2 += (plain & ~first_won) * 2
+
+        at_war = np.nonzero(~plain)[0]
+        if len(at_war):
+            pot_ids = game_ids[at_war]
+            pots[pot_ids, pot_lengths[at_war]] = card1[at_war]
+            pots[pot_ids, pot_lengths[at_war] + 1] = card2[at_war]
+            pot_lengths[at_war] += 2
+
+            won_war = at_war[~face_down[at_war] & ~tie[at_war]]
+            if len(won_war):
+                first = first_won[won_war]
+                targets = np.where(first, tops1[won_war], tops2[won_war])
+                taken = slots < pot_lengths[won_war, None]
+                flat[(targets[:, None] + slots)[taken]] = pots[game_ids[won_war]][taken]
+                tops1[won_war[first]] += pot_lengths[won_war[first]]
+                tops2[won_war[~first]] += pot_lengths[won_war[~first]]
+                pot_lengths[won_war] = 0
+        face_down = tie
+
+    return winners, rounds, wars
+
+
+def simulate_batch(n_games: int, seed=None, max_rounds: int = 10000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Shuffle and play many two-player games of War without logs or database writes.
+
+    :param n_games: The number of games to play.
+    :param seed: Seed for numpy's random generator.
+    :param max_rounds: The number of rounds after which a game is stopped and won by the player holding the most cards.
+    :return: A tuple of three arrays: the index of each game's winner, the number of rounds played and the number of
+             wars.
+    """
+    return simulate_decks(shuffled_decks(n_games, seed), max_rounds)
@@ -0,0 +1,262 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+import war_game
+import war_game_fast
+from war_game_loadtest import percentile
+
+# Every benchmark plays the same games on every run
+FIRST_SEED = 0
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_TABLE_SIZES = (100, 10000)
+DEFAULT_CONCURRENCY = (1, 8)
+# (games per engine benchmark, database calls per table size, requests per concurrency level, interpreter starts
+# per startup benchmark, repeats)
+FULL = (200, 500, 400, 10, 5)
+QUICK = (20, 50, 40, 1, 2)
+# Python snippets timed in a fresh interpreter by bench_startup
+STARTUP_SNIPPETS = {
+    'startup.import_api': 'import war_game_api',
+    'startup.import_flask': 'import war_game_flask',
+    'startup.first_request': "import war_game_api; war_game_api.app.test_client().get('/api/get_player_wins')",
+}
+
+
+def measure(name: str, operation: Callable[[int], None], n_ops: int, repeats: int, **params) -> Dict:
+    """
+    Time a benchmark and summarise it.
+
+    The operation is run repeats times and the fastest run is reported, which is the least disturbed by the rest
+    of the machine.
+
+    :param name: The name of the benchmark, unique together with params.
+    :param operation: Function performing n_ops operations; it is given the index of the run.
+    :param n_ops: The number of operations in one run.
+    :param repeats: The number of runs.
+    :param params: The parameters of the benchmark, such as the table size, stored with the result.
+    :return: Dictionary containing the name, params, operations/sec and the median and slowest run in milliseconds.
+    """
+    timings = []
+    for run in range(repeats):
+        start = time.perf_counter()
+        operation(run)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"name": name, "params": params, "ops": n_ops, "ops_per_sec": n_ops / timings[0] if timings[0] else 0.0,
+            "median_ms": percentile(timings, 0.5) * 1000, "max_ms": timings[-1] * 1000}
+
+
+def result_key(result: Dict) -> str:
+    """
+    Get the key a result is compared under, such as db.update_score[table_size=100].
+
+    :param result: A result returned by measure.
+    :return: The name followed by the sorted parameters
+    """
+    params = ','.join(f'{key}={value}' for key, value in sorted(result["params"].items()))
+    return f'{result["name"]}[{params}]' if params else result["name"]
+
+
+def bench_engine(n_games: int, repeats: int, directory: str) -> List[Dict]:
+    """
+    Measure games/sec of the logging engine with and without the database write, and of the fast engine.
+    """
+    db_manager = war_game.DatabaseManager(os.path.join(directory, 'engine.db'))
+
+    def play_rounds(run):
+        for seed in range(FIRST_SEED, FIRST_SEED + n_games):
+            war_game.Game([war_game.Player('Alice'), war_game.Player('Bob')], seed=seed).play_rounds()
+
+    def play_game(run):
+        for seed in range(FIRST_SEED, FIRST_SEED + n_games):
+            war_game.Game([war_game.Player('Alice'), war_game.Player('Bob')], db_manager=db_manager,
+                          seed=seed).play_game()
+
+    def play_fast(run):
+        # Without this every run after the first would only measure the outcome cache
+        war_game_fast.play_deal.cache_clear()
+        for seed in range(FIRST_SEED, FIRST_SEED + n_games):
+            war_game_fast.FastGame(['Alice', 'Bob'], seed=seed).play_game()
+
+    try:
+        return [measure('engine.play_rounds', play_rounds, n_games, repeats),
+                measure('engine.play_game', play_game, n_games, repeats),
+                measure('engine.fast_play_game', play_fast, n_games, repeats)]
+    finally:
+        db_manager.close()
+
+
+def bench_database(n_calls: int, repeats: int, directory: str, table_sizes=DEFAULT_TABLE_SIZES) -> List[Dict]:
+    """
+    Measure the latency of score writes and reads against tables of increasing size.
+    """
+    results = []
+    for table_size in table_sizes:
+        db_manager = war_game.DatabaseManager(os.path.join(directory, f'scores-{table_size}.db'))
+        rng = random.Random(table_size)
+        names = [f'player{index}' for index in range(table_size)]
+        db_manager.bulk_update_scores({name: rng.randint(1, 1000) for name in names})
+
+        def update_score(run):
+            for index in range(n_calls):
+                db_manager.update_score(names[index % table_size])
+
+        def get_player_score(run):
+            for index in range(n_calls):
+                db_manager.get_player_score(names[index % table_size])
+
+        def get_all_scores(run):
+            # Reading the whole table is the slow call, so it is made ten times less often
+            for _ in range(max(1, n_calls // 10)):
+                db_manager.get_all_scores()
+
+        try:
+            results.append(measure('db.update_score', update_score, n_calls, repeats, table_size=table_size))
+            results.append(measure('db.get_player_score', get_player_score, n_calls, repeats,
+                                   table_size=table_size))
+            results.append(measure('db.get_all_scores', get_all_scores, max(1, n_calls // 10), repeats,
+                                   table_size=table_size))
+        finally:
+            db_manager.close()
+    return results
+
+
+def bench_http(n_requests: int, repeats: int, directory: str, concurrency_levels=DEFAULT_CONCURRENCY) -> List[Dict]:
+    """
+    Measure the request throughput of the API routes through the Flask test client, from several threads at once.
+    """
+    import war_game_api
+
+    routes = {
+        'http.start_game': ('POST', '/api/start_game', {"player1": "Alice", "player2": "Bob"}),
+        'http.get_player_wins': ('GET', '/api/get_player_wins', None),
+        'http.get_player_score': ('POST', '/api/get_player_score', {"player_name": "Alice"}),
+    }
+    saved = war_game_api.db_manager, war_game_api.leaderboard, war_game_api.log_store
+    db_manager = war_game.DatabaseManager(os.path.join(directory, 'api.db'))
+    war_game_api.db_manager, war_game_api.leaderboard, war_game_api.log_store = db_manager, None, None
+    results = []
+    try:
+        for concurrency in concurrency_levels:
+            for name, (method, path, payload) in routes.items():
+                def send_requests(run):
+                    counter = iter(range(n_requests))
+
+                    def client(seed):
+                        test_client = war_game_api.app.test_client()
+                        for index in counter:
+                            body = dict(payload, seed=seed + index) if name == 'http.start_game' else payload
+                            test_client.open(path, method=method, json=body)
+
+                    threads = [threading.Thread(target=client, args=(FIRST_SEED,)) for _ in range(concurrency)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+
+                results.append(measure(name, send_requests, n_requests, repeats, concurrency=concurrency))
+    finally:
+        war_game_api.db_manager, war_game_api.leaderboard, war_game_api.log_store = saved
+        db_manager.close()
+    return results
+
+
+def bench_startup(n_starts: int, repeats: int, directory: str) -> List[Dict]:
+    """
+    Measure how long a new process takes to import the services and to answer its first request.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)), WAR_GAME_BACKEND='local')
+    results = []
+    for name, snippet in STARTUP_SNIPPETS.items():
+        def start(run):
+            for _ in range(n_starts):
+                subprocess.run([sys.executable, '-c', snippet], cwd=directory, env=env, check=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        results.append(measure(name, start, n_starts, repeats))
+    return results
+
+
+SUITES = {'engine': bench_engine, 'db': bench_database, 'http': bench_http, 'startup': bench_startup}
+
+
+def run_benchmarks(suites=tuple(SUITES), quick: bool = False) -> Dict:
+    """
+    Run benchmark suites in a temporary directory.
+
+    :param suites: The names of the suites to run, from SUITES.
+    :param quick: Run about a tenth of the operations, for a smoke test rather than a measurement.
+    :return: Dictionary containing the environment and the results, ready to be written as JSON
+    """
+    n_games, n_calls, n_requests, n_starts, repeats = QUICK if quick else FULL
+    sizes = {'engine': n_games, 'db': n_calls, 'http': n_requests, 'startup': n_starts}
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for suite in suites:
+            results.extend(SUITES[suite](sizes[suite], repeats, directory))
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "quick": quick,
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'), "results": results}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    Find the benchmarks that got slower than a baseline run.
+
+    :param baseline: The output of an earlier run_benchmarks.
+    :param current: The output of the run to check.
+    :param threshold: The fraction of operations/sec a benchmark may lose before it counts as a regression.
+    :return: A list of dictionaries containing the key, both operations/sec and the change of every regression
+    """
+    before = {result_key(result): result["ops_per_sec"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = result_key(result)
+        if before.get(key):
+            change = result["ops_per_sec"] / before[key] - 1
+            if change < -threshold:
+                regressions.append({"key": key, "baseline": before[key], "current": result["ops_per_sec"],
+                                    "change": change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the game engine, the database and the API routes.")
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help="suite to run, may be repeated; all suites by default")
+    parser.add_argument('--quick', action='store_true', help="run about a tenth of the operations")
+    parser.add_argument('--output', help="file to write the results to as JSON")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction of operations/sec a benchmark may lose before it is a regression")
+    args = parser.parse_args(argv)
+
+    # Writing a log line for every game and score update would be most of what is measured
+    war_game.logger.setLevel(logging.WARNING)
+    report = run_benchmarks(args.suite or tuple(SUITES), args.quick)
+    for result in report["results"]:
+        print(f"{result_key(result):45} {result['ops_per_sec']:12.1f} ops/sec  median {result['median_ms']:.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(json.load(baseline), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['key']}: {regression['baseline']:.1f} -> {regression['current']:.1f} "
+                  f"ops/sec ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+API_URL = os.environ.get('WAR_GAME_API_URL', 'http://localhost:8080')
+# Seconds to wait for a connection and for a response.
+TIMEOUT = (2.0, 30.0)
+
+
+class ClientError(Exception):
+    """
+    Raised when a GameClient call fails, whichever backend it uses.
+    """
+
+
+class GameClient(abc.ABC):
+    """
+    The service interface used by the web frontend. ApiClient calls war_game_api over HTTP and LocalClient calls it
+    in the same process; both return the same dictionaries and raise ClientError on failure.
+    """
+
+    @abc.abstractmethod
+    def start_game(self, player1: str, player2: str) -> dict:
+        """
+        Start a new game.
+
+        :param player1: The name of the first player.
+        :param player2: The name of the second player.
+        :return: Dictionary containing the winner's name, number of wins and the ID of the game
+        """
+
+    @abc.abstractmethod
+    def get_player_wins(self, limit: int = None, offset: int = 0) -> dict:
+        """
+        Get the win counts for all players, or one page of the leaderboard.
+
+        :param limit: The maximum number of players to return, best players first, or None for every player.
+        :param offset: The number of players to skip when limit is given.
+        :return: Dictionary containing a list of players and their respective win counts
+        """
+
+    @abc.abstractmethod
+    def get_player_score(self, player_name: str) -> dict:
+        """
+        Get the win count for a specific player.
+
+        :param player_name: The name of the player.
+        :return: Dictionary containing the player's name and number of wins
+        """
+
+    @abc.abstractmethod
+    def get_player_rank(self, player_name: str) -> dict:
+        """
+        Get the leaderboard rank of a specific player.
+
+        :param player_name: The name of the player.
+        :return: Dictionary containing the player's name, rank and number of wins
+        """
+
+    @abc.abstractmethod
+    def reset_all_scores(self) -> dict:
+        """
+        Reset the scores of all players.
+
+        :return: Dictionary containing the reset scores
+        """
+
+    @abc.abstractmethod
+    def get_logs(self, game_id: str = None) -> dict:
+        """
+        Get the logs of a game.
+
+        :param game_id: The ID returned by start_game, or None for the most recent game.
+        :return: Dictionary containing the logs
+        """
+
+    @abc.abstractmethod
+    def stream_logs(self, game_id: str = None):
+        """
+        Stream the logs of a game without holding them all in memory.
+
+        :param game_id: The ID returned by start_game, or None for the most recent game.
+        :return: An iterator of log lines. ClientError is raised before the first line when there are no logs.
+        """
+
+    @abc.abstractmethod
+    def stream_game(self, player1: str, player2: str):
+        """
+        Start a new game and stream its rounds while they are played.
+
+        :param player1: The name of the first player.
+        :param player2: The name of the second player.
+        :return: An iterator of (event name, data) pairs: a round event for every round, then a result event
+        """
+
+
+class ApiClient(GameClient):
+    def __init__(self, base_url: str = API_URL, timeout=TIMEOUT, retries: int = 3, pool_size: int = 32,
+                 cache_ttl: float = 2.0, cache_size: int = 256):
+        """
+        Initialize an ApiClient object.
+
+        The client keeps a pool of keep-alive connections to the API, retries failed connections and idempotent
+        requests, and caches the responses of read-only calls for cache_ttl seconds. Calls that change the scores
+        clear the cache, and the least recently used response is dropped when more than cache_size are cached.
+
+        :param base_url: The base URL of the war_game_api service.
+        :param timeout: Seconds to wait for a connection and for a response, as a (connect, read) tuple.
+        :param retries: The number of times a failed request is retried.
+        :param pool_size: The maximum number of connections kept open to the API.
+        :param cache_ttl: Seconds a read-only response is served from the cache, or 0 to disable the cache.
+        :param cache_size: The maximum number of responses kept in the cache.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()
+        # requests is only imported by the HTTP backend, which keeps it out of the startup of a local frontend
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self._request_error = requests.RequestException
+        retry = Retry(total=retries, backoff_factor=0.1, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _request(self, method: str, path: str, payload=None, params=None) -> dict:
+        try:
+            response = self.session.request(method, self.base_url + path, json=payload, params=params,
+                                            timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (self._request_error, ValueError) as error:
+            raise ClientError(f"{method} {path} failed: {error}") from error
+
+    def _cached_request(self, method: str, path: str, payload=None, params=None) -> dict:
+        key = (method, path, repr(payload), repr(params))
+        now = time.monotonic()
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.cache.move_to_end(key)
+                    return entry[1]
+                del self.cache[key]
+        data = self._request(method, path, payload, params)
+        if self.cache_ttl:
+            with self._lock:
+                self.cache[key] = (now + self.cache_ttl, data)
+                self.cache.move_to_end(key)
+                # The least recently used entries go first, and expired ones with them
+                while self.cache and (len(self.cache) > self.cache_size or next(iter(self.cache.values()))[0] <= now):
+                    self.cache.popitem(last=False)
+        return data
+
+    def clear_cache(self) -> None:
+        """
+        Drop every cached response.
+        """
+        with self._lock:
+            self.cache.clear()
+
+    def start_game(self, player1: str, player2: str) -> dict:
+        data = self._request('POST', '/api/start_game', {'player1': player1, 'player2': player2})
+        self.clear_cache()
+        return data
+
+    def get_player_wins(self, limit: int = None, offset: int = 0) -> dict:
+        params = {'limit': limit, 'offset': offset} if limit is not None else None
+        return self._cached_request('GET', '/api/get_player_wins', params=params)
+
+    def get_player_score(self, player_name: str) -> dict:
+        return self._cached_request('POST', '/api/get_player_score', {'player_name': player_name})
+
+    def get_player_rank(self, player_name: str) -> dict:
+        return self._cached_request('POST', '/api/get_player_rank', {'player_name': player_name})
+
+    def reset_all_scores(self) -> dict:
+        data = self._request('GET', '/api/reset_all_scores')
+        self.clear_cache()
+        return data
+
+    def get_logs(self, game_id: str = None) -> dict:
+        params = {'game_id': game_id} if game_id is not None else None
+        return self._request('GET', '/api/get_logs', params=params)
+
+    def stream_logs(self, game_id: str = None):
+        params = {'format': 'ndjson'}
+        if game_id is not None:
+            params['game_id'] = game_id
+        try:
+            response = self.session.get(self.base_url + '/api/get_logs', params=params, stream=True,
+                                        timeout=self.timeout)
+            response.raise_for_status()
+        except self._request_error as error:
+            raise ClientError(f"GET /api/get_logs failed: {error}") from error
+        return self._iter_ndjson(response)
+
+    @staticmethod
+    def _iter_ndjson(response):
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def stream_game(self, player1: str, player2: str):
+        try:
+            response = self.session.get(self.base_url + '/api/stream_game',
+                                        params={'player1': player1, 'player2': player2}, stream=True,
+                                        timeout=self.timeout)
+            response.raise_for_status()
+        except self._request_error as error:
+            raise ClientError(f"GET /api/stream_game failed: {error}") from error
+        self.clear_cache()
+        return self._iter_events(response)
+
+    @staticmethod
+    def _iter_events(response):
+        with response:
+            name = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event: '):
+                    name = line[len('event: '):]
+                elif line.startswith('data: '):
+                    yield name, json.loads(line[len('data: '):])
+
+
+class LocalClient(GameClient):
+    def __init__(self):
+        """
+        Initialize a LocalClient object.
+
+        LocalClient calls the war_game_api service functions in the current process, sharing its DatabaseManager,
+        Leaderboard and game logs, so a frontend running next to the game code skips the HTTP round trip.
+        """
+        import war_game_api
+        self.api = war_game_api
+
+    def start_game(self, player1: str, player2: str) -> dict:
+        try:
+            return self.api.start_game({'player1': player1, 'player2': player2})
+        except sqlite3.Error as error:
+            raise ClientError(f"start_game failed: {error}") from error
+
+    def get_player_wins(self, limit: int = None, offset: int = 0) -> dict:
+        try:
+            return self.api.get_wins(limit, offset)
+        except sqlite3.Error as error:
+            raise ClientError(f"get_player_wins failed: {error}") from error
+
+    def get_player_score(self, player_name: str) -> dict:
+        try:
+            return self.api.get_player_score({'player_name': player_name})
+        except sqlite3.Error as error:
+            raise ClientError(f"get_player_score failed: {error}") from error
+
+    def get_player_rank(self, player_name: str) -> dict:
+        try:
+            return self.api.get_player_rank({'player_name': player_name})
+        except sqlite3.Error as error:
+            raise ClientError(f"get_player_rank failed: {error}") from error
+
+    def reset_all_scores(self) -> dict:
+        try:
+            return {"response": self.api.get_db_manager().reset_all_scores()}
+        except sqlite3.Error as error:
+            raise ClientError(f"reset_all_scores failed: {error}") from error
+
+    def get_logs(self, game_id: str = None) -> dict:
+        try:
+            return self.api.get_logs(game_id)
+        except sqlite3.Error as error:
+            raise ClientError(f"get_logs failed: {error}") from error
+
+    def stream_logs(self, game_id: str = None):
+        try:
+            replay = self.api.get_log_store().get(game_id)
+        except sqlite3.Error as error:
+            raise ClientError(f"stream_logs failed: {error}") from error
+        if replay is None:
+            raise ClientError("No logs available")
+        return replay.lines()
+
+    def stream_game(self, player1: str, player2: str):
+        try:
+            return self.api.stream_game(self.api.new_game({'player1': player1, 'player2': player2}))
+        except sqlite3.Error as error:
+            raise ClientError(f"stream_game failed: {error}") from error
+
+
+def sse_event(name, data):
+    """
+    Encode an event in the Server-Sent Events format.
+
+    :param name: The name of the event.
+    :param data: The data of the event, sent as JSON.
+    :return: The event, ending with a blank line
+    """
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def get_client(backend: str = None) -> GameClient:
+    """
+    Create the GameClient for the configured backend.
+
+    :param backend: "local" to call the game in this process or "http" to call war_game_api over HTTP. Defaults to
+        the WAR_GAME_BACKEND environment variable, or "http" when it is not set.
+    :return: A LocalClient or an ApiClient
+    """
+    backend = backend or os.environ.get('WAR_GAME_BACKEND', 'http')
+    if backend == 'local':
+        return LocalClient()
+    if backend == 'http':
+        return ApiClient()
+    raise ValueError(f"Unknown backend {backend!r}, expected 'local' or 'http'")
@@ -0,0 +1,183 @@
+import random
+from functools import lru_cache
+from typing import List, Tuple
+
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']
+RANK_MASK = 0x0F
+# Games are checked for repeated hand states once they have lasted this many rounds; almost all games end sooner.
+CYCLE_CHECK_AFTER = 1000
+# Separates the packed hands in a state key; no packed card has this value.
+HAND_SEPARATOR = b'\xff'
+# The number of deal outcomes kept by play_deal
+OUTCOME_CACHE_SIZE = 4096
+
+# Every card is packed into one byte: the suit index in the high nibble and the rank (2-14) in the low nibble.
+# The canonical order matches the order in which war_game.Deck builds its cards.
+CANONICAL_DECK = bytes((suit << 4) | rank for suit in range(len(SUITS)) for rank in range(2, 15))
+
+
+def pack_card(rank: int, suit: str) -> int:
+    """
+    Pack a card into a single byte.
+
+    :param rank: The rank of the card (2-14).
+    :param suit: The suit of the card.
+    :return: The packed card.
+    """
+    return (SUITS.index(suit) << 4) | rank
+
+
+def unpack_card(code: int) -> Tuple[int, str]:
+    """
+    Unpack a card packed by pack_card.
+
+    :param code: The packed card.
+    :return: A tuple containing the rank and the suit of the card.
+    """
+    return code & RANK_MASK, SUITS[code >> 4]
+
+
+def deal_hands(deck: bytes) -> List[bytearray]:
+    """
+    Deal a shuffled deck to two players.
+
+    Cards are dealt from the end of the deck, one at a time and alternating between the players, exactly like
+    war_game.Game.deal_cards does.
+
+    :param deck: The 52 packed cards of a shuffled deck.
+    :return: A list with each player's hand. The top of a hand is its last byte.
+    """
+    last = len(deck) - 1
+    return [bytearray(deck[last::-2]), bytearray(deck[last - 1::-2])]
+
+
+def play_hands(hands: List[bytearray], max_rounds=None, rounds_played: int = 0) -> Tuple[int, int, int]:
+    """
+    Play a game of War to completion on two packed hands.
+
+    The hands are modified in place. The rules match war_game.Game: the winner of a round puts the cards on top of
+    their hand, a tie starts a war of one card face down and one face up, and the game stops as soon as a player
+    has to play from an empty hand. The player holding the most cards wins, with ties going to the first player.
+    Deterministic War can cycle forever. After CYCLE_CHECK_AFTER rounds the hands are packed into a state key
+    before every round and compared with a saved state, which is moved forward after 1, 2, 4, 8... rounds (Brent's
+    cycle detection). A cycle of any length is found within a few times its length, keeping only one state, and the
+    game is stopped. A game can also be stopped after max_rounds rounds. Either way the player holding the most cards
+    wins, exactly as in war_game.Game.
+
+    :param hands: The two players' hands, as returned by deal_hands.
+    :param max_rounds: The number of rounds after which the game is stopped, or None to play until it ends.
+    :param rounds_played: The number of rounds already played on the hands, when a game is resumed.
+    :return: A tuple containing the index of the winner, the number of rounds played in total and the number of wars
+             played by this call.
+    """
+    first, second = hands
+    pot = bytearray()
+    rounds = rounds_played
+    wars = 0
+    saved_state = None
+    # The saved state is replaced when steps reaches interval, which then doubles
+    interval = steps = 1
+    # One comparison per round covers both the round limit and the start of the cycle checks.
+    checks_from = CYCLE_CHECK_AFTER if max_rounds is None else min(max_rounds, CYCLE_CHECK_AFTER)
+    try:
+        while first and second:
+            if rounds >= checks_from:
+                if rounds == max_rounds:
+                    break
+                if rounds >= CYCLE_CHECK_AFTER:
+                    state = bytes(first) + HAND_SEPARATOR + bytes(second)
+                    if state == saved_state:
+                        break
+                    if steps == interval:
+                        saved_state, interval, steps = state, interval * 2, 0
+                    steps += 1
+            rounds += 1
+            card1 = first.pop()
+            card2 = second.pop()
+            rank1 = card1 & RANK_MASK
+            rank2 = card2 & RANK_MASK
+            if rank1 != rank2:
+                winner = first if rank1 > rank2 else second
+                winner.append(card1)
+                winner.append(card2)
+                continue
+
+            wars += 1
+            del pot[:]
+            pot.append(card1)
+            pot.append(card2)
+            while rank1 == rank2:
+                pot.append(first.pop())
+                pot.append(second.pop())
+                card1 = first.pop()
+                pot.append(card1)
+                card2 = second.pop()
+                pot.append(card2)
+                rank1 = card1 & RANK_MASK
+                rank2 = card2 & RANK_MASK
+            (first if rank1 > rank2 else second).extend(pot)
+    except IndexError:
+        # A player ran out of cards in the middle of a war; the cards on the table are out of play.
+        pass
+
+    return (0 if len(first) >= len(second) else 1), rounds, wars
+
+
+@lru_cache(maxsize=OUTCOME_CACHE_SIZE)
+def play_deal(deck: bytes, max_rounds=None) -> Tuple[int, int, int]:
+    """
+    Deal a shuffled deck and play it to completion.
+
+    The outcomes of recently played decks are cached, so replaying a deck returns at once.
+
+    :param deck: The 52 packed cards of a shuffled deck.
+    :param max_rounds: The number of rounds after which the game is stopped, or None to play until it ends.
+    :return: A tuple containing the index of the winner, the number of rounds played and the number of wars.
+    """
+    return play_hands(deal_hands(deck), max_rounds)
+
+
+def shuffled_deck(seed=None) -> bytes:
+    """
+    Shuffle a packed deck.
+
+    The permutation is the one war_game.Deck gets from the same random state, so a game seeded here deals the
+    same cards as a war_game.Game created right after random.seed(seed).
+
+    :param seed: Seed for the shuffle. The global random state is used when it is None.
+    :return: The 52 packed cards of the shuffled deck.
+    """
+    deck = bytearray(CANONICAL_DECK)
+    if seed is None:
+        random.shuffle(deck)
+    else:
+        random.Random(seed).shuffle(deck)
+    return bytes(deck)
+
+
+class FastGame:
+    def __init__(self, player_names, seed=None, max_rounds=None):
+        """
+        Initialize a FastGame object.
+
+        FastGame plays the same game as war_game.Game but keeps no Card objects, writes no logs and does not touch
+        the database, which makes it suitable for bulk simulation.
+
+        :param player_names: The names of the two players.
+        :param seed: Seed for the shuffle. The global random state is used when it is None.
+        :param max_rounds: The number of rounds after which the game is stopped, or None to play until it ends.
+        """
+        if len(player_names) != 2:
+            raise ValueError("FastGame supports exactly two players")
+        self.player_names = list(player_names)
+        self.deck = shuffled_deck(seed)
+        self.max_rounds = max_rounds
+
+    def play_game(self):
+        """
+        Play the game to completion.
+
+        :return: A tuple containing the winner's name, the number of rounds played and the number of wars.
+        """
+        winner, rounds, wars = play_deal(self.deck, self.max_rounds)
+        return self.player_names[winner], rounds, wars
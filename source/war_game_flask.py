@@ -1,23 +1,24 @@
-from flask import Flask, render_template, request, send_file
-import requests
-import json
+import logging
 import os
+from collections import deque
+from flask import Flask, Response, render_template, request
+import war_game_client
 
 # Create a Flask app instance
 app = Flask(__name__)
-players = []
-flags = []
+# Only the most recent player names are kept
+MAX_RECENT_PLAYERS = 1000
+players = deque(maxlen=MAX_RECENT_PLAYERS)
+flags = deque(maxlen=1)
+# The ID of the most recent game started from this frontend, used to fetch its logs
+last_game_id = None
+# Calls the API over HTTP or in this process, depending on WAR_GAME_BACKEND
+game_client = war_game_client.get_client()
 
 def render_index(**kwargs):
     return render_template('index.html', **kwargs)
 
 
-def handle_response(response, success_message, error_message):
-    if response.status_code == 200:
-        return success_message
-    else:
-        return error_message
-
 # Route for the homepage
 @app.route('/')
 def index():
@@ -29,17 +30,20 @@ def start_game():
     """
     Start a new game and determine the winner.
 
-    :return: Rendered HTML template of index.html with start_game_flag, method_called, and winner
+    :return: Rendered HTML template of index.html with start_game_flag, method_called, and winner or error
     """
+    global last_game_id
     player1 = request.form['player1']
     player2 = request.form['player2']
+    try:
+        json_resp = game_client.start_game(player1, player2)
+    except war_game_client.ClientError:
+        return render_index(start_game_flag=True, method_called=False,
+                            error="There was an error in starting the game. Please try again.")
     players.append(player1)
     players.append(player2)
-    user_details = {'player1': player1, 'player2': player2}
-    url = "http://localhost:8080/api/start_game"
-    response = requests.post(url=url, data=json.dumps(user_details))
-    json_resp = response.json()
     winner = json_resp['winner']
+    last_game_id = json_resp.get('game_id')
     method_called = False # Used to control the display of certain responses
     flags.append(True)
     return render_index(start_game_flag=True, method_called=method_called, winner=winner)
@@ -53,10 +57,11 @@ def get_player_wins():
     :return: Rendered HTML template of index.html with get_scores_flag, method_called, player_wins, and output
     """
     output = "The Game Board is empty. Start a new game!"
-    url = "http://localhost:8080/api/get_player_wins"
-    response = requests.get(url=url)
-    if response.status_code == 200 and len(flags) > 0:
-        json_resp = response.json()
+    if len(flags) > 0:
+        try:
+            json_resp = game_client.get_player_wins()
+        except war_game_client.ClientError:
+            return render_index(get_scores_flag=True, method_called=False, output=output)
         player_wins = json_resp['player_wins']
         app.logger.info(player_wins)
         if len(player_wins) > 0:
@@ -71,9 +76,11 @@ def reset_all_scores():
 
     :return: Rendered HTML template of index.html with reset_scores_flag, method_called, and message
     """
-    url = "http://localhost:8080/api/reset_all_scores"
-    response = requests.get(url=url)
-    message = handle_response(response, "The Game Board has been reset.", "There was an error in resetting the Game Board.")
+    try:
+        game_client.reset_all_scores()
+        message = "The Game Board has been reset."
+    except war_game_client.ClientError:
+        message = "There was an error in resetting the Game Board."
     return render_index(reset_scores_flag=True, method_called=False, message=message)
 
 # Route to get the score for a specific player
@@ -82,13 +89,15 @@ def get_player_score():
     """
     Get the score of a specific player.
 
-    :return: Rendered HTML template of index.html with player_score_flag, player_score, player_name, and method_called
+    :return: Rendered HTML template of index.html with player_score_flag, player_score, player_name, and method_called,
+             or error
     """
     player_name = request.form['player_name']
-    query_param = {'player_name': player_name}
-    url = "http://localhost:8080/api/get_player_score"
-    response = requests.post(url=url, data=json.dumps(query_param))
-    json_resp = response.json()
+    try:
+        json_resp = game_client.get_player_score(player_name)
+    except war_game_client.ClientError:
+        return render_index(player_score_flag=True, method_called=False,
+                            error=f"There was an error in getting the score of {player_name}.")
     player_score = json_resp['wins']
     return render_index( player_score_flag=True, player_score=player_score, player_name=player_name,
                            method_called=False)
@@ -97,35 +106,51 @@ def get_player_score():
 @app.route('/get_logs', methods=['GET'])
 def get_logs():
     """
-    Retrieve the game logs and provide them as a file download.
+    Retrieve the game logs and stream them to the browser as a file download.
 
     :return: Rendered HTML template of index.html with logs, method_called, filename, and output_message, or file download
     """
     output_message = "A game has not been played so there are no logs at this time.\nPlease play a game before fetching its logs!"
     if len(flags) > 0:
-        url = "http://localhost:8080/api/get_logs"
-        response = requests.get(url=url)
-        if response.status_code == 200:
-            json_resp = response.json()
-            data = json_resp['logs']
-            foldername = "War Game Logs"
-            if not os.path.exists(foldername):
-                os.makedirs(foldername)
-            path = os.path.abspath(foldername)
-            if os.path.exists(path):
-                os.chdir(path)
-                filename = 'War_Game_Logs.txt'
-                new_path = os.path.join(path, filename)
-                with open(new_path, 'w') as file:
-                    for line in data:
-                        file.write("%s\n" % line)
-                os.chdir('..')
-            return send_file(os.path.join(path, filename), as_attachment=True)
-        else:
+        try:
+            lines = game_client.stream_logs(last_game_id)
+        except war_game_client.ClientError:
             return render_index(logs=True, method_called=False, filename="", output_message=output_message)
+        return Response((line + "\n" for line in lines), mimetype='text/plain',
+                        headers={'Content-Disposition': 'attachment; filename=War_Game_Logs.txt'})
     else:
         return render_index(logs=True, method_called=True, filename="", output_message=output_message)
 
+# Route to watch a game while it is played
+@app.route('/stream_game', methods=['GET'])
+def stream_game():
+    """
+    Start a new game and relay its rounds to the browser as Server-Sent Events while the API plays them.
+
+    :return: A text/event-stream response with a round event for every round and a result event at the end, or a
+             failed event when the game could not be started
+    """
+    player1 = request.args.get('player1', '')
+    player2 = request.args.get('player2', '')
+    try:
+        events = game_client.stream_game(player1, player2)
+    except war_game_client.ClientError as error:
+        return Response(war_game_client.sse_event('failed', {"error": str(error)}), mimetype='text/event-stream')
+    players.append(player1)
+    players.append(player2)
+    flags.append(True)
+
+    def relay():
+        global last_game_id
+        for name, data in events:
+            if name == 'result':
+                last_game_id = data.get('game_id')
+            yield war_game_client.sse_event(name, data)
+
+    return Response(relay(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache',
+                                                                    'X-Accel-Buffering': 'no'})
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    app.run(host='0.0.0.0', port=8000, debug=os.environ.get('WAR_GAME_DEBUG', '1') == '1')
@@ -0,0 +1,112 @@
+import itertools
+from typing import Dict, List
+
+import numpy as np
+
+DAY = 86400.0
+# Upper bounds of the buckets of rounds_distribution; the last bucket has no upper bound
+ROUND_EDGES = (50, 100, 200, 300, 500, 1000, 2000)
+
+
+def fetch_columns(cursor, n_columns: int) -> np.ndarray:
+    """
+    Read a query's rows straight into a NumPy array, without building a Python list of rows.
+
+    :param cursor: The executed query, with n_columns numeric columns.
+    :param n_columns: The number of columns the query returns.
+    :return: An array of shape (n_columns, rows), one row per column
+    """
+    flat = np.fromiter(itertools.chain.from_iterable(cursor), dtype=np.float64)
+    return flat.reshape(-1, n_columns).T
+
+
+def time_range(since: float = None, until: float = None) -> tuple:
+    """
+    Get the bounds of a time range for the FinishedAt columns.
+
+    :param since: Unix time of the first game to include, or None for the first game.
+    :param until: Unix time after the last game to include, or None for the present.
+    :return: A tuple of the two bounds
+    """
+    return (since if since is not None else float('-inf')), (until if until is not None else float('inf'))
+
+
+def win_rate_over_time(db_manager, player_name: str, bucket_seconds: float = DAY, since: float = None,
+                       until: float = None) -> List[Dict]:
+    """
+    Get a player's win rate per period, from the GamePlayers index alone.
+
+    The history is read from the database only, so the buffered games of a ScoreBuffer are included once it has
+    flushed.
+
+    :param db_manager: The DatabaseManager holding the game history.
+    :param player_name: The name of the player.
+    :param bucket_seconds: The length of a period, a day by default.
+    :param since: Unix time of the first game to include, or None for the first game.
+    :param until: Unix time after the last game to include, or None for the present.
+    :return: A list of dictionaries containing the start of every period in which the player played, and the games,
+             wins and win rate in it
+    """
+    with db_manager.connection() as conn:
+        times, won = fetch_columns(conn.execute(
+            'SELECT FinishedAt, Won FROM GamePlayers WHERE Name = ? AND FinishedAt >= ? AND FinishedAt < ?;',
+            (player_name,) + time_range(since, until)), 2)
+    if not len(times):
+        return []
+    origin = np.floor(times.min() / bucket_seconds) * bucket_seconds
+    buckets = ((times - origin) // bucket_seconds).astype(np.int64)
+    games = np.bincount(buckets)
+    wins = np.bincount(buckets, weights=won)
+    return [{"start": float(origin + index * bucket_seconds), "games": int(games[index]), "wins": int(wins[index]),
+             "win_rate": round(float(wins[index] / games[index]), 4)}
+            for index in np.flatnonzero(games)]
+
+
+def rounds_distribution(db_manager, edges=ROUND_EDGES, since: float = None, until: float = None) -> Dict:
+    """
+    Get the distribution of the number of rounds per game, from the GameHistory_FinishedAt index alone.
+
+    :param db_manager: The DatabaseManager holding the game history.
+    :param edges: The upper bounds of the buckets, in ascending order.
+    :param since: Unix time of the first game to include, or None for the first game.
+    :param until: Unix time after the last game to include, or None for the present.
+    :return: Dictionary containing the number of games, the mean, median and 99th percentile of their rounds and
+             wars per game, and the number of games in every bucket of rounds
+    """
+    with db_manager.connection() as conn:
+        rounds, wars = fetch_columns(conn.execute(
+            'SELECT Rounds, Wars FROM GameHistory WHERE FinishedAt >= ? AND FinishedAt < ?;', time_range(since, until)),
+            2)
+    counts = np.bincount(np.searchsorted(edges, rounds, side='right'), minlength=len(edges) + 1)
+    lower = (0,) + tuple(edges)
+    upper = tuple(edges) + (None,)
+    distribution = {"games": len(rounds),
+                    "histogram": [{"min": low, "max": high, "games": int(count)}
+                                  for low, high, count in zip(lower, upper, counts)]}
+    if len(rounds):
+        median, p99 = np.percentile(rounds, [50, 99])
+        distribution.update(mean_rounds=round(float(rounds.mean()), 1), median_rounds=float(median),
+                            p99_rounds=float(p99), mean_wars=round(float(wars.mean()), 2))
+    return distribution
+
+
+def head_to_head(db_manager, player_name: str, opponent: str, since: float = None, until: float = None) -> Dict:
+    """
+    Get the record of a player against an opponent in the games they played together.
+
+    :param db_manager: The DatabaseManager holding the game history.
+    :param player_name: The name of the player.
+    :param opponent: The name of the opponent.
+    :param since: Unix time of the first game to include, or None for the first game.
+    :param until: Unix time after the last game to include, or None for the present.
+    :return: Dictionary containing the number of games they played together and how many each of them won. In games
+             of more than two players, both may have lost.
+    """
+    query = 'SELECT GameId, Won FROM GamePlayers WHERE Name = ? AND FinishedAt >= ? AND FinishedAt < ?;'
+    with db_manager.connection() as conn:
+        player_games, player_won = fetch_columns(conn.execute(query, (player_name,) + time_range(since, until)), 2)
+        opponent_games, opponent_won = fetch_columns(conn.execute(query, (opponent,) + time_range(since, until)), 2)
+    together = np.isin(player_games, opponent_games, assume_unique=True)
+    opponent_together = np.isin(opponent_games, player_games, assume_unique=True)
+    return {"player": player_name, "opponent": opponent, "games": int(together.sum()),
+            "wins": int(player_won[together].sum()), "opponent_wins": int(opponent_won[opponent_together].sum())}
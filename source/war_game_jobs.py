@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+import war_game
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+DEFAULT_WORKERS = 4
+# Submissions are refused while this many jobs are waiting
+MAX_QUEUED_JOBS = 10000
+# Finished jobs are forgotten, oldest first, once more than this many jobs are kept
+MAX_JOBS = 20000
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ('id', 'details', 'state', 'result', 'error', 'done')
+
+    def __init__(self, details):
+        self.id = uuid.uuid4().hex
+        self.details = details
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def status(self) -> Dict:
+        """
+        Get the state of the job.
+
+        :return: Dictionary containing the job's ID and state, and its result or error once it has finished
+        """
+        status = {"job_id": self.id, "state": self.state}
+        if self.state == DONE:
+            status["result"] = self.result
+        elif self.state == FAILED:
+            status["error"] = self.error
+        return status
+
+
+class JobQueue:
+    def __init__(self, run_job: Callable[[Dict], Dict], workers: int = DEFAULT_WORKERS,
+                 max_queued: int = MAX_QUEUED_JOBS, max_jobs: int = MAX_JOBS):
+        """
+        Initialize a JobQueue object.
+
+        A JobQueue runs submitted jobs on a pool of worker threads, in the order they were submitted, and keeps
+        their results so that clients can poll for them.
+
+        :param run_job: The function a worker calls with the details of a job; its return value is the result.
+        :param workers: The number of worker threads, started on the first submission.
+        :param max_queued: The number of waiting jobs above which submissions are refused.
+        :param max_jobs: The number of jobs whose state is kept. The oldest finished jobs are forgotten first.
+        """
+        self.run_job = run_job
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, jobs_details: List[Dict]) -> List[str]:
+        """
+        Queue jobs, all or none of them.
+
+        :param jobs_details: The details of every job.
+        :return: The IDs of the jobs, in the same order
+        :raises QueueFullError: If queueing the jobs would exceed max_queued waiting jobs.
+        """
+        jobs = [Job(details) for details in jobs_details]
+        with self._lock:
+            if self._queue.qsize() + len(jobs) > self.max_queued:
+                raise QueueFullError(f"More than {self.max_queued} jobs are waiting")
+            self._start_workers()
+            for job in jobs:
+                self.jobs[job.id] = job
+                self._queue.put(job)
+            self._forget_finished_jobs()
+        return [job.id for job in jobs]
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _forget_finished_jobs(self) -> None:
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done.is_set():
+                break
+            self.jobs.popitem(last=False)
+
+    def close(self) -> None:
+        """
+        Stop the worker threads once they have run every job already queued, and wait for them to finish.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.state = RUNNING
+            try:
+                job.result = self.run_job(job.details)
+                job.state = DONE
+            except Exception as error:
+                job.error = str(error)
+                job.state = FAILED
+                war_game.logger.exception("Job %s failed", job.id)
+            finally:
+                job.done.set()
+
+    def get(self, job_ids: List[str], wait: float = 0) -> List[Dict]:
+        """
+        Get the state of jobs, waiting for them to finish if asked to.
+
+        :param job_ids: The IDs returned when the jobs were submitted.
+        :param wait: The longest time in seconds to wait for all the jobs to finish.
+        :return: A list of dictionaries containing the state of every job, in the same order
+        :raises KeyError: If a job is unknown or has been forgotten.
+        """
+        with self._lock:
+            jobs = [self.jobs[job_id] for job_id in job_ids]
+        deadline = time.monotonic() + wait
+        for job in jobs:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            job.done.wait(remaining)
+        return [job.status() for job in jobs]
@@ -0,0 +1,101 @@
+import argparse
+import threading
+import time
+from typing import Dict, List
+
+import requests
+
+SCENARIOS = {
+    'start_game': [('POST', '/api/start_game', {"player1": "Alice", "player2": "Bob"})],
+    'get_player_wins': [('GET', '/api/get_player_wins', None)],
+    'get_player_score': [('POST', '/api/get_player_score', {"player_name": "Alice"})],
+    # One game for every four score reads.
+    'mixed': [('POST', '/api/start_game', {"player1": "Alice", "player2": "Bob"}),
+              ('GET', '/api/get_player_wins', None),
+              ('POST', '/api/get_player_score', {"player_name": "Alice"}),
+              ('GET', '/api/get_player_wins', None),
+              ('POST', '/api/get_player_score', {"player_name": "Bob"})],
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Get a percentile of a sorted list by the nearest-rank method.
+
+    :param sorted_values: The values, sorted in ascending order.
+    :param fraction: The percentile as a fraction between 0 and 1.
+    :return: The value at that percentile, or 0.0 for an empty list.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_load_test(base_url: str, scenario: str, n_requests: int, concurrency: int) -> Dict[str, float]:
+    """
+    Send requests to a running API server from many threads and measure throughput and latency.
+
+    :param base_url: The server's base URL, such as http://localhost:8080.
+    :param scenario: The name of the request mix, one of SCENARIOS.
+    :param n_requests: The total number of requests to send.
+    :param concurrency: The number of client threads, each with its own keep-alive connection.
+    :return: A dictionary with the number of requests and errors, requests/sec and p50/p99 latency in milliseconds.
+    """
+    requests_mix = SCENARIOS[scenario]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(n_requests))
+
+    def client():
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        for index in counter:
+            method, path, payload = requests_mix[index % len(requests_mix)]
+            start = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=payload, timeout=30)
+                if response.status_code != 200:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_sec': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a running War game API server.")
+    parser.add_argument('--url', default='http://localhost:8080', help="base URL of the server")
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='mixed')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    result = run_load_test(args.url, args.scenario, args.requests, args.concurrency)
+    print(f"{result['requests']} requests, {result['errors']} errors")
+    print(f"{result['requests_per_sec']:.1f} requests/sec, p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ROUND_BUCKETS = (50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 5000)
+WAR_BUCKETS = (0, 5, 10, 15, 20, 30, 50, 100)
+
+
+def format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = '') -> str:
+    """
+    Format the labels of a sample in the Prometheus text format.
+
+    :param label_names: The names of the metric's labels.
+    :param label_values: The values of the labels, in the same order.
+    :param extra: An extra label, already formatted, such as le="0.5".
+    :return: The labels in braces, or an empty string when there are none
+    """
+    pairs = ['{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+             for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (), registry=None):
+        """
+        Initialize a metric and register it.
+
+        :param name: The metric's name, such as war_game_games_in_flight.
+        :param documentation: The help text shown with the metric.
+        :param label_names: The names of the labels the samples are split by.
+        :param registry: The Registry to add the metric to, or None for the module's REGISTRY.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def samples(self) -> List[str]:
+        """
+        Get the metric's samples in the Prometheus text format.
+
+        :return: A list of lines, one per sample
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{format_labels(self.label_names, labels)} {value}' for labels, value in values]
+
+    def render(self) -> str:
+        """
+        Render the metric with its HELP and TYPE lines.
+
+        :return: The metric in the Prometheus text format
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """
+        Add to the counter.
+
+        :param labels: The values of the metric's labels.
+        :param amount: The amount to add.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """
+        Add to the gauge.
+
+        :param labels: The values of the metric's labels.
+        :param amount: The amount to add, which may be negative.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value: float, *labels) -> None:
+        """
+        Set the gauge.
+
+        :param value: The new value.
+        :param labels: The values of the metric's labels.
+        """
+        with self._lock:
+            self._values[labels] = value
+
+    @contextmanager
+    def track(self, *labels):
+        """
+        Count the calls in progress: the gauge is one higher for as long as the with block runs.
+
+        :param labels: The values of the metric's labels.
+        """
+        self.inc(*labels)
+        try:
+            yield
+        finally:
+            self.inc(*labels, amount=-1)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS, registry=None):
+        """
+        Initialize a histogram and register it.
+
+        :param buckets: The upper bounds of the buckets, in ascending order. The +Inf bucket is added.
+        """
+        super().__init__(name, documentation, label_names, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        """
+        Count one observation.
+
+        :param value: The observed value, such as a duration in seconds.
+        :param labels: The values of the metric's labels.
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # The count of every bucket (not cumulative), then the sum of the values
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """
+        Observe how long the with block takes, in seconds.
+
+        :param labels: The values of the metric's labels.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((labels, list(state)) for labels, state in self._values.items())
+        lines = []
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = 'le="{}"'.format('+Inf' if bound == float('inf') else float(bound))
+                lines.append(f'{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.label_names, labels)} {state[-1]}')
+            lines.append(f'{self.name}_count{format_labels(self.label_names, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        """
+        Add a metric to the registry.
+
+        :param metric: The metric; its name must not be taken.
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        :return: The metrics, one sample per line
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = Histogram('war_game_request_duration_seconds', "Time taken to handle an API request.",
+                            ('endpoint', 'method', 'status'))
+DB_QUERY_SECONDS = Histogram('war_game_db_query_duration_seconds', "Time taken by a DatabaseManager call.",
+                             ('query',))
+GAME_ROUNDS = Histogram('war_game_game_rounds', "Rounds played per game.", buckets=ROUND_BUCKETS)
+GAME_WARS = Histogram('war_game_game_wars', "Wars fought per game.", buckets=WAR_BUCKETS)
+GAME_SECONDS = Histogram('war_game_game_duration_seconds', "Time taken to play a game, without the database.")
+GAMES_IN_FLIGHT = Gauge('war_game_games_in_flight', "Games being played right now.")
+PROFILES_TAKEN = Counter('war_game_profiles_total', "Requests that were profiled.", ('endpoint',))
@@ -0,0 +1,138 @@
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import war_game
+from war_game_fast import FastGame
+
+DEFAULT_MAX_ROUNDS = 10000
+SHARDS_PER_WORKER = 4
+
+
+def play_seed_range(player_names: List[str], start: int, stop: int, max_rounds: int = DEFAULT_MAX_ROUNDS) -> Counter:
+    """
+    Play one game for every seed in a range and tally the winners.
+
+    :param player_names: The names of the two players.
+    :param start: The first seed to play.
+    :param stop: The seed after the last one to play.
+    :param max_rounds: The number of rounds after which a game is stopped and won by the player holding the most cards.
+    :return: A Counter of wins per player name.
+    """
+    tallies = Counter()
+    for seed in range(start, stop):
+        winner = FastGame(player_names, seed=seed, max_rounds=max_rounds).play_game()[0]
+        tallies[winner] += 1
+    return tallies
+
+
+def play_seed_range_results(player_names: List[str], start: int, stop: int,
+                            max_rounds: int = DEFAULT_MAX_ROUNDS) -> List[war_game.GameResult]:
+    """
+    Play one game for every seed in a range and keep the result of every game, to be recorded in the database.
+
+    :param player_names: The names of the two players.
+    :param start: The first seed to play.
+    :param stop: The seed after the last one to play.
+    :param max_rounds: The number of rounds after which a game is stopped and won by the player holding the most cards.
+    :return: The GameResult of every game, in seed order. The fast engine does not measure wars' lengths, so
+             longest_war is 0.
+    """
+    results = []
+    for seed in range(start, stop):
+        game_start = time.perf_counter()
+        winner, rounds, wars = FastGame(player_names, seed=seed, max_rounds=max_rounds).play_game()
+        results.append(war_game.GameResult(tuple(player_names), winner, rounds, wars, 0, seed,
+                                           time.perf_counter() - game_start, time.time()))
+    return results
+
+
+def shard_seeds(first_seed: int, n_games: int, n_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split a range of seeds into contiguous shards of nearly equal size.
+
+    :param first_seed: The first seed to play.
+    :param n_games: The number of games, one per seed.
+    :param n_shards: The number of shards.
+    :return: A list of (start, stop) seed ranges.
+    """
+    n_shards = max(1, min(n_shards, n_games))
+    size, extra = divmod(n_games, n_shards)
+    shards = []
+    start = first_seed
+    for index in range(n_shards):
+        stop = start + size + (1 if index < extra else 0)
+        shards.append((start, stop))
+        start = stop
+    return shards
+
+
+def run_simulation(player_names: List[str], n_games: int, first_seed: int = 0, workers: int = None,
+                   max_rounds: int = DEFAULT_MAX_ROUNDS, db_manager=None) -> Counter:
+    """
+    Play many games across a pool of worker processes and merge the winners.
+
+    Every worker process plays its own seed ranges and keeps its tallies locally, so the results only depend on
+    first_seed and n_games, not on the number of workers.
+
+    :param player_names: The names of the two players.
+    :param n_games: The number of games to play.
+    :param first_seed: The seed of the first game. Game i is played with seed first_seed + i.
+    :param workers: The number of worker processes. Defaults to the number of CPUs.
+    :param max_rounds: The number of rounds after which a game is stopped and won by the player holding the most cards.
+    :param db_manager: A DatabaseManager to record the games in, with their wins, statistics and history, in one
+                       transaction, or None to skip the database.
+    :return: A Counter of wins per player name.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shard_seeds(first_seed, n_games, workers * SHARDS_PER_WORKER)
+    # Without a database only the tallies travel back from the workers
+    play_shard = play_seed_range if db_manager is None else play_seed_range_results
+    if workers == 1:
+        shard_outcomes = [play_shard(player_names, start, stop, max_rounds) for start, stop in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(play_shard, player_names, start, stop, max_rounds) for start, stop in shards]
+            shard_outcomes = [future.result() for future in futures]
+
+    tallies = Counter()
+    if db_manager is None:
+        for shard_tallies in shard_outcomes:
+            tallies.update(shard_tallies)
+        return tallies
+    results = [result for shard_results in shard_outcomes for result in shard_results]
+    tallies.update(result.winner for result in results)
+    if results:
+        db_manager.record_games(results)
+    return tallies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many games of War across all cores and report the winners.")
+    parser.add_argument('--games', type=int, default=100000, help="number of games to play")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: all CPUs)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the first game")
+    parser.add_argument('--players', nargs=2, default=['Player 1', 'Player 2'], help="the two player names")
+    parser.add_argument('--max-rounds', type=int, default=DEFAULT_MAX_ROUNDS,
+                        help="rounds after which a game is stopped and won by the player holding the most cards")
+    parser.add_argument('--db', default=None, help="add the wins to this player_wins database")
+    args = parser.parse_args(argv)
+
+    db_manager = None
+    if args.db:
+        db_manager = war_game.DatabaseManager(args.db)
+
+    start = time.perf_counter()
+    tallies = run_simulation(args.players, args.games, args.seed, args.workers, args.max_rounds, db_manager)
+    elapsed = time.perf_counter() - start
+
+    for name in args.players:
+        print(f"{name}: {tallies[name]} wins")
+    print(f"{args.games} games in {elapsed:.2f}s ({args.games / elapsed:.0f} games/sec)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Tuple, Union
+
+import war_game
+from war_game_fast import FastGame
+
+SINGLE_ELIMINATION = 'single_elimination'
+ROUND_ROBIN = 'round_robin'
+FORMATS = (SINGLE_ELIMINATION, ROUND_ROBIN)
+MAX_TOURNAMENT_PLAYERS = 256
+# Matches sent to a worker at a time
+MATCH_CHUNK_SIZE = 64
+
+PENDING = 'pending'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+
+def play_match(match: Tuple[str, str, int]) -> war_game.GameResult:
+    """
+    Play one tournament match. Runs in a worker process.
+
+    :param match: A tuple containing the names of the two players and the seed of the shuffle.
+    :return: The GameResult of the match. The fast engine does not measure wars' lengths, so longest_war is 0.
+    """
+    player1, player2, seed = match
+    start = time.perf_counter()
+    winner, rounds, wars = FastGame([player1, player2], seed=seed).play_game()
+    return war_game.GameResult((player1, player2), winner, rounds, wars, 0, seed, time.perf_counter() - start,
+                               time.time())
+
+
+def rank_players(players: List[str], key) -> List[Dict[str, Union[str, int]]]:
+    """
+    Rank players by a score, best first. Players with the same score share a rank.
+
+    :param players: The names of the players.
+    :param key: Function returning the score of a player; higher is better.
+    :return: A list of dictionaries containing the rank and the name of every player
+    """
+    ordered = sorted(players, key=lambda name: (-key(name), name))
+    standings = []
+    for position, name in enumerate(ordered, start=1):
+        if standings and key(name) == key(standings[-1]["name"]):
+            rank = standings[-1]["rank"]
+        else:
+            rank = position
+        standings.append({"rank": rank, "name": name})
+    return standings
+
+
+class Tournament:
+    def __init__(self, player_names: List[str], format: str = SINGLE_ELIMINATION, seed=None, db_manager=None,
+                 executor=None):
+        """
+        Initialize a Tournament object.
+
+        A Tournament plays every match of a single-elimination or round-robin bracket. The independent matches of a
+        round are played together on the executor, each with its own seed drawn from the tournament's seed, and the
+        results of all matches are recorded in one transaction when the tournament is over, which adds them to the
+        wins, the players' statistics and the game history.
+
+        :param player_names: The names of the 2 to MAX_TOURNAMENT_PLAYERS players, in seeding order.
+        :param format: SINGLE_ELIMINATION or ROUND_ROBIN.
+        :param seed: Seed for the match seeds, which makes the whole tournament reproducible.
+        :param db_manager: The DatabaseManager or ScoreBuffer to record the matches in, or None to keep them out of
+                           the database.
+        :param executor: A concurrent.futures executor to play the matches on, or None to play them in the calling
+                         thread.
+        :raises ValueError: If player_names is not a list of 2 to MAX_TOURNAMENT_PLAYERS unique strings, or the format
+                            is unknown.
+        """
+        if not isinstance(player_names, list) or not all(isinstance(name, str) for name in player_names):
+            raise ValueError("players must be a list of names")
+        player_names = list(player_names)
+        if format not in FORMATS:
+            raise ValueError(f"Unknown tournament format {format!r}, expected one of {', '.join(FORMATS)}")
+        if not 2 <= len(player_names) <= MAX_TOURNAMENT_PLAYERS:
+            raise ValueError(f"A tournament needs 2 to {MAX_TOURNAMENT_PLAYERS} players, got {len(player_names)}")
+        if len(set(player_names)) != len(player_names):
+            raise ValueError("Player names must be unique")
+        self.id = uuid.uuid4().hex
+        self.player_names = player_names
+        self.format = format
+        self.seed = seed
+        self.db_manager = db_manager
+        self.executor = executor
+        self.rng = random.Random(seed)
+        n_players = len(player_names)
+        self.matches_total = n_players - 1 if format == SINGLE_ELIMINATION else n_players * (n_players - 1) // 2
+        self.matches = []
+        # The GameResult of every match, recorded when the tournament is over
+        self.results = []
+        self.wins = Counter()
+        self.losses = Counter()
+        # For single elimination, the round in which each player lost
+        self.eliminated_in = {}
+        self.round = 0
+        self.state = PENDING
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start(self) -> 'Tournament':
+        """
+        Run the tournament on a background thread.
+
+        :return: The tournament itself
+        """
+        threading.Thread(target=self.run, name=f'tournament-{self.id}', daemon=True).start()
+        return self
+
+    def run(self) -> None:
+        """
+        Play every match of the tournament and record the matches in the database.
+        """
+        self.state = RUNNING
+        try:
+            if self.format == SINGLE_ELIMINATION:
+                self._play_single_elimination()
+            else:
+                self._play_round([(player1, player2) for index, player1 in enumerate(self.player_names)
+                                  for player2 in self.player_names[index + 1:]])
+            if self.db_manager is not None:
+                self.db_manager.record_games(self.results)
+            self.state = FINISHED
+        except Exception as error:
+            self.error = str(error)
+            self.state = FAILED
+            war_game.logger.exception("Tournament %s failed", self.id)
+
+    def _play_single_elimination(self) -> None:
+        remaining = self.player_names
+        while len(remaining) > 1:
+            pairs = [(remaining[index], remaining[index + 1]) for index in range(0, len(remaining) - 1, 2)]
+            # With an odd number of players left, the last one sits the round out and plays first in the next one
+            bye = remaining[-1:] if len(remaining) % 2 else []
+            winners = self._play_round(pairs)
+            for (player1, player2), winner in zip(pairs, winners):
+                self.eliminated_in[player2 if winner == player1 else player1] = self.round
+            remaining = bye + winners
+
+    def _play_round(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        self.round += 1
+        matches = [(player1, player2, self.rng.getrandbits(63)) for player1, player2 in pairs]
+        if self.executor is None:
+            results = map(play_match, matches)
+        else:
+            results = self.executor.map(play_match, matches, chunksize=MATCH_CHUNK_SIZE)
+        winners = []
+        for (player1, player2, seed), result in zip(matches, results):
+            winner = result.winner
+            with self._lock:
+                self.matches.append({"round": self.round, "player1": player1, "player2": player2, "seed": seed,
+                                     "winner": winner})
+                self.results.append(result)
+                self.wins[winner] += 1
+                self.losses[player2 if winner == player1 else player1] += 1
+            winners.append(winner)
+        return winners
+
+    def standings(self) -> List[Dict[str, Union[str, int]]]:
+        """
+        Get the standings of the tournament.
+
+        Round-robin players are ranked by wins. Single-elimination players are ranked by how far they got, so the
+        champion comes first and the players who lost in the same round share a rank.
+
+        :return: A list of dictionaries containing the rank, name, wins and losses of every player, best first.
+        """
+        with self._lock:
+            if self.format == SINGLE_ELIMINATION:
+                standings = rank_players(self.player_names,
+                                         lambda name: self.eliminated_in.get(name, self.round + 1))
+            else:
+                standings = rank_players(self.player_names, lambda name: self.wins[name])
+            for entry in standings:
+                entry["wins"] = self.wins[entry["name"]]
+                entry["losses"] = self.losses[entry["name"]]
+        return standings
+
+    def status(self) -> Dict:
+        """
+        Get the progress of the tournament.
+
+        :return: Dictionary containing the tournament's ID, format, state, round and number of matches played, and
+                 the standings once it has finished.
+        """
+        status = {"tournament_id": self.id, "format": self.format, "state": self.state, "round": self.round,
+                  "matches_played": len(self.matches), "matches_total": self.matches_total}
+        if self.state == FINISHED:
+            status["standings"] = self.standings()
+        elif self.state == FAILED:
+            status["error"] = self.error
+        return status
@@ -1,7 +1,10 @@
+import os
+import tempfile
 import unittest
 from unittest.mock import patch
 
 import war_game
+import war_game_metrics
 from source.war_game_api import app
 
 class war_game_api_test(unittest.TestCase):
@@ -18,6 +21,22 @@ class war_game_api_test(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, {"winner": "player1", "wins": 1})
 
+    def test_api_start_game_rejects_bad_players(self):
+        for players in ("Alice", 5, ["Alice", 3], {"Alice": 1, "Bob": 2}):
+            response = self.client.post('/api/start_game', json={"players": players})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json, {"error": "players must be a list of names"})
+
+    @patch('source.war_game_api.get_db_manager')
+    def test_api_start_game_rejects_bad_seeds(self, mock_get_db_manager):
+        for seed in ([1, 2], {"a": 1}, 2 ** 64, -2 ** 63 - 1, True, 1.5):
+            response = self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob", "seed": seed})
+            self.assertEqual(response.status_code, 400, seed)
+            self.assertIn("seed must be", response.json["error"])
+            self.assertEqual(self.client.post('/api/games', json={"player1": "Alice", "player2": "Bob",
+                                                                  "seed": seed}).status_code, 400)
+        mock_get_db_manager.assert_not_called()
+
     @patch('source.war_game_api.get_wins')
     def test_api_get_player_wins(self, mock_get_wins):
         mock_get_wins.return_value = {"player_wins": [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}]}
@@ -26,6 +45,35 @@ class war_game_api_test(unittest.TestCase):
         self.assertEqual(response.json, {"player_wins": [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}]})
 
 
+    @patch('source.war_game_api.get_wins')
+    def test_api_get_player_wins_page(self, mock_get_wins):
+        mock_get_wins.return_value = {"player_wins": [{"name": "Alice", "wins": 2, "rank": 1}]}
+        response = self.client.get('/api/get_player_wins?limit=1&offset=3')
+        self.assertEqual(response.status_code, 200)
+        mock_get_wins.assert_called_once_with(1, 3)
+
+    @patch('source.war_game_api.get_leaderboard')
+    def test_api_get_player_wins_page_limits(self, mock_get_leaderboard):
+        mock_get_leaderboard.return_value.get_scores.return_value = []
+        self.assertEqual(self.client.get('/api/get_player_wins?limit=-1').status_code, 400)
+        self.assertEqual(self.client.get('/api/get_player_wins?limit=5&offset=-1').status_code, 400)
+        mock_get_leaderboard.return_value.get_scores.assert_not_called()
+        self.assertEqual(self.client.get('/api/get_player_wins?limit=100000').status_code, 200)
+        mock_get_leaderboard.return_value.get_scores.assert_called_once_with(1000, 0)
+
+    @patch('source.war_game_api.get_leaderboard')
+    def test_api_get_player_rank(self, mock_get_leaderboard):
+        mock_get_leaderboard.return_value.get_player_rank.return_value = (3, 7)
+        response = self.client.post('/api/get_player_rank', json={"player_name": "Alice"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"name": "Alice", "rank": 3, "wins": 7})
+
+    @patch('source.war_game_api.get_leaderboard')
+    def test_api_get_player_rank_unknown_player(self, mock_get_leaderboard):
+        mock_get_leaderboard.return_value.get_player_rank.return_value = None
+        response = self.client.post('/api/get_player_rank', json={"player_name": "Alice"})
+        self.assertEqual(response.json, {"name": "Alice", "rank": None, "wins": 0})
+
     @patch('source.war_game_api.get_player_score')
     def test_get_player_score(self, mock_get_player_score):
         mock_get_player_score.return_value = {"wins": ["Alice", 1]}
@@ -33,13 +81,104 @@ class war_game_api_test(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, {"wins": ["Alice", 1]})
 
-    @patch('source.war_game_api.logs')
-    def test_api_get_logs_no_logs(self, mock_logs):
-        mock_logs.__bool__.return_value = False
+    @patch('source.war_game_api.new_game')
+    @patch('source.war_game_api.stream_game')
+    def test_api_stream_game(self, mock_stream_game, mock_new_game):
+        mock_stream_game.return_value = iter([('round', {"round": 1, "winner": "Alice"}),
+                                              ('result', {"winner": "Alice", "game_id": "abc"})])
+        response = self.client.get('/api/stream_game?player1=Alice&player2=Bob&seed=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.get_data(as_text=True),
+                         'event: round\ndata: {"round":1,"winner":"Alice"}\n\n'
+                         'event: result\ndata: {"winner":"Alice","game_id":"abc"}\n\n')
+        mock_new_game.assert_called_once_with({"player1": "Alice", "player2": "Bob", "seed": 3})
+        mock_stream_game.assert_called_once_with(mock_new_game.return_value)
+
+    def test_api_stream_game_without_players(self):
+        self.assertEqual(self.client.get('/api/stream_game?player1=Alice').status_code, 400)
+        self.assertEqual(self.client.get('/api/stream_game?players=Alice').status_code, 400)
+
+    @patch('source.war_game_api.start_game')
+    def test_metrics(self, mock_start_game):
+        mock_start_game.return_value = {"winner": "player1", "wins": 1}
+        self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob"})
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.get_data(as_text=True)
+        self.assertIn('# TYPE war_game_request_duration_seconds histogram', body)
+        self.assertIn('war_game_request_duration_seconds_count{endpoint="/api/start_game",method="POST",status="200"}',
+                      body)
+        self.assertIn('war_game_games_in_flight', body)
+
+    @patch('source.war_game_api.start_game')
+    def test_failed_requests_are_timed(self, mock_start_game):
+        mock_start_game.side_effect = RuntimeError("boom")
+        with patch.object(war_game_metrics.REQUEST_SECONDS, 'observe') as mock_observe:
+            with patch.dict(app.config, {'PROPAGATE_EXCEPTIONS': False}):
+                response = self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob"})
+            self.assertEqual(response.status_code, 500)
+            # In testing mode the exception reaches the caller without an error response being made
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob"})
+        self.assertEqual([call[0][1:] for call in mock_observe.call_args_list],
+                         [('/api/start_game', 'POST', '500')] * 2)
+
+    @patch('source.war_game_api.start_game')
+    def test_start_game_is_profiled(self, mock_start_game):
+        mock_start_game.return_value = {"winner": "player1", "wins": 1}
+        with tempfile.TemporaryDirectory() as directory:
+            with patch('source.war_game_api.profile_rate', 1.0), patch('source.war_game_api.PROFILE_DIR', directory):
+                response = self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob"})
+                self.assertEqual(response.json, {"winner": "player1", "wins": 1})
+                self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.prof')]), 1)
+            self.client.post('/api/start_game', json={"player1": "Alice", "player2": "Bob"})
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    @patch('source.war_game_api.log_store')
+    def test_api_get_logs_no_logs(self, mock_log_store):
+        mock_log_store.get.return_value = None
         response = self.client.get('/api/get_logs')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json, {"logs": "No logs available"})
 
+    def test_api_get_logs_renders_latest_game(self):
+        recorder = war_game.EventRecorder()
+        recorder.record(war_game.EVENT_ROUND, 1)
+        with patch('source.war_game_api.log_store') as mock_log_store:
+            mock_log_store.get.return_value = recorder
+            response = self.client.get('/api/get_logs')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {"logs": ["\nRound 1 -"]})
+        mock_log_store.get.assert_called_once_with(None)
+
+    @patch('source.war_game_api.log_store')
+    def test_api_get_logs_by_game_id(self, mock_log_store):
+        mock_log_store.get.return_value = None
+        response = self.client.get('/api/get_logs?game_id=abc')
+        self.assertEqual(response.status_code, 404)
+        mock_log_store.get.assert_called_once_with('abc')
+
+    def test_api_get_logs_ndjson(self):
+        recorder = war_game.EventRecorder()
+        recorder.record(war_game.EVENT_ROUND, 1)
+        recorder.record(war_game.EVENT_WON_CARDS, "Alice", 2)
+        with patch('source.war_game_api.log_store') as mock_log_store:
+            mock_log_store.get.return_value = recorder
+            response = self.client.get('/api/get_logs?format=ndjson')
+            accept_response = self.client.get('/api/get_logs', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(response.get_data(as_text=True), '"\\nRound 1 -"\n"Alice won 2 cards.\\n"\n')
+        self.assertEqual(accept_response.get_data(), response.get_data())
+
+    def test_api_get_logs_ndjson_no_logs(self):
+        with patch('source.war_game_api.log_store') as mock_log_store:
+            mock_log_store.get.return_value = None
+            response = self.client.get('/api/get_logs?format=ndjson')
+        self.assertEqual(response.status_code, 404)
+
     @patch.object(war_game.DatabaseManager, 'create_db')
     @patch.object(war_game.DatabaseManager, 'reset_all_scores')
     def test_reset_all_scores(self, mock_api_reset_all_scores, db_manager_mock):
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import war_game
+import war_game_api
+from source.war_game_asgi import WarGameApp, play_match
+from source.war_game_loadtest import percentile
+
+
+def call(app, method, path, payload=None, query_string=b'', raw=False):
+    """
+    Send one HTTP request to an ASGI app and collect the response.
+
+    :return: A tuple containing the status code and the decoded JSON body
+    """
+    messages = []
+    body = json.dumps(payload).encode() if payload is not None else b''
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query_string}
+    asyncio.run(app(scope, receive, send))
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return messages[0]['status'], body if raw else json.loads(body)
+
+
+class TestWarGameApp(unittest.TestCase):
+    processes = False
+
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = war_game.DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.patches = [patch('war_game_api.db_manager', self.db_manager), patch('war_game_api.leaderboard', None),
+                        patch('war_game_api.log_store', war_game.GameLogStore(self.db_manager)),
+                        patch('war_game_api.job_queue', None), patch('war_game_api.players', [])]
+        for patcher in self.patches:
+            patcher.start()
+        self.app = WarGameApp(workers=1, processes=self.processes)
+
+    def tearDown(self):
+        self.app.shutdown()
+        if war_game_api.job_queue is not None:
+            war_game_api.job_queue.close()
+        for patcher in self.patches:
+            patcher.stop()
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_start_game(self):
+        random.seed(3)
+        status, payload = call(self.app, 'POST', '/api/start_game', {"player1": "Alice", "player2": "Bob"})
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["wins"], 1)
+        self.assertEqual(self.db_manager.get_player_score(payload["winner"]), (payload["winner"], 1))
+        game_id = payload["game_id"]
+        status, payload = call(self.app, 'GET', '/api/get_logs')
+        self.assertEqual(payload["logs"][:2], ["Alice has 26 cards.", "Bob has 26 cards."])
+        status, body = call(self.app, 'GET', '/api/get_logs', query_string=b'format=ndjson', raw=True)
+        self.assertEqual(status, 200)
+        self.assertEqual([json.loads(line) for line in body.splitlines()], payload["logs"])
+        status, by_id = call(self.app, 'GET', '/api/get_logs', query_string=f'game_id={game_id}'.encode())
+        self.assertEqual(by_id, payload)
+        self.assertEqual(call(self.app, 'GET', '/api/get_logs', query_string=b'game_id=unknown')[0], 404)
+
+    def test_seeded_games_replay_the_same_logs(self):
+        logs = []
+        for _ in range(2):
+            status, payload = call(self.app, 'POST', '/api/start_game', {"player1": "Alice", "player2": "Bob", "seed": 5})
+            status, payload = call(self.app, 'GET', '/api/get_logs', query_string=f'game_id={payload["game_id"]}'.encode())
+            logs.append(payload["logs"])
+        self.assertEqual(logs[0][:-1], logs[1][:-1])
+        self.assertNotEqual(logs[0][-1], logs[1][-1])
+
+    def test_scores(self):
+        self.db_manager.bulk_update_scores({"Alice": 2, "Bob": 3})
+        status, payload = call(self.app, 'GET', '/api/get_player_wins', query_string=b'limit=1')
+        self.assertEqual(payload, {"player_wins": [{"name": "Bob", "wins": 3, "rank": 1}]})
+        status, payload = call(self.app, 'GET', '/api/get_player_wins', query_string=b'limit=-1')
+        self.assertEqual(status, 400)
+        status, payload = call(self.app, 'POST', '/api/get_player_score', {"player_name": "Alice"})
+        self.assertEqual(payload, {"wins": ["Alice", 2], "stats": None})
+        status, payload = call(self.app, 'GET', '/api/reset_all_scores')
+        self.assertEqual(payload, {"response": [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 3}]})
+
+    def test_bad_request(self):
+        status, payload = call(self.app, 'POST', '/api/start_game', {"player1": "Alice"})
+        self.assertEqual(status, 400)
+        status, payload = call(self.app, 'POST', '/api/start_game', {"players": ["Alice"]})
+        self.assertEqual(status, 400)
+        status, payload = call(self.app, 'POST', '/api/start_game', {"players": 5})
+        self.assertEqual(status, 400)
+        for seed in ([1, 2], {"a": 1}, 2 ** 64):
+            status, payload = call(self.app, 'POST', '/api/start_game', {"player1": "Alice", "player2": "Bob",
+                                                                         "seed": seed})
+            self.assertEqual(status, 400)
+        self.assertEqual(war_game_api.players, [])
+
+    def test_games_queue(self):
+        status, payload = call(self.app, 'POST', '/api/games', {"games": [{"player1": "Alice", "player2": "Bob"},
+                                                                          {"players": ["Carol", "Dave", "Eve"]}]})
+        self.assertEqual(status, 202)
+        query_string = '&'.join(f'job_id={job_id}' for job_id in payload["job_ids"]) + '&wait=10'
+        status, payload = call(self.app, 'GET', '/api/games', query_string=query_string.encode())
+        self.assertEqual([job["state"] for job in payload["jobs"]], ["done", "done"])
+        self.assertEqual(call(self.app, 'POST', '/api/games', {"players": ["Alice"]})[0], 400)
+        self.assertEqual(call(self.app, 'GET', '/api/games', query_string=b'job_id=unknown')[0], 404)
+
+    def test_stream_game(self):
+        status, body = call(self.app, 'GET', '/api/stream_game', query_string=b'player1=Alice&player2=Bob&seed=3',
+                            raw=True)
+        self.assertEqual(status, 200)
+        events = [event.split('\n') for event in body.decode().strip().split('\n\n')]
+        self.assertEqual([lines[0] for lines in events], ['event: round'] * (len(events) - 1) + ['event: result'])
+        result = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(result["rounds"], len(events) - 1)
+        self.assertEqual(self.db_manager.get_player_score(result["winner"]), (result["winner"], 1))
+        status, payload = call(self.app, 'GET', '/api/stream_game',
+                               query_string=b'players=Alice&players=Bob&players=Carol&seed=3', raw=True)
+        self.assertEqual(status, 200)
+        self.assertEqual(call(self.app, 'GET', '/api/stream_game', query_string=b'player1=Alice')[0], 400)
+
+    def test_metrics(self):
+        call(self.app, 'GET', '/api/get_player_wins')
+        status, body = call(self.app, 'GET', '/metrics', raw=True)
+        self.assertEqual(status, 200)
+        self.assertIn(b'war_game_request_duration_seconds_count{endpoint="/api/get_player_wins",method="GET",'
+                      b'status="200"}', body)
+
+    def test_multiplayer_game(self):
+        status, payload = call(self.app, 'POST', '/api/start_game', {"players": ["Alice", "Bob", "Carol"], "seed": 2})
+        self.assertEqual(status, 200)
+        self.assertIn(payload["winner"], ["Alice", "Bob", "Carol"])
+        status, payload = call(self.app, 'GET', '/api/get_logs', query_string=f'game_id={payload["game_id"]}'.encode())
+        self.assertEqual(payload["logs"][:3], ["Alice has 18 cards.", "Bob has 17 cards.", "Carol has 17 cards."])
+
+    def test_tournament(self):
+        status, payload = call(self.app, 'POST', '/api/start_tournament', {"players": ["Alice", "Bob", "Carol"], "seed": 1})
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["matches_total"], 2)
+        query_string = f'tournament_id={payload["tournament_id"]}'.encode()
+        for _ in range(100):
+            status, payload = call(self.app, 'GET', '/api/get_tournament', query_string=query_string)
+            if payload["state"] == "finished":
+                break
+            time.sleep(0.05)
+        self.assertEqual(payload["standings"][0]["rank"], 1)
+        self.assertEqual(call(self.app, 'GET', '/api/get_tournament', query_string=b'tournament_id=unknown')[0], 404)
+
+    def test_server_errors(self):
+        with patch('war_game_api.get_player_rank', side_effect=KeyError('Rank')), self.assertLogs(level='ERROR'):
+            status, payload = call(self.app, 'POST', '/api/get_player_rank', {"player_name": "Alice"})
+        self.assertEqual((status, payload), (500, {"error": "Internal server error"}))
+        self.assertEqual(call(self.app, 'POST', '/api/get_player_rank', {})[0], 400)
+        self.assertEqual(call(self.app, 'POST', '/api/get_player_rank', ["Alice"])[0], 400)
+
+    def test_unknown_route(self):
+        self.assertEqual(call(self.app, 'GET', '/api/nothing')[0], 404)
+        self.assertEqual(call(self.app, 'GET', '/api/start_game')[0], 405)
+
+
+class TestWorkerProcesses(TestWarGameApp):
+    """
+    The same requests with the games played in worker processes, as the app does by default.
+    """
+    processes = True
+
+    def test_unseeded_games(self):
+        for _ in range(2):
+            status, payload = call(self.app, 'POST', '/api/start_game', {"player1": "Alice", "player2": "Bob"})
+            self.assertEqual(status, 200, payload)
+        scores = [score for _, score in filter(None, (self.db_manager.get_player_score(name)
+                                                      for name in ("Alice", "Bob")))]
+        self.assertEqual(sum(scores), 2)
+        status, payload = call(self.app, 'GET', '/api/get_logs')
+        self.assertEqual(payload["logs"][:2], ["Alice has 26 cards.", "Bob has 26 cards."])
+
+
+class TestPlayMatch(unittest.TestCase):
+    def test_play_match_does_not_touch_database(self):
+        random.seed(3)
+        with patch.object(war_game, 'DatabaseManager') as mock_db_manager:
+            result, deal = play_match(["Alice", "Bob"])
+        mock_db_manager.assert_not_called()
+        self.assertIn(result.winner, ("Alice", "Bob"))
+        self.assertEqual(len(deal), 52)
+
+    def test_unseeded_game_can_be_pickled(self):
+        game = war_game.Game([war_game.Player("Alice"), war_game.Player("Bob")])
+        self.assertEqual(pickle.loads(pickle.dumps(game)).deal, game.deal)
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+from source.war_game_batch import shuffled_decks, simulate_batch, simulate_decks
+from source.war_game_fast import CANONICAL_DECK, play_deal, shuffled_deck
+
+
+class TestShuffledDecks(unittest.TestCase):
+    def test_every_row_is_a_deck(self):
+        decks = shuffled_decks(5, seed=3)
+        self.assertEqual(decks.shape, (5, 52))
+        for deck in decks:
+            self.assertEqual(sorted(deck.tolist()), sorted(CANONICAL_DECK))
+
+    def test_seeded(self):
+        self.assertTrue(np.array_equal(shuffled_decks(5, seed=3), shuffled_decks(5, seed=3)))
+
+
+class TestSimulateBatch(unittest.TestCase):
+    def test_matches_fast_engine(self):
+        decks = shuffled_decks(200, seed=11)
+        winners, rounds, wars = simulate_decks(decks)
+        for deck, winner, round_count, war_count in zip(decks, winners, rounds, wars):
+            self.assertEqual(play_deal(deck.tobytes(), 10000), (winner, round_count, war_count))
+
+    def test_cycling_games_match_fast_engine(self):
+        cycling = np.frombuffer(shuffled_deck(951), dtype=np.uint8)
+        decks = np.vstack([shuffled_decks(100, seed=2), np.tile(cycling, (50, 1))])
+        winners, rounds, wars = simulate_decks(decks)
+        for deck, winner, round_count, war_count in zip(decks, winners, rounds, wars):
+            self.assertEqual(play_deal(deck.tobytes(), 10000), (winner, round_count, war_count))
+
+    def test_max_rounds(self):
+        decks = shuffled_decks(50, seed=5)
+        winners, rounds, wars = simulate_decks(decks, max_rounds=10)
+        self.assertTrue((rounds <= 10).all())
+        self.assertTrue((rounds == 10).any())
+        for deck, winner, round_count, war_count in zip(decks, winners, rounds, wars):
+            self.assertEqual(play_deal(deck.tobytes(), 10), (winner, round_count, war_count))
+
+    def test_result_shapes(self):
+        winners, rounds, wars = simulate_batch(20, seed=1)
+        self.assertEqual(winners.shape, (20,))
+        self.assertEqual(rounds.shape, (20,))
+        self.assertEqual(wars.shape, (20,))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import war_game
+import war_game_api
+from source.war_game_benchmark import bench_database, bench_engine, bench_http, bench_startup, compare, main, measure, \
+    result_key
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.test_data_directory.cleanup()
+
+    def test_measure(self):
+        runs = []
+        result = measure('noop', runs.append, 10, 3, table_size=5)
+        self.assertEqual(runs, [0, 1, 2])
+        self.assertEqual(result["params"], {"table_size": 5})
+        self.assertEqual(result["ops"], 10)
+        self.assertGreater(result["ops_per_sec"], 0)
+        self.assertEqual(result_key(result), 'noop[table_size=5]')
+
+    def test_compare_flags_regressions(self):
+        baseline = {"results": [{"name": "a", "params": {}, "ops_per_sec": 100.0},
+                                {"name": "b", "params": {"concurrency": 2}, "ops_per_sec": 100.0}]}
+        current = {"results": [{"name": "a", "params": {}, "ops_per_sec": 95.0},
+                               {"name": "b", "params": {"concurrency": 2}, "ops_per_sec": 80.0},
+                               {"name": "c", "params": {}, "ops_per_sec": 1.0}]}
+        regressions = compare(baseline, current, threshold=0.1)
+        self.assertEqual([regression["key"] for regression in regressions], ['b[concurrency=2]'])
+        self.assertAlmostEqual(regressions[0]["change"], -0.2)
+        self.assertEqual(compare(baseline, current, threshold=0.25), [])
+
+    def test_suites(self):
+        directory = self.test_data_directory.name
+        engine = bench_engine(2, 1, directory)
+        self.assertEqual([result["name"] for result in engine],
+                         ['engine.play_rounds', 'engine.play_game', 'engine.fast_play_game'])
+        database = bench_database(5, 1, directory, table_sizes=(10,))
+        self.assertEqual([result_key(result) for result in database],
+                         ['db.update_score[table_size=10]', 'db.get_player_score[table_size=10]',
+                          'db.get_all_scores[table_size=10]'])
+        saved_db_manager = war_game_api.db_manager
+        http = bench_http(4, 1, directory, concurrency_levels=(2,))
+        self.assertEqual(len(http), 3)
+        self.assertIs(war_game_api.db_manager, saved_db_manager)
+
+    def test_startup(self):
+        with patch.dict('source.war_game_benchmark.STARTUP_SNIPPETS', {'startup.import_api': 'import war_game_api'},
+                        clear=True):
+            results = bench_startup(1, 1, self.test_data_directory.name)
+        self.assertEqual([result["name"] for result in results], ['startup.import_api'])
+
+    def test_main_exits_on_regression(self):
+        output = os.path.join(self.test_data_directory.name, 'results.json')
+        report = {"results": [{"name": "db.update_score", "params": {"table_size": 100}, "ops_per_sec": 1e12}]}
+        baseline = os.path.join(self.test_data_directory.name, 'baseline.json')
+        with open(baseline, 'w') as file:
+            json.dump(report, file)
+        with patch('source.war_game_benchmark.run_benchmarks', return_value=dict(report, results=[
+                dict(report["results"][0], ops_per_sec=1.0, median_ms=1.0)])), patch('builtins.print'), \
+                patch.object(war_game.logger, 'setLevel'):
+            with self.assertRaises(SystemExit):
+                main(['--suite', 'db', '--output', output, '--baseline', baseline])
+        with open(output) as file:
+            self.assertEqual(json.load(file)["results"][0]["ops_per_sec"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import random
+import subprocess
+import sys
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+import war_game
+from source.war_game_client import ApiClient, ClientError, GameClient, LocalClient, get_client
+
+
+class TestApiClient(unittest.TestCase):
+    def setUp(self):
+        self.client = ApiClient(base_url='http://api:8080/', cache_ttl=60)
+        self.mock_request = MagicMock()
+        self.mock_request.return_value.json.return_value = {'wins': ['Alice', 2]}
+        self.client.session.request = self.mock_request
+
+    def test_session_is_pooled(self):
+        adapter = ApiClient().session.get_adapter('http://localhost:8080/api/get_logs')
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter.max_retries.total, 3)
+
+    def test_start_game_sends_json(self):
+        self.mock_request.return_value.json.return_value = {'winner': 'Alice', 'wins': 1}
+        self.assertEqual(self.client.start_game('Alice', 'Bob'), {'winner': 'Alice', 'wins': 1})
+        self.mock_request.assert_called_once_with('POST', 'http://api:8080/api/start_game',
+                                                  json={'player1': 'Alice', 'player2': 'Bob'}, params=None,
+                                                  timeout=self.client.timeout)
+        self.mock_request.return_value.raise_for_status.assert_called_once_with()
+
+    def test_read_calls_are_cached(self):
+        self.assertEqual(self.client.get_player_score('Alice'), {'wins': ['Alice', 2]})
+        self.assertEqual(self.client.get_player_score('Alice'), {'wins': ['Alice', 2]})
+        self.assertEqual(self.mock_request.call_count, 1)
+        self.client.get_player_score('Bob')
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_cache_expires(self):
+        with patch('war_game_client.time.monotonic', side_effect=[0.0, 61.0]):
+            self.client.get_player_wins()
+            self.client.get_player_wins()
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_cache_is_bounded(self):
+        client = ApiClient(cache_ttl=60, cache_size=2)
+        client.session.request = self.mock_request
+        for name in ('Alice', 'Bob', 'Carol'):
+            client.get_player_score(name)
+        self.assertEqual(len(client.cache), 2)
+        client.get_player_score('Alice')
+        self.assertEqual(self.mock_request.call_count, 4)
+
+    def test_expired_entries_are_dropped(self):
+        with patch('war_game_client.time.monotonic', side_effect=[0.0, 61.0]):
+            self.client.get_player_score('Alice')
+            self.client.get_player_score('Bob')
+        self.assertEqual([key[2] for key in self.client.cache], [repr({'player_name': 'Bob'})])
+
+    def test_writes_clear_the_cache(self):
+        self.client.get_player_wins()
+        self.client.reset_all_scores()
+        self.client.get_player_wins()
+        self.assertEqual(self.mock_request.call_count, 3)
+
+    def test_get_player_wins_page(self):
+        self.client.get_player_wins(limit=10, offset=20)
+        self.assertEqual(self.mock_request.call_args[1]['params'], {'limit': 10, 'offset': 20})
+
+    def test_stream_logs(self):
+        response = MagicMock()
+        response.iter_lines.return_value = [b'"Round 1 -"', b'', b'"Alice won 2 cards."']
+        self.client.session.get = MagicMock(return_value=response)
+        self.assertEqual(list(self.client.stream_logs()), ["Round 1 -", "Alice won 2 cards."])
+        self.assertTrue(self.client.session.get.call_args[1]['stream'])
+
+    def test_stream_game(self):
+        response = MagicMock()
+        response.iter_lines.return_value = ['event: round', 'data: {"round": 1}', '', 'event: result',
+                                            'data: {"winner": "Alice"}', '']
+        self.client.session.get = MagicMock(return_value=response)
+        self.assertEqual(list(self.client.stream_game('Alice', 'Bob')),
+                         [('round', {"round": 1}), ('result', {"winner": "Alice"})])
+        self.assertEqual(self.client.session.get.call_args[1]['params'], {'player1': 'Alice', 'player2': 'Bob'})
+
+    def test_request_errors_raise_client_error(self):
+        self.mock_request.side_effect = requests.ConnectionError()
+        with self.assertRaises(ClientError):
+            self.client.get_logs()
+
+
+class TestLocalClient(unittest.TestCase):
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = war_game.DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.patches = [patch('war_game_api.db_manager', self.db_manager), patch('war_game_api.leaderboard', None),
+                        patch('war_game_api.log_store', war_game.GameLogStore(self.db_manager))]
+        for patcher in self.patches:
+            patcher.start()
+        self.client = LocalClient()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_start_game(self):
+        random.seed(3)
+        result = self.client.start_game('Alice', 'Bob')
+        self.assertEqual(result['wins'], 1)
+        score = self.client.get_player_score(result['winner'])
+        self.assertEqual(score['wins'], (result['winner'], 1))
+        self.assertEqual(score['stats']['games'], 1)
+        self.assertEqual(score['stats']['win_rate'], 1.0)
+        self.assertEqual(self.client.get_logs()['logs'][:2], ["Alice has 26 cards.", "Bob has 26 cards."])
+        self.assertEqual(list(self.client.stream_logs()), self.client.get_logs()['logs'])
+        self.client.start_game('Carol', 'Dave')
+        self.assertEqual(self.client.get_logs(result['game_id'])['logs'][:2],
+                         ["Alice has 26 cards.", "Bob has 26 cards."])
+        self.assertEqual(list(self.client.stream_logs())[0], "Carol has 26 cards.")
+
+    def test_stream_game(self):
+        random.seed(3)
+        events = list(self.client.stream_game('Alice', 'Bob'))
+        self.assertEqual([name for name, data in events], ['round'] * (len(events) - 1) + ['result'])
+        result = events[-1][1]
+        self.assertEqual(result['rounds'], events[-2][1]['round'])
+        self.assertEqual(self.client.get_player_score(result['winner'])['wins'], (result['winner'], 1))
+        self.assertEqual(self.client.get_logs(result['game_id'])['logs'][:2],
+                         ["Alice has 26 cards.", "Bob has 26 cards."])
+
+    def test_stream_logs_without_a_game(self):
+        with self.assertRaises(ClientError):
+            self.client.stream_logs()
+
+    def test_scores(self):
+        self.db_manager.bulk_update_scores({'Alice': 2, 'Bob': 3})
+        self.assertEqual(self.client.get_player_wins(limit=1),
+                         {'player_wins': [{'name': 'Bob', 'wins': 3, 'rank': 1}]})
+        self.assertEqual(self.client.get_player_rank('Alice'), {'name': 'Alice', 'rank': 2, 'wins': 2})
+        self.assertEqual(self.client.reset_all_scores(),
+                         {'response': [{'name': 'Alice', 'wins': 2}, {'name': 'Bob', 'wins': 3}]})
+        self.assertEqual(self.client.get_player_wins(), {'player_wins': []})
+
+    def test_database_errors_raise_client_error(self):
+        with patch.object(self.db_manager, 'get_player_score', side_effect=sqlite3.OperationalError('locked')):
+            with self.assertRaises(ClientError):
+                self.client.get_player_score('Alice')
+
+
+class TestGetClient(unittest.TestCase):
+    def test_local_backend_does_not_import_requests(self):
+        source_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'source')
+        output = subprocess.run([sys.executable, '-c', 'import sys, war_game_client; war_game_client.get_client(); '
+                                                       'print("requests" in sys.modules)'],
+                                env=dict(os.environ, PYTHONPATH=source_directory, WAR_GAME_BACKEND='local'),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+    def test_backends(self):
+        self.assertIsInstance(get_client('local'), LocalClient)
+        self.assertIsInstance(get_client('http'), ApiClient)
+        with patch.dict(os.environ, {'WAR_GAME_BACKEND': 'local'}):
+            self.assertIsInstance(get_client(), LocalClient)
+        with self.assertRaises(ValueError):
+            get_client('carrier-pigeon')
+
+    def test_clients_implement_the_interface(self):
+        with self.assertRaises(TypeError):
+            GameClient()
+        self.assertEqual(ApiClient.__abstractmethods__, frozenset())
+        self.assertEqual(LocalClient.__abstractmethods__, frozenset())
+
+
+if __name__ == '__main__':
+    unittest.main()
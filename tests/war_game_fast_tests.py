@@ -0,0 +1,120 @@
+import random
+import unittest
+from unittest.mock import patch
+import war_game
+from source.war_game import CARDS, EVENT_CYCLE, EventRecorder, Game, Player
+from source.war_game_fast import CANONICAL_DECK, CYCLE_CHECK_AFTER, FastGame, deal_hands, \
+    pack_card, play_deal, play_hands, shuffled_deck, unpack_card
+
+# Deterministic War cycles forever on the deck shuffled with this seed.
+CYCLING_SEED = 951
+
+
+class TestPackedCards(unittest.TestCase):
+    def test_pack_unpack(self):
+        code = pack_card(14, 'Spades')
+        self.assertEqual(unpack_card(code), (14, 'Spades'))
+
+    def test_canonical_deck(self):
+        self.assertEqual(len(set(CANONICAL_DECK)), 52)
+        self.assertEqual(unpack_card(CANONICAL_DECK[0]), (2, 'Hearts'))
+
+    def test_shuffled_deck_is_seeded(self):
+        self.assertEqual(shuffled_deck(7), shuffled_deck(7))
+        self.assertEqual(sorted(shuffled_deck(7)), sorted(CANONICAL_DECK))
+
+    def test_same_deal_as_seeded_game(self):
+        self.assertEqual(Game([Player('Stefan'), Player('Damon')], seed=7).deal, shuffled_deck(7))
+
+
+class TestPlayHands(unittest.TestCase):
+    def test_deal_hands(self):
+        hands = deal_hands(CANONICAL_DECK)
+        self.assertEqual([len(hand) for hand in hands], [26, 26])
+        self.assertEqual(hands[0][0], CANONICAL_DECK[-1])
+        self.assertEqual(hands[1][0], CANONICAL_DECK[-2])
+
+    def test_higher_card_wins(self):
+        hands = [bytearray([pack_card(9, 'Hearts')]), bytearray([pack_card(3, 'Clubs')])]
+        self.assertEqual(play_hands(hands), (0, 1, 0))
+        self.assertEqual(len(hands[0]), 2)
+
+    def test_war(self):
+        hands = [bytearray([pack_card(2, 'Hearts'), pack_card(5, 'Hearts'), pack_card(7, 'Hearts')]),
+                 bytearray([pack_card(10, 'Clubs'), pack_card(6, 'Clubs'), pack_card(7, 'Clubs')])]
+        self.assertEqual(play_hands(hands), (1, 1, 1))
+        self.assertEqual(len(hands[1]), 6)
+
+    def test_empty_hand_during_war(self):
+        hands = [bytearray([pack_card(7, 'Hearts')]), bytearray([pack_card(3, 'Clubs'), pack_card(7, 'Clubs')])]
+        self.assertEqual(play_hands(hands), (1, 1, 1))
+
+
+class TestFastGame(unittest.TestCase):
+    def test_requires_two_players(self):
+        with self.assertRaises(ValueError):
+            FastGame(['Stefan'])
+
+    def test_cycle_is_detected(self):
+        winner, rounds, wars = FastGame(['Stefan', 'Damon'], seed=CYCLING_SEED).play_game()
+        self.assertEqual(winner, 'Damon')
+        # The cycle is 216 rounds long, so it is found within 512 checks
+        self.assertLess(rounds, CYCLE_CHECK_AFTER + 512)
+
+    def test_cycle_is_detected_like_game(self):
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=CYCLING_SEED)
+        winner = game.play_rounds()
+        self.assertIn((EVENT_CYCLE,), game.recorder.events)
+        rounds = sum(1 for event in game.recorder.events if event[0] == war_game.EVENT_ROUND)
+        self.assertEqual(FastGame(['Stefan', 'Damon'], seed=CYCLING_SEED).play_game()[:2], (winner.name, rounds))
+
+    def test_same_cycle_settings_as_game(self):
+        self.assertEqual(CYCLE_CHECK_AFTER, war_game.CYCLE_CHECK_AFTER)
+
+    def test_long_cycle_is_detected(self):
+        game = Game([Player('Stefan'), Player('Damon')])
+        cycle_length = 5000
+        for round_count in range(CYCLE_CHECK_AFTER, CYCLE_CHECK_AFTER + 4 * cycle_length):
+            # A different state for every round of the cycle
+            position = (round_count - CYCLE_CHECK_AFTER) % cycle_length
+            game.players[0].hand = [CARDS[position % 52], CARDS[position // 52 % 52], CARDS[position // 2704]]
+            game.players[1].hand = [CARDS[0]]
+            if game.must_stop(round_count):
+                break
+        else:
+            self.fail("The cycle was not detected")
+        # The saved state moves after 2, 4, 8... checks; the one saved after 8190 checks is the first to be seen again
+        self.assertEqual(round_count - CYCLE_CHECK_AFTER, 8190 + cycle_length)
+
+    def test_max_rounds_like_game(self):
+        for seed in range(20):
+            game = Game([Player('Stefan'), Player('Damon')], seed=seed, max_rounds=40)
+            winner = game.play_rounds()
+            self.assertEqual(FastGame(['Stefan', 'Damon'], seed=seed, max_rounds=40).play_game()[:2],
+                             (winner.name, game.rounds))
+
+    def test_resume(self):
+        deck = shuffled_deck(CYCLING_SEED)
+        hands = deal_hands(deck)
+        self.assertEqual(play_hands(hands, max_rounds=300), play_deal(deck, 300))
+        winner, rounds, wars = play_hands(hands, rounds_played=300)
+        self.assertEqual((winner, rounds), play_deal(deck)[:2])
+
+    def test_play_deal_is_cached(self):
+        deck = shuffled_deck(12345)
+        play_deal(deck)
+        hits = play_deal.cache_info().hits
+        self.assertEqual(play_deal(deck), play_deal(bytes(deck)))
+        self.assertEqual(play_deal.cache_info().hits, hits + 2)
+
+    @patch('source.war_game.DatabaseManager')
+    def test_same_winner_as_game(self, mock_db_manager):
+        for seed in range(20):
+            random.seed(seed)
+            game = Game([Player('Stefan'), Player('Damon')])
+            expected = game.play_game()[0]
+            self.assertEqual(FastGame(['Stefan', 'Damon'], seed=seed).play_game()[0], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import unittest
+import war_game_client
 from unittest.mock import patch
 from source.war_game_flask import app
 
@@ -11,41 +12,93 @@ class TestApp(unittest.TestCase):
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
 
-    @patch('source.war_game_flask.requests.post')
-    def test_start_game(self, mock_post):
-        mock_post.return_value.json.return_value = {'winner': 'player1'}
+    @patch('source.war_game_flask.game_client')
+    def test_start_game(self, mock_client):
+        mock_client.start_game.return_value = {'winner': 'player1', 'wins': 1, 'game_id': 'abc'}
         data = {
             "player1": "player1",
             "player2": "player2"
         }
         response = self.app.post('/start_game', data=data)
         self.assertEqual(response.status_code, 200)
+        mock_client.start_game.assert_called_once_with('player1', 'player2')
+        self.app.get('/get_logs')
+        mock_client.stream_logs.assert_called_once_with('abc')
 
-    @patch('source.war_game_flask.requests.get')
-    def test_get_player_wins(self, mock_get):
-        mock_get.return_value.json.return_value = {'player_wins': {'player1': 5, 'player2': 2}}
+    @patch('source.war_game_flask.game_client')
+    def test_stream_game(self, mock_client):
+        mock_client.stream_game.return_value = iter([('round', {'round': 1}), ('result', {'game_id': 'abc'})])
+        response = self.app.get('/stream_game?player1=player1&player2=player2')
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        self.assertEqual(response.get_data(as_text=True),
+                         'event: round\ndata: {"round":1}\n\nevent: result\ndata: {"game_id":"abc"}\n\n')
+        mock_client.stream_game.assert_called_once_with('player1', 'player2')
+        self.app.get('/get_logs')
+        mock_client.stream_logs.assert_called_once_with('abc')
+
+    @patch('source.war_game_flask.game_client')
+    def test_stream_game_error(self, mock_client):
+        mock_client.stream_game.side_effect = war_game_client.ClientError('API is down')
+        response = self.app.get('/stream_game?player1=player1&player2=player2')
+        self.assertEqual(response.get_data(as_text=True), 'event: failed\ndata: {"error":"API is down"}\n\n')
+
+    @patch('source.war_game_flask.game_client')
+    def test_start_game_error(self, mock_client):
+        mock_client.start_game.side_effect = war_game_client.ClientError()
+        response = self.app.post('/start_game', data={"player1": "player1", "player2": "player2"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"There was an error in starting the game.", response.data)
+
+    @patch('source.war_game_flask.game_client')
+    def test_get_player_score_error(self, mock_client):
+        mock_client.get_player_score.side_effect = war_game_client.ClientError()
+        response = self.app.post('/get_player_score', data={"player_name": "player1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"There was an error in getting the score of player1.", response.data)
+
+    @patch('source.war_game_flask.game_client')
+    def test_get_player_wins(self, mock_client):
+        mock_client.get_player_wins.return_value = {'player_wins': {'player1': 5, 'player2': 2}}
         response = self.app.get('/get_player_wins')
         self.assertEqual(response.status_code, 200)
 
-    @patch('source.war_game_flask.requests.get')
-    def test_reset_all_scores(self, mock_get):
-        mock_get.return_value.status_code = 200
+    @patch('source.war_game_flask.game_client')
+    def test_reset_all_scores(self, mock_client):
+        mock_client.reset_all_scores.return_value = {'response': []}
         response = self.app.get('/reset_all_scores')
         self.assertEqual(response.status_code, 200)
+        self.assertIn(b"The Game Board has been reset.", response.data)
 
-    @patch('source.war_game_flask.requests.post')
-    def test_get_player_score(self, mock_post):
-        mock_post.return_value.json.return_value = {'wins': ['player1', 5]}
+    @patch('source.war_game_flask.game_client')
+    def test_reset_all_scores_error(self, mock_client):
+        mock_client.reset_all_scores.side_effect = war_game_client.ClientError()
+        response = self.app.get('/reset_all_scores')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"There was an error in resetting the Game Board.", response.data)
+
+    @patch('source.war_game_flask.game_client')
+    def test_get_player_score(self, mock_client):
+        mock_client.get_player_score.return_value = {'wins': ['player1', 5]}
         data = {"player_name": "player1"}
         response = self.app.post('/get_player_score', data=data)
         self.assertEqual(response.status_code, 200)
 
-    @patch('source.war_game_flask.requests.get')
-    def test_get_logs(self, mock_get):
-        mock_get.return_value.status_code = 200
-        mock_get.return_value.json.return_value = {'logs': 'Some logs'}
+    @patch('source.war_game_flask.flags', [True])
+    @patch('source.war_game_flask.game_client')
+    def test_get_logs(self, mock_client):
+        mock_client.stream_logs.return_value = iter(['Some logs', 'More logs'])
+        response = self.app.get('/get_logs')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=War_Game_Logs.txt')
+        self.assertEqual(response.get_data(as_text=True), 'Some logs\nMore logs\n')
+
+    @patch('source.war_game_flask.flags', [True])
+    @patch('source.war_game_flask.game_client')
+    def test_get_logs_no_logs(self, mock_client):
+        mock_client.stream_logs.side_effect = war_game_client.ClientError()
         response = self.app.get('/get_logs')
         self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Disposition', response.headers)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+import unittest
+
+import war_game
+from source.war_game_history import DAY, head_to_head, rounds_distribution, win_rate_over_time
+from war_game import GameResult
+
+
+class TestGameHistory(unittest.TestCase):
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = war_game.DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.db_manager.record_games([
+            GameResult(("Alice", "Bob"), "Alice", 120, 8, 2, seed=1, duration=0.01, finished_at=DAY + 10),
+            GameResult(("Alice", "Bob"), "Bob", 40, 3, 1, seed=2, duration=0.01, finished_at=DAY + 20),
+            GameResult(("Alice", "Bob", "Carol"), "Carol", 700, 30, 4, duration=0.02, finished_at=3 * DAY + 5),
+            GameResult(("Bob", "Carol"), "Bob", 2500, 90, 2, duration=0.05, finished_at=4 * DAY),
+        ])
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_history_is_appended(self):
+        with self.db_manager.connection() as conn:
+            rows = conn.execute(
+                'SELECT Id, Seed, Players, Winner, Rounds, DurationMs FROM GameHistory ORDER BY Id').fetchall()
+        self.assertEqual(rows[0], (1, 1, '["Alice", "Bob"]', "Alice", 120, 10.0))
+        self.assertEqual(len(rows), 4)
+        self.db_manager.reset_all_scores()
+        self.db_manager.record_game(GameResult(("Alice", "Bob"), "Bob", 10, 0, 0))
+        with self.db_manager.connection() as conn:
+            self.assertEqual(conn.execute('SELECT MAX(Id) FROM GameHistory').fetchone(), (5,))
+
+    def test_concurrent_writers_get_distinct_ids(self):
+        other = war_game.DatabaseManager(self.db_manager.db_path)
+        self.addCleanup(other.close)
+        writers = [threading.Thread(target=manager.record_games,
+                                    args=([GameResult(("Alice", "Bob"), "Alice", 10, 0, 0)] * 20,))
+                   for manager in (self.db_manager, other) * 2]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        with self.db_manager.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*), COUNT(DISTINCT Id) FROM GameHistory').fetchone(),
+                             (84, 84))
+            self.assertEqual(conn.execute('SELECT COUNT(DISTINCT GameId) FROM GamePlayers').fetchone(), (84,))
+
+    def test_win_rate_over_time(self):
+        self.assertEqual(win_rate_over_time(self.db_manager, "Alice"), [
+            {"start": DAY, "games": 2, "wins": 1, "win_rate": 0.5},
+            {"start": 3 * DAY, "games": 1, "wins": 0, "win_rate": 0.0}])
+        self.assertEqual(win_rate_over_time(self.db_manager, "Bob", since=2 * DAY), [
+            {"start": 3 * DAY, "games": 1, "wins": 0, "win_rate": 0.0},
+            {"start": 4 * DAY, "games": 1, "wins": 1, "win_rate": 1.0}])
+        self.assertEqual(win_rate_over_time(self.db_manager, "Dave"), [])
+
+    def test_rounds_distribution(self):
+        distribution = rounds_distribution(self.db_manager, edges=(100, 1000))
+        self.assertEqual(distribution["games"], 4)
+        self.assertEqual(distribution["histogram"], [{"min": 0, "max": 100, "games": 1},
+                                                     {"min": 100, "max": 1000, "games": 2},
+                                                     {"min": 1000, "max": None, "games": 1}])
+        self.assertEqual(distribution["median_rounds"], 410.0)
+        self.assertEqual(distribution["mean_wars"], 32.75)
+        self.assertEqual(rounds_distribution(self.db_manager, until=DAY)["games"], 0)
+
+    def test_head_to_head(self):
+        self.assertEqual(head_to_head(self.db_manager, "Alice", "Bob"),
+                         {"player": "Alice", "opponent": "Bob", "games": 3, "wins": 1, "opponent_wins": 1})
+        self.assertEqual(head_to_head(self.db_manager, "Carol", "Bob", until=4 * DAY)["games"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
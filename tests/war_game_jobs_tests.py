@@ -0,0 +1,130 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import war_game
+import war_game_jobs
+from source import war_game_api
+from source.war_game_api import app
+from source.war_game_jobs import DONE, FAILED, QUEUED, JobQueue, QueueFullError
+
+
+class TestJobQueue(unittest.TestCase):
+    def test_jobs_are_run_by_workers(self):
+        job_queue = JobQueue(lambda details: {"double": details["n"] * 2}, workers=2)
+        self.addCleanup(job_queue.close)
+        job_ids = job_queue.submit([{"n": 1}, {"n": 2}, {"n": 3}])
+        statuses = job_queue.get(job_ids, wait=5)
+        self.assertEqual([status["state"] for status in statuses], [DONE] * 3)
+        self.assertEqual([status["result"] for status in statuses], [{"double": 2}, {"double": 4}, {"double": 6}])
+        self.assertEqual(statuses[0]["job_id"], job_ids[0])
+
+    def test_failed_job(self):
+        job_queue = JobQueue(lambda details: details["missing"], workers=1)
+        self.addCleanup(job_queue.close)
+        job_ids = job_queue.submit([{}])
+        with patch.object(war_game.logger, 'exception'):
+            status = job_queue.get(job_ids, wait=5)[0]
+        self.assertEqual(status["state"], FAILED)
+        self.assertEqual(status["error"], "'missing'")
+
+    def test_poll_without_waiting(self):
+        release = threading.Event()
+        job_queue = JobQueue(lambda details: release.wait(5), workers=1)
+        self.addCleanup(job_queue.close)
+        job_ids = job_queue.submit([{}, {}])
+        self.assertEqual(job_queue.get(job_ids[1:])[0]["state"], QUEUED)
+        release.set()
+        self.assertEqual(job_queue.get(job_ids, wait=5)[1], {"job_id": job_ids[1], "state": DONE, "result": True})
+
+    def test_full_queue_refuses_the_whole_batch(self):
+        release = threading.Event()
+        job_queue = JobQueue(lambda details: release.wait(5), workers=1, max_queued=2)
+        self.addCleanup(job_queue.close)
+        job_queue.submit([{}])
+        with self.assertRaises(QueueFullError):
+            job_queue.submit([{}, {}, {}])
+        self.assertEqual(len(job_queue.jobs), 1)
+        release.set()
+
+    def test_close_runs_queued_jobs_and_stops_workers(self):
+        job_queue = JobQueue(lambda details: details["n"], workers=2)
+        job_ids = job_queue.submit([{"n": n} for n in range(5)])
+        threads = list(job_queue._threads)
+        job_queue.close()
+        self.assertEqual([status["result"] for status in job_queue.get(job_ids)], list(range(5)))
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+
+    def test_finished_jobs_are_forgotten(self):
+        job_queue = JobQueue(lambda details: None, workers=1, max_jobs=2)
+        self.addCleanup(job_queue.close)
+        first = job_queue.submit([{}])
+        job_queue.get(first, wait=5)
+        job_queue.get(job_queue.submit([{}, {}]), wait=5)
+        with self.assertRaises(KeyError):
+            job_queue.get(first)
+
+
+class TestGamesApi(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = war_game.DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.patches = [patch('source.war_game_api.db_manager', self.db_manager),
+                        patch('source.war_game_api.leaderboard', None),
+                        patch('source.war_game_api.log_store', war_game.GameLogStore(self.db_manager)),
+                        patch('source.war_game_api.job_queue', None)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        # Every queued game is played against the test database before it is unpatched
+        if war_game_api.job_queue is not None:
+            war_game_api.job_queue.close()
+        for patcher in self.patches:
+            patcher.stop()
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_submit_batch_and_long_poll(self):
+        response = self.client.post('/api/games', json={"games": [{"player1": "Alice", "player2": "Bob", "seed": 1},
+                                                                  {"players": ["Carol", "Dave", "Eve"], "seed": 2}]})
+        self.assertEqual(response.status_code, 202)
+        job_ids = response.json["job_ids"]
+        self.assertEqual(len(job_ids), 2)
+        response = self.client.get('/api/games', query_string=[('job_id', job_ids[0]), ('job_id', job_ids[1]),
+                                                               ('wait', '10')])
+        jobs = response.json["jobs"]
+        self.assertEqual([job["state"] for job in jobs], [DONE, DONE])
+        self.assertIn(jobs[0]["result"]["winner"], ["Alice", "Bob"])
+        self.assertIn(jobs[1]["result"]["winner"], ["Carol", "Dave", "Eve"])
+        winner = jobs[0]["result"]["winner"]
+        self.assertEqual(self.db_manager.get_player_score(winner), (winner, 1))
+        logs = self.client.get(f'/api/get_logs?game_id={jobs[1]["result"]["game_id"]}').json["logs"]
+        self.assertEqual(logs[0], "Carol has 18 cards.")
+
+    def test_submit_one_game(self):
+        response = self.client.post('/api/games', json={"player1": "Alice", "player2": "Bob"})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.json["job_ids"]), 1)
+        job = self.client.get('/api/games', query_string={'job_id': response.json["job_ids"][0], 'wait': 10}).json
+        self.assertEqual(job["jobs"][0]["state"], DONE)
+        self.assertEqual(self.db_manager.get_all_scores(), [{"name": job["jobs"][0]["result"]["winner"], "wins": 1}])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.post('/api/games', json={"games": []}).status_code, 400)
+        self.assertEqual(self.client.post('/api/games', json={"games": [{"player1": "Alice"}]}).status_code, 400)
+        self.assertEqual(self.client.post('/api/games', json={"players": ["Alice"]}).status_code, 400)
+        self.assertEqual(self.client.get('/api/games?job_id=unknown').status_code, 404)
+
+    def test_full_queue(self):
+        with patch('source.war_game_api.submit_games', side_effect=war_game_jobs.QueueFullError("full")):
+            self.assertEqual(self.client.post('/api/games', json={"player1": "Alice", "player2": "Bob"}).status_code,
+                             503)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from source.war_game_metrics import Counter, Gauge, Histogram, Registry
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = Counter('requests_total', "Requests.", ('endpoint',), registry=self.registry)
+        counter.inc('/a')
+        counter.inc('/a', amount=2)
+        counter.inc('/b "quoted"')
+        self.assertEqual(self.registry.render(), '# HELP requests_total Requests.\n'
+                                                 '# TYPE requests_total counter\n'
+                                                 'requests_total{endpoint="/a"} 3\n'
+                                                 'requests_total{endpoint="/b \\"quoted\\""} 1\n')
+
+    def test_gauge_tracks_calls_in_progress(self):
+        gauge = Gauge('in_flight', "In flight.", registry=self.registry)
+        with gauge.track():
+            self.assertIn('in_flight 1', self.registry.render())
+        self.assertIn('in_flight 0', self.registry.render())
+
+    def test_histogram(self):
+        histogram = Histogram('rounds', "Rounds.", buckets=(10, 100), registry=self.registry)
+        for value in (5, 10, 50, 500):
+            histogram.observe(value)
+        lines = self.registry.render().splitlines()
+        self.assertEqual(lines[2:], ['rounds_bucket{le="10.0"} 2', 'rounds_bucket{le="100.0"} 3',
+                                     'rounds_bucket{le="+Inf"} 4', 'rounds_sum 565.0', 'rounds_count 4'])
+
+    def test_histogram_time(self):
+        histogram = Histogram('seconds', "Seconds.", ('query',), registry=self.registry)
+        with histogram.time('select'):
+            pass
+        self.assertIn('seconds_count{query="select"} 1', self.registry.render())
+
+    def test_names_are_unique(self):
+        Gauge('in_flight', "In flight.", registry=self.registry)
+        with self.assertRaises(ValueError):
+            Counter('in_flight', "In flight.", registry=self.registry)
+
+
+if __name__ == '__main__':
+    unittest.main()
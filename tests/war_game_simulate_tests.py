@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from source.war_game import DatabaseManager
+from source.war_game_history import rounds_distribution
+from source.war_game_simulate import play_seed_range, play_seed_range_results, run_simulation, shard_seeds
+
+
+class TestShardSeeds(unittest.TestCase):
+    def test_shards_cover_range(self):
+        shards = shard_seeds(10, 11, 4)
+        self.assertEqual(shards, [(10, 13), (13, 16), (16, 19), (19, 21)])
+
+    def test_more_shards_than_games(self):
+        self.assertEqual(shard_seeds(0, 2, 8), [(0, 1), (1, 2)])
+
+
+class TestRunSimulation(unittest.TestCase):
+    def test_tallies_do_not_depend_on_workers(self):
+        expected = play_seed_range(['Stefan', 'Damon'], 0, 40)
+        self.assertEqual(sum(expected.values()), 40)
+        self.assertEqual(run_simulation(['Stefan', 'Damon'], 40, workers=1), expected)
+        self.assertEqual(run_simulation(['Stefan', 'Damon'], 40, workers=2), expected)
+
+    def test_stopped_games_are_won(self):
+        tallies = run_simulation(['Stefan', 'Damon'], 10, workers=1, max_rounds=5)
+        self.assertEqual(sum(tallies.values()), 10)
+        self.assertNotIn(None, tallies)
+
+    def test_records_games_once(self):
+        db_manager = MagicMock()
+        tallies = run_simulation(['Stefan', 'Damon'], 20, workers=1, max_rounds=300, db_manager=db_manager)
+        results = db_manager.record_games.call_args[0][0]
+        db_manager.record_games.assert_called_once()
+        self.assertEqual([(result.seed, result.winner) for result in results],
+                         [(result.seed, result.winner)
+                          for result in play_seed_range_results(['Stefan', 'Damon'], 0, 20, 300)])
+        self.assertEqual(play_seed_range(['Stefan', 'Damon'], 0, 20, 300), tallies)
+
+    def test_writes_to_database(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            tallies = run_simulation(['Stefan', 'Damon'], 20, workers=1, db_manager=db_manager)
+            scores = {row['name']: row['wins'] for row in db_manager.get_all_scores()}
+            self.assertEqual(scores, dict(tallies))
+            self.assertEqual(db_manager.get_player_stats('Stefan')['games'], 20)
+            self.assertEqual(rounds_distribution(db_manager)["games"], 20)
+            db_manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,20 @@
+import random
+import sqlite3
+import threading
+import time
 import unittest
-from unittest.mock import patch
+from collections import Counter
+from unittest.mock import MagicMock, patch
 import os
-from source.war_game import Card, Deck, Player, DatabaseManager, Game
+import subprocess
+import sys
+from source.war_game import Card, Deck, Player, DatabaseManager, ScoreBuffer, Leaderboard, GameLogStore, Game, GameReplay, EventRecorder, NullRecorder, render_event, \
+    EVENT_PLAY, EVENT_WINNER, EVENT_ROUND_LIMIT, EVENT_ELIMINATED, EVENT_WAR, EVENT_WON_CARDS, highest_cards, \
+    CARDS, EVENT_ROUND, GameResult, aggregate_results
+from source.war_game_fast import FastGame
+import pickle
 import tempfile
+from source import war_game_metrics
 
 
 class TestDatabaseManager(unittest.TestCase):
@@ -13,12 +25,28 @@ class TestDatabaseManager(unittest.TestCase):
             db_manager = DatabaseManager(test_db_path)
             self.assertTrue(os.path.exists(test_data_directory))
 
+    def test_schema_is_checked_once_per_path(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            test_db_path = os.path.join(test_data_directory, "player_wins.db")
+            with patch.object(DatabaseManager, 'create_db') as mock_create_db:
+                DatabaseManager(test_db_path)
+                DatabaseManager(test_db_path)
+                DatabaseManager(os.path.join(test_data_directory, "other.db"))
+            self.assertEqual(mock_create_db.call_count, 2)
+
+    def test_import_does_not_configure_logging(self):
+        source_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'source')
+        output = subprocess.run([sys.executable, '-c', 'import logging, war_game; print(logging.getLogger().handlers)'],
+                                env=dict(os.environ, PYTHONPATH=source_directory), capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
     @patch('sqlite3.connect')
     def test_create_db(self, mock_connect):
         with tempfile.TemporaryDirectory() as test_data_directory:
             test_db_path = os.path.join(test_data_directory, "player_wins.db")
             db_manager = DatabaseManager(test_db_path)
-            mock_connect.assert_called_with(test_db_path)
+            mock_connect.assert_called_with(test_db_path, check_same_thread=False)
 
     def test_get_player_score(self):
         with tempfile.TemporaryDirectory() as test_data_directory:
@@ -39,6 +67,39 @@ class TestDatabaseManager(unittest.TestCase):
             player_score = db_manager.get_player_score("Alice")
             self.assertEqual(player_score, ("Alice", 2))
 
+    def test_queries_are_timed(self):
+        def timed_calls():
+            state = war_game_metrics.DB_QUERY_SECONDS._values.get(('update_score',))
+            return sum(state[:-1]) if state else 0
+
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            before = timed_calls()
+            db_manager.update_score("Alice")
+            self.assertEqual(timed_calls(), before + 1)
+            self.assertEqual(DatabaseManager.update_score.__name__, 'update_score')
+            db_manager.close()
+
+    def test_record_games(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            db_manager.record_games([GameResult(("Alice", "Bob"), "Alice", 300, 20, 2),
+                                     GameResult(("Alice", "Bob", "Carol"), "Bob", 100, 10, 3)],
+                                    extra_wins={"Carol": 5})
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 1))
+            self.assertEqual(db_manager.get_player_score("Carol"), ("Carol", 5))
+            self.assertEqual(db_manager.get_player_stats("Alice"), {
+                "games": 2, "wins": 1, "losses": 1, "win_rate": 0.5, "average_rounds": 200.0, "wars": 30,
+                "longest_war": 3, "head_to_head": [{"opponent": "Bob", "games": 2, "wins": 1},
+                                                   {"opponent": "Carol", "games": 1, "wins": 0}]})
+            db_manager.record_game(GameResult(("Carol", "Bob"), "Carol", 50, 1, 1))
+            self.assertEqual(db_manager.get_player_stats("Carol")["wins"], 1)
+            self.assertEqual(db_manager.get_player_score("Carol"), ("Carol", 6))
+            self.assertIsNone(db_manager.get_player_stats("Dave"))
+            db_manager.reset_all_scores()
+            self.assertIsNone(db_manager.get_player_stats("Alice"))
+            db_manager.close()
+
     def test_get_all_scores(self):
         with tempfile.TemporaryDirectory() as test_data_directory:
             test_db_path = os.path.join(test_data_directory, "player_wins.db")
@@ -49,6 +110,71 @@ class TestDatabaseManager(unittest.TestCase):
             all_scores = db_manager.get_all_scores()
             self.assertEqual(all_scores, [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}])
 
+    def test_bulk_update_scores(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            test_db_path = os.path.join(test_data_directory, "player_wins.db")
+            db_manager = DatabaseManager(test_db_path)
+            db_manager.update_score("Alice")
+            db_manager.bulk_update_scores({"Alice": 3, "Bob": 2})
+            all_scores = db_manager.get_all_scores()
+            self.assertEqual(all_scores, [{"name": "Alice", "wins": 4}, {"name": "Bob", "wins": 2}])
+
+    def test_migrates_old_schema(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            test_db_path = os.path.join(test_data_directory, "player_wins.db")
+            with sqlite3.connect(test_db_path) as conn:
+                conn.execute('CREATE TABLE PlayerWins (Name text, Wins int);')
+                conn.executemany('INSERT INTO PlayerWins VALUES (?,?)', [("Alice", 2), ("Bob", 1), ("Alice", 3)])
+            conn.close()
+            db_manager = DatabaseManager(test_db_path)
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 5))
+            db_manager.update_score("Bob")
+            self.assertEqual(sorted(db_manager.get_all_scores(), key=lambda row: row["name"]),
+                             [{"name": "Alice", "wins": 5}, {"name": "Bob", "wins": 2}])
+            with db_manager.connection() as conn:
+                plan = conn.execute('EXPLAIN QUERY PLAN SELECT * FROM PlayerWins WHERE Name = ?', ("Alice",)).fetchall()
+            self.assertIn('USING INDEX', plan[0][3])
+
+    def test_update_score_never_duplicates_players(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            test_db_path = os.path.join(test_data_directory, "player_wins.db")
+            db_manager = DatabaseManager(test_db_path)
+            threads = [threading.Thread(target=db_manager.update_score, args=("Alice",)) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(db_manager.get_all_scores(), [{"name": "Alice", "wins": 8}])
+
+    def test_connection_is_reused_and_uses_wal(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            test_db_path = os.path.join(test_data_directory, "player_wins.db")
+            db_manager = DatabaseManager(test_db_path)
+            with db_manager.connection() as conn:
+                self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+                # A nested block gets a connection of its own rather than waiting for the first one
+                with db_manager.connection() as nested_conn:
+                    self.assertIsNot(nested_conn, conn)
+            with db_manager.connection() as reused_conn:
+                self.assertIn(reused_conn, (conn, nested_conn))
+            db_manager.close()
+            with db_manager.connection() as new_conn:
+                self.assertNotIn(new_conn, (conn, nested_conn))
+            db_manager.close()
+
+    def test_connections_are_shared_between_threads(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"), pool_size=2)
+            with patch.object(db_manager, 'open_connection', wraps=db_manager.open_connection) as mock_open:
+                for _ in range(20):
+                    thread = threading.Thread(target=db_manager.update_score, args=("Alice",))
+                    thread.start()
+                    thread.join()
+            # Every thread reuses the connection the schema check opened
+            self.assertEqual(mock_open.call_count, 0)
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 20))
+            db_manager.close()
+
     def test_reset_all_scores(self):
         with tempfile.TemporaryDirectory() as test_data_directory:
             test_db_path = os.path.join(test_data_directory, "player_wins.db")
@@ -62,11 +188,252 @@ class TestDatabaseManager(unittest.TestCase):
             self.assertEqual(all_scores, [])
 
 
+class TestLeaderboard(unittest.TestCase):
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.db_manager.bulk_update_scores({"Alice": 2, "Bob": 5, "Carol": 2, "Dave": 1})
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_get_top_scores(self):
+        self.assertEqual(self.db_manager.get_top_scores(3), [{"name": "Bob", "wins": 5, "rank": 1},
+                                                             {"name": "Alice", "wins": 2, "rank": 2},
+                                                             {"name": "Carol", "wins": 2, "rank": 2}])
+        self.assertEqual(self.db_manager.get_top_scores(2, offset=2), [{"name": "Carol", "wins": 2, "rank": 2},
+                                                                       {"name": "Dave", "wins": 1, "rank": 4}])
+
+    def test_top_scores_use_index(self):
+        with self.db_manager.connection() as conn:
+            plan = conn.execute(
+                'EXPLAIN QUERY PLAN SELECT Name, Wins FROM PlayerWins ORDER BY Wins DESC, Name LIMIT 10').fetchall()
+        self.assertIn('PlayerWins_Wins', plan[0][3])
+
+    def test_get_player_rank(self):
+        self.assertEqual(self.db_manager.get_player_rank("Carol"), (2, 2))
+        self.assertEqual(self.db_manager.get_player_rank("Dave"), (4, 1))
+        self.assertIsNone(self.db_manager.get_player_rank("Eve"))
+
+    def test_cache_invalidated_on_update(self):
+        leaderboard = Leaderboard(self.db_manager)
+        with patch.object(self.db_manager, 'get_top_scores', wraps=self.db_manager.get_top_scores) as mock_top:
+            first = leaderboard.get_scores(limit=2)
+            self.assertEqual(leaderboard.get_scores(limit=2), first)
+            self.assertEqual(mock_top.call_count, 1)
+            self.db_manager.update_score("Dave")
+            self.db_manager.update_score("Dave")
+            self.assertEqual(leaderboard.get_player_rank("Dave"), (2, 3))
+            self.assertEqual(leaderboard.get_scores(limit=2)[1], {"name": "Dave", "wins": 3, "rank": 2})
+            self.assertEqual(mock_top.call_count, 2)
+
+    def test_cache_expires(self):
+        leaderboard = Leaderboard(self.db_manager, ttl=60)
+        other = DatabaseManager(self.db_manager.db_path)
+        self.addCleanup(other.close)
+        self.assertEqual(leaderboard.get_player_rank("Dave"), (4, 1))
+        other.bulk_update_scores({"Dave": 5})
+        self.assertEqual(leaderboard.get_player_rank("Dave"), (4, 1))
+        leaderboard.cache_expires = 0.0
+        self.assertEqual(leaderboard.get_player_rank("Dave"), (1, 6))
+
+    def test_all_scores(self):
+        leaderboard = Leaderboard(self.db_manager)
+        self.assertEqual(leaderboard.get_scores(), self.db_manager.get_all_scores())
+
+    def test_score_buffer(self):
+        score_buffer = ScoreBuffer(self.db_manager, flush_interval=None)
+        leaderboard = Leaderboard(score_buffer)
+        self.assertEqual(leaderboard.get_player_rank("Dave"), (4, 1))
+        score_buffer.bulk_update_scores({"Dave": 5})
+        self.assertEqual(leaderboard.get_player_rank("Dave"), (1, 6))
+        score_buffer.close()
+
+
+class TestGameLogStore(unittest.TestCase):
+    def setUp(self):
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.store = GameLogStore(self.db_manager, max_entries=2, max_stored=3)
+
+    def tearDown(self):
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    @staticmethod
+    def replay(seed):
+        game = Game([Player("Alice"), Player("Bob")], seed=seed)
+        return GameReplay.from_game(game, seed + 1)
+
+    def test_get_by_id_and_latest(self):
+        self.assertIsNone(self.store.get())
+        first = self.store.add(self.replay(1))
+        second = self.store.add(self.replay(2))
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.store.get(first).seed, 1)
+        self.assertEqual(self.store.get().seed, 2)
+        self.assertIsNone(self.store.get("unknown"))
+
+    def test_least_recently_used_spill_to_database(self):
+        game_ids = [self.store.add(self.replay(seed)) for seed in range(6)]
+        self.assertEqual(list(self.store.entries), game_ids[4:])
+        with self.db_manager.connection() as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM GameLogs').fetchone()[0], 3)
+        replay = self.store.get(game_ids[2])
+        self.assertEqual((replay.player_names, replay.deal, replay.total_wins, replay.seed),
+                         (["Alice", "Bob"], self.replay(2).deal, 3, 2))
+        self.assertEqual(list(replay), list(self.replay(2)))
+        self.assertIsNone(self.store.get(game_ids[0]))
+
+    def test_get_marks_entry_recently_used(self):
+        first = self.store.add(self.replay(1))
+        self.store.add(self.replay(2))
+        self.store.get(first)
+        self.store.add(self.replay(3))
+        self.assertIn(first, self.store.entries)
+
+    def test_latest_survives_restart(self):
+        game_ids = [self.store.add(self.replay(seed)) for seed in range(3)]
+        store = GameLogStore(self.db_manager)
+        self.assertEqual(store.get().seed, 0)
+        self.assertIsNotNone(store.get(game_ids[0]))
+
+
+class TestScoreBuffer(unittest.TestCase):
+    def test_reads_merge_buffered_wins(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            db_manager.update_score("Alice")
+            score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+            score_buffer.update_score("Alice")
+            score_buffer.update_score("Bob")
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 1))
+            self.assertEqual(score_buffer.get_player_score("Alice"), ("Alice", 2))
+            self.assertEqual(score_buffer.get_player_score("Bob"), ("Bob", 1))
+            self.assertIsNone(score_buffer.get_player_score("Carol"))
+            self.assertEqual(score_buffer.get_all_scores(), [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}])
+            score_buffer.close()
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 2))
+
+    def test_flush(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+            score_buffer.bulk_update_scores({"Alice": 2, "Bob": 1})
+            score_buffer.flush()
+            self.assertEqual(score_buffer.pending, {})
+            self.assertEqual(db_manager.get_all_scores(), [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}])
+            self.assertEqual(score_buffer.get_player_score("Alice"), ("Alice", 2))
+
+    def test_record_game(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            db_manager.record_game(GameResult(("Alice", "Bob"), "Alice", 300, 20, 2))
+            score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+            score_buffer.record_game(GameResult(("Alice", "Bob"), "Bob", 100, 4, 1))
+            score_buffer.update_score("Alice")
+            stats = score_buffer.get_player_stats("Alice")
+            self.assertEqual((stats["games"], stats["wins"], stats["wars"], stats["longest_war"]), (2, 1, 24, 2))
+            self.assertEqual(stats["head_to_head"], [{"opponent": "Bob", "games": 2, "wins": 1}])
+            self.assertEqual(score_buffer.get_player_stats("Bob")["wins"], 1)
+            self.assertIsNone(score_buffer.get_player_stats("Carol"))
+            score_buffer.flush()
+            self.assertEqual(db_manager.get_player_stats("Alice"), stats)
+            self.assertEqual(db_manager.get_player_score("Alice"), ("Alice", 2))
+            self.assertEqual(db_manager.get_player_score("Bob"), ("Bob", 1))
+            score_buffer.close()
+
+    def test_flushes_when_full(self):
+        db_manager = MagicMock()
+        score_buffer = ScoreBuffer(db_manager, flush_interval=None, max_pending=3)
+        score_buffer.update_score("Alice")
+        score_buffer.update_score("Bob")
+        db_manager.bulk_update_scores.assert_not_called()
+        score_buffer.update_score("Alice")
+        db_manager.bulk_update_scores.assert_called_once_with({"Alice": 2, "Bob": 1})
+        self.assertEqual(score_buffer.pending_count, 0)
+
+    def test_flushes_periodically(self):
+        db_manager = MagicMock()
+        score_buffer = ScoreBuffer(db_manager, flush_interval=0.01)
+        score_buffer.update_score("Alice")
+        for _ in range(100):
+            if db_manager.bulk_update_scores.called:
+                break
+            time.sleep(0.01)
+        score_buffer.close()
+        db_manager.bulk_update_scores.assert_called_once_with({"Alice": 1})
+
+    def test_failed_flush_keeps_wins(self):
+        db_manager = MagicMock()
+        db_manager.bulk_update_scores.side_effect = sqlite3.OperationalError("database is locked")
+        score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+        score_buffer.update_score("Alice")
+        with self.assertRaises(sqlite3.OperationalError):
+            score_buffer.flush()
+        self.assertEqual(score_buffer.pending, {"Alice": 1})
+        db_manager.bulk_update_scores.side_effect = None
+        score_buffer.close()
+        db_manager.bulk_update_scores.assert_called_with({"Alice": 1})
+
+    def test_bad_result_does_not_block_the_others(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+            score_buffer.record_game(GameResult(("Alice", "Bob"), "Alice", 10, 0, 0))
+            # Too large for the Seed column, so it can never be written
+            score_buffer.record_game(GameResult(("Alice", "Bob"), "Bob", 10, 0, 0, seed=2 ** 64))
+            score_buffer.update_score("Carol")
+            with self.assertLogs(level='ERROR'):
+                score_buffer.flush()
+            self.assertEqual((score_buffer.pending, score_buffer.pending_results), (Counter(), []))
+            self.assertEqual(db_manager.get_all_scores(), [{"name": "Alice", "wins": 1}, {"name": "Carol", "wins": 1}])
+            score_buffer.update_score("Bob")
+            score_buffer.close()
+            self.assertEqual(db_manager.get_player_score("Bob"), ("Bob", 1))
+            db_manager.close()
+
+    def test_locked_database_keeps_games(self):
+        db_manager = MagicMock()
+        db_manager.record_games.side_effect = sqlite3.OperationalError("database is locked")
+        score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+        result = GameResult(("Alice", "Bob"), "Alice", 10, 0, 0)
+        score_buffer.record_game(result)
+        with self.assertRaises(sqlite3.OperationalError):
+            score_buffer.flush()
+        self.assertEqual((score_buffer.pending, score_buffer.pending_results), ({"Alice": 1}, [result]))
+        db_manager.record_games.side_effect = None
+        score_buffer.close()
+        db_manager.record_games.assert_called_with([result], Counter())
+
+    def test_reset_all_scores(self):
+        with tempfile.TemporaryDirectory() as test_data_directory:
+            db_manager = DatabaseManager(os.path.join(test_data_directory, "player_wins.db"))
+            db_manager.update_score("Alice")
+            score_buffer = ScoreBuffer(db_manager, flush_interval=None)
+            score_buffer.update_score("Alice")
+            score_buffer.update_score("Bob")
+            self.assertEqual(score_buffer.reset_all_scores(), [{"name": "Alice", "wins": 2}, {"name": "Bob", "wins": 1}])
+            self.assertEqual(score_buffer.get_all_scores(), [])
+
+
 class TestCard(unittest.TestCase):
     def test_card_str(self):
         card = Card(2, 'Hearts')
         self.assertEqual(str(card), '2 of Hearts')
 
+    def test_cards_are_interned(self):
+        self.assertIs(Card(2, 'Hearts'), Card(2, 'Hearts'))
+        self.assertIs(Card(14, 'Spades'), CARDS[51])
+        self.assertEqual(len(set(CARDS)), 52)
+        self.assertIs(pickle.loads(pickle.dumps(Card(9, 'Clubs'))), Card(9, 'Clubs'))
+
+    def test_cards_are_immutable(self):
+        with self.assertRaises(AttributeError):
+            Card(2, 'Hearts').rank = 3
+        self.assertFalse(hasattr(Card(2, 'Hearts'), '__dict__'))
+
 class TestDeck(unittest.TestCase):
     def test_deck_initialization(self):
         deck = Deck()
@@ -84,6 +451,22 @@ class TestDeck(unittest.TestCase):
         self.assertIsInstance(card, Card)
         self.assertEqual(len(deck.cards), 51)
 
+    def test_deck_shares_cards(self):
+        deck = Deck(random.Random(3))
+        self.assertEqual(sorted(map(id, deck.cards)), sorted(map(id, CARDS)))
+        self.assertIs(Deck(deal=deck.pack()).cards[0], deck.cards[0])
+
+    def test_deck_rng(self):
+        first = Deck(random.Random(7)).pack()
+        self.assertEqual(Deck(random.Random(7)).pack(), first)
+        self.assertNotEqual(Deck(random.Random(8)).pack(), first)
+        self.assertEqual(sorted(first), sorted(Deck().pack()))
+
+    def test_deck_from_deal(self):
+        deck = Deck(random.Random(7))
+        copy = Deck(deal=deck.pack())
+        self.assertEqual([str(card) for card in copy.cards], [str(card) for card in deck.cards])
+
 class TestPlayer(unittest.TestCase):
     def test_player_initialization(self):
         player = Player('Stefan')
@@ -91,14 +474,13 @@ class TestPlayer(unittest.TestCase):
         self.assertEqual(player.hand, [])
         self.assertEqual(player.wins, 0)
 
-    @patch('source.war_game.logs')
-    def test_player_play_card(self, mock_logs):
+    def test_player_play_card(self):
         player = Player('Stefan')
         card = Card(2, 'Hearts')
         player.hand.append(card)
         result = player.play_card()
         self.assertEqual(result, [card, 'Stefan'])
-        mock_logs.append.assert_called_with('Stefan has 1 cards')
+        self.assertEqual(player.hand, [])
 
     def test_player_add_cards(self):
         player = Player('Stefan')
@@ -106,11 +488,175 @@ class TestPlayer(unittest.TestCase):
         player.add_cards(cards)
         self.assertEqual(player.hand, cards)
 
+class TestEventRecorder(unittest.TestCase):
+    def test_render_play(self):
+        self.assertEqual(render_event((EVENT_PLAY, 'Stefan', 7, 25)),
+                         ['Stefan has 26 cards', 'Stefan played 7. Total cards left = 25\n'])
+
+    def test_render_unknown_event(self):
+        with self.assertRaises(ValueError):
+            render_event((99,))
+
+    def test_lines(self):
+        recorder = EventRecorder()
+        recorder.record(EVENT_PLAY, 'Stefan', 7, 25)
+        recorder.record(EVENT_WINNER, 'Stefan', 1, 3)
+        self.assertEqual(recorder.events, [(EVENT_PLAY, 'Stefan', 7, 25), (EVENT_WINNER, 'Stefan', 1, 3)])
+        self.assertEqual(list(recorder), ['Stefan has 26 cards', 'Stefan played 7. Total cards left = 25\n',
+                                          '\nWinner: Stefan', 'Wins: 1',
+                                          '\n\nGame Over!\nStefan won the game with 3 total wins'])
+
+
 class TestGame(unittest.TestCase):
     def test_game_initialization(self):
         players = [Player('Stefan'), Player('Damon')]
         game = Game
 
+    @patch('source.war_game.DatabaseManager')
+    def test_play_game_without_recorder(self, mock_db_manager):
+        random.seed(3)
+        game = Game([Player('Stefan'), Player('Damon')])
+        self.assertIsInstance(game.recorder, NullRecorder)
+        winner, wins, recorder = game.play_game()
+        self.assertIn(winner, ['Stefan', 'Damon'])
+        self.assertIs(recorder, game.recorder)
+
+    @patch('source.war_game.DatabaseManager')
+    def test_play_game_with_recorder(self, mock_db_manager):
+        mock_db_manager.return_value.get_player_score.return_value = ('Stefan', 4)
+        random.seed(3)
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder())
+        winner, wins, recorder = game.play_game()
+        lines = list(recorder)
+        self.assertEqual(lines[:2], ['Stefan has 26 cards.', 'Damon has 26 cards.'])
+        self.assertEqual(lines[2], '\nRound 1 -')
+        self.assertEqual(lines[-1], f'\n\nGame Over!\n{winner} won the game with 4 total wins')
+
+    def test_player_count(self):
+        with self.assertRaises(ValueError):
+            Game([Player('Stefan')])
+        with self.assertRaises(ValueError):
+            Game([Player(str(number)) for number in range(9)])
+
+    def test_uneven_deal(self):
+        game = Game([Player('Stefan'), Player('Damon'), Player('Elena')], seed=1)
+        self.assertEqual([len(player.hand) for player in game.players], [18, 17, 17])
+        self.assertEqual(game.deck.cards, [])
+
+    def test_highest_cards(self):
+        players = [Player('Stefan'), Player('Damon'), Player('Elena'), Player('Bonnie')]
+        cards = [Card(9, 'Hearts'), Card(12, 'Spades'), Card(5, 'Clubs'), Card(12, 'Hearts')]
+        self.assertEqual(highest_cards(players, cards), [players[1], players[3]])
+        self.assertEqual(highest_cards(players[:1], cards[:1]), players[:1])
+
+    def test_war_between_tied_players_only(self):
+        players = [Player('Stefan'), Player('Damon'), Player('Elena')]
+        game = Game(players, recorder=EventRecorder(), seed=1)
+        # The top of a hand is its last card
+        players[0].hand = [Card(2, 'Hearts'), Card(14, 'Hearts'), Card(3, 'Hearts'), Card(9, 'Hearts')]
+        players[1].hand = [Card(2, 'Spades'), Card(10, 'Spades'), Card(4, 'Spades'), Card(5, 'Spades')]
+        players[2].hand = [Card(2, 'Clubs'), Card(13, 'Clubs'), Card(6, 'Clubs'), Card(9, 'Clubs')]
+        self.assertIs(game.play_round(), players[0])
+        self.assertEqual([len(player.hand) for player in players], [1 + 7, 3, 1])
+        self.assertIn((EVENT_WAR,), game.recorder.events)
+        self.assertEqual(game.recorder.events[-1], (EVENT_WON_CARDS, 'Stefan', 7))
+
+    def test_player_out_of_cards_during_war_is_eliminated(self):
+        players = [Player('Stefan'), Player('Damon'), Player('Elena')]
+        game = Game(players, recorder=EventRecorder(), seed=1)
+        players[0].hand = [Card(9, 'Hearts')]
+        players[1].hand = [Card(2, 'Spades'), Card(10, 'Spades'), Card(4, 'Spades'), Card(9, 'Spades')]
+        players[2].hand = [Card(2, 'Clubs'), Card(5, 'Clubs')]
+        self.assertIs(game.play_round(), players[1])
+        self.assertEqual(game.active, [players[1], players[2]])
+        self.assertIn((EVENT_ELIMINATED, 'Stefan'), game.recorder.events)
+        self.assertEqual(len(players[1].hand), 1 + 5)
+
+    def test_multiplayer_game(self):
+        players = [Player(str(number)) for number in range(5)]
+        game = Game(players, recorder=EventRecorder(), seed=4)
+        winner = game.play_rounds()
+        self.assertEqual(winner.wins, 1)
+        self.assertIs(winner, max(players, key=lambda player: len(player.hand)))
+        self.assertEqual(game.active, [winner])
+        self.assertEqual(len(winner.hand), 52)
+        # The last player knocked out ends the game, so only the first three are announced
+        eliminated = [event[1] for event in game.recorder.events if event[0] == EVENT_ELIMINATED]
+        self.assertEqual(len(eliminated), 3)
+        self.assertNotIn(winner.name, eliminated)
+
+    def test_max_rounds(self):
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=11, max_rounds=5)
+        winner = game.play_rounds()
+        self.assertIn((EVENT_ROUND_LIMIT, 5), game.recorder.events)
+        self.assertIs(winner, max(game.players, key=lambda player: len(player.hand)))
+        self.assertEqual(render_event((EVENT_ROUND_LIMIT, 5)), ["\nThe game was stopped after 5 rounds."])
+
+    def test_rounds_and_wars_are_counted(self):
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=11)
+        game.play_rounds()
+        self.assertEqual(game.rounds, sum(event[0] == EVENT_ROUND for event in game.recorder.events))
+        self.assertEqual(game.wars, sum(event[0] == EVENT_WAR for event in game.recorder.events))
+        self.assertEqual((game.rounds, game.wars), FastGame(['Stefan', 'Damon'], seed=11).play_game()[1:])
+
+    def test_iter_rounds(self):
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=11)
+        rounds = list(game.iter_rounds())
+        played = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=11)
+        winner = played.play_rounds()
+        self.assertEqual(game.winner.name, winner.name)
+        self.assertEqual(game.recorder.events, played.recorder.events)
+        self.assertEqual([round_result.round for round_result in rounds], list(range(1, played.rounds + 1)))
+        self.assertEqual(sum(round_result.war for round_result in rounds), played.wars)
+        self.assertEqual(rounds[-1].hands, tuple(len(player.hand) for player in played.players))
+        self.assertTrue(all(round_result.cards == 2 for round_result in rounds if not round_result.war))
+
+    def test_iter_rounds_is_lazy(self):
+        game = Game([Player('Stefan'), Player('Damon')], seed=11)
+        first = next(game.iter_rounds())
+        self.assertEqual((first.round, game.rounds), (1, 1))
+        self.assertIsNone(game.winner)
+        self.assertEqual(sum(first.hands), 52 - (0 if first.winner else first.cards))
+
+    def test_result(self):
+        db_manager = MagicMock()
+        game = Game([Player('Stefan'), Player('Damon'), Player('Elena')], recorder=EventRecorder(), seed=4,
+                    db_manager=db_manager)
+        game.play_game()
+        result = db_manager.record_game.call_args[0][0]
+        self.assertEqual(result, game.result())
+        self.assertEqual(result.players, ('Stefan', 'Damon', 'Elena'))
+        self.assertEqual(result.winner, game.winner.name)
+        self.assertEqual((result.rounds, result.wars), (game.rounds, game.wars))
+        self.assertTrue(1 <= result.longest_war <= result.wars)
+
+    def test_aggregate_results(self):
+        wins, stats, head_to_head = aggregate_results([GameResult(("A", "B"), "A", 10, 2, 1),
+                                                       GameResult(("A", "B"), "B", 30, 1, 4)])
+        self.assertEqual(wins, {"A": 1, "B": 1})
+        self.assertEqual(stats["A"], [2, 1, 40, 3, 4])
+        self.assertEqual(head_to_head, {("A", "B"): [2, 1], ("B", "A"): [2, 1]})
+
+    def test_seeded_game_is_reproducible(self):
+        games = [Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder(), seed=11) for _ in range(2)]
+        random.seed(3)
+        games[0].play_rounds()
+        random.seed(4)
+        games[1].play_rounds()
+        self.assertEqual(games[0].deal, games[1].deal)
+        self.assertEqual(games[0].recorder.events, games[1].recorder.events)
+        self.assertEqual(len(games[0].deal), 52)
+
+    @patch('source.war_game.DatabaseManager')
+    def test_replay_regenerates_logs(self, mock_db_manager):
+        mock_db_manager.return_value.get_player_score.return_value = ('Stefan', 4)
+        random.seed(3)
+        game = Game([Player('Stefan'), Player('Damon')], recorder=EventRecorder())
+        game.play_game()
+        replay = GameReplay.from_game(game, 4)
+        self.assertIsNone(replay.seed)
+        self.assertEqual(list(replay), list(game.recorder))
+
 if __name__ == '__main__':
     test_suite = unittest.TestLoader().discover('..', pattern='test_*.py')
     unittest.TextTestRunner(verbosity=2).run(test_suite)
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import war_game
+import war_game_history
+from source.war_game_api import app
+from source.war_game_tournament import (FAILED, FINISHED, PENDING, ROUND_ROBIN, SINGLE_ELIMINATION, Tournament,
+                                        play_match, rank_players)
+from war_game_fast import FastGame
+
+
+class TestTournament(unittest.TestCase):
+    def test_single_elimination(self):
+        names = ["Alice", "Bob", "Carol", "Dave", "Eve"]
+        tournament = Tournament(names, SINGLE_ELIMINATION, seed=1)
+        tournament.run()
+        self.assertEqual(tournament.state, FINISHED)
+        self.assertEqual(len(tournament.matches), 4)
+        self.assertEqual(tournament.round, 3)
+        # Eve has the bye in the first round and plays first in the second
+        self.assertEqual([(match["player1"], match["round"]) for match in tournament.matches][2], ("Eve", 2))
+        standings = tournament.standings()
+        self.assertEqual(standings[0]["rank"], 1)
+        self.assertEqual(standings[0]["losses"], 0)
+        self.assertEqual(sum(entry["rank"] == 1 for entry in standings), 1)
+        self.assertEqual(sorted(entry["name"] for entry in standings), sorted(names))
+
+    def test_round_robin_records_matches_in_one_batch(self):
+        db_manager = MagicMock()
+        tournament = Tournament(["Alice", "Bob", "Carol", "Dave"], ROUND_ROBIN, seed=2, db_manager=db_manager)
+        tournament.run()
+        self.assertEqual(len(tournament.matches), 6)
+        self.assertEqual(sum(tournament.wins.values()), 6)
+        db_manager.record_games.assert_called_once_with(tournament.results)
+        self.assertEqual([result.winner for result in tournament.results],
+                         [match["winner"] for match in tournament.matches])
+        self.assertEqual(tournament.results[0].seed, tournament.matches[0]["seed"])
+        standings = tournament.standings()
+        self.assertEqual([entry["wins"] for entry in standings],
+                         sorted((entry["wins"] for entry in standings), reverse=True))
+
+    def test_matches_are_reproducible(self):
+        first = Tournament(["Alice", "Bob", "Carol", "Dave"], seed=7)
+        first.run()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            second = Tournament(["Alice", "Bob", "Carol", "Dave"], seed=7, executor=executor)
+            second.run()
+        self.assertEqual(first.matches, second.matches)
+        match = first.matches[0]
+        self.assertEqual(play_match((match["player1"], match["player2"], match["seed"])).winner, match["winner"])
+        self.assertEqual(FastGame([match["player1"], match["player2"]], seed=match["seed"]).play_game()[0],
+                         match["winner"])
+
+    def test_invalid_tournaments(self):
+        with self.assertRaises(ValueError):
+            Tournament(["Alice"])
+        with self.assertRaises(ValueError):
+            Tournament(["Alice", "Alice"])
+        with self.assertRaises(ValueError):
+            Tournament(["Alice", "Bob"], "swiss")
+
+    def test_player_names_must_be_a_list_of_strings(self):
+        for player_names in ("Alice", ["Alice", 2], [["Alice"], ["Bob"]], {"Alice": 1, "Bob": 2}):
+            with self.assertRaises(ValueError):
+                Tournament(player_names)
+
+    def test_status(self):
+        tournament = Tournament(["Alice", "Bob", "Carol"], ROUND_ROBIN)
+        self.assertEqual(tournament.status(), {"tournament_id": tournament.id, "format": ROUND_ROBIN,
+                                               "state": PENDING, "round": 0, "matches_played": 0,
+                                               "matches_total": 3})
+        tournament.run()
+        status = tournament.status()
+        self.assertEqual(status["matches_played"], 3)
+        self.assertEqual(len(status["standings"]), 3)
+
+    def test_failure_is_reported(self):
+        db_manager = MagicMock()
+        db_manager.record_games.side_effect = RuntimeError("disk full")
+        tournament = Tournament(["Alice", "Bob"], db_manager=db_manager)
+        with patch.object(war_game.logger, 'exception'):
+            tournament.run()
+        self.assertEqual(tournament.status()["state"], FAILED)
+        self.assertEqual(tournament.status()["error"], "disk full")
+
+    def test_rank_players_shares_ties(self):
+        scores = {"Alice": 2, "Bob": 3, "Carol": 2}
+        self.assertEqual(rank_players(list(scores), scores.get),
+                         [{"rank": 1, "name": "Bob"}, {"rank": 2, "name": "Alice"}, {"rank": 2, "name": "Carol"}])
+
+
+class TestTournamentApi(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+        self.test_data_directory = tempfile.TemporaryDirectory()
+        self.db_manager = war_game.DatabaseManager(os.path.join(self.test_data_directory.name, "player_wins.db"))
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.patches = [patch('source.war_game_api.db_manager', self.db_manager),
+                        patch('source.war_game_api.leaderboard', None),
+                        patch('source.war_game_api.tournament_executor', self.executor)]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.executor.shutdown()
+        self.db_manager.close()
+        self.test_data_directory.cleanup()
+
+    def test_start_and_poll_tournament(self):
+        response = self.client.post('/api/start_tournament',
+                                    json={"players": ["Alice", "Bob", "Carol", "Dave"], "format": ROUND_ROBIN})
+        self.assertEqual(response.status_code, 200)
+        tournament_id = response.json["tournament_id"]
+        self.assertEqual(response.json["matches_total"], 6)
+        for _ in range(100):
+            status = self.client.get(f'/api/get_tournament?tournament_id={tournament_id}').json
+            if status["state"] == FINISHED:
+                break
+            time.sleep(0.05)
+        self.assertEqual(status["state"], FINISHED)
+        self.assertEqual(status["matches_played"], 6)
+        for entry in status["standings"]:
+            if entry["wins"]:
+                self.assertEqual(self.db_manager.get_player_score(entry["name"]), (entry["name"], entry["wins"]))
+            stats = self.db_manager.get_player_stats(entry["name"])
+            self.assertEqual((stats["games"], stats["wins"]), (3, entry["wins"]))
+        self.assertEqual(war_game_history.rounds_distribution(self.db_manager)["games"], 6)
+
+    def test_bad_tournaments(self):
+        self.assertEqual(self.client.post('/api/start_tournament', json={"players": ["Alice"]}).status_code, 400)
+        self.assertEqual(self.client.post('/api/start_tournament', json={}).status_code, 400)
+        self.assertEqual(self.client.get('/api/get_tournament?tournament_id=unknown').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()